@@ -2,12 +2,14 @@
 from typing import Optional, List, Deque
 from collections import deque
 from .models import Job, BufferLine, PlantState
-from .utils import changeover_cost
+from .utils import color_name
+from .scoring import VectorScorer
+from .drain_planning import DrainPlanner, DEFAULT_DRAIN_PARAMS, make_planner, count_changeovers, shift_plan
+import logging
 import time
-import heapq
-import math
-import uuid
-import copy
+import threading
+
+logger = logging.getLogger(__name__)
 
 class OnlineController:
     def __init__(self, plant: PlantState, params: dict = None):
@@ -18,9 +20,15 @@ class OnlineController:
         self.occ_high_threshold = p.get("occ_high", 0.95)  # occupancy fraction trigger
         self.global_high_threshold = p.get("global_high", 0.9)  # percent of total buffer capacity
         self.HOLD_LIMIT = p.get("hold_limit", 30.0)    # seconds to hold at oven before forced cross-send
+        self.clock = time.time                         # hold_since / pick timestamps; PlantSim uses env.now
         self.cross_penalty = p.get("cross_penalty", 100.0)  # big penalty to discourage
         self.K_max = p.get("K_max", 20)                # max pickup in one go
-        self.weights = p.get("scores", {"w_same": 10.0, "w_cross": 20.0, "w_occ": 1.0, "w_outputdown": 50.0})
+        self.weights = {"w_same": 10.0, "w_cross": 20.0, "w_occ": 1.0, "w_outputdown": 50.0, **p.get("scores", {})}
+        # assign_job scoring: "python" (per-buffer loop), "vectorized" (NumPy), or "auto" (NumPy on large plants)
+        self.scoring = p.get("scoring", "auto")
+        use_vectorized = self.scoring == "vectorized" or (
+            self.scoring == "auto" and len(plant.buffers) >= VectorScorer.AUTO_MIN_BUFFERS)
+        self.scorer = VectorScorer(plant) if use_vectorized else None
         
         # Drain mode state
         self.drain_mode = False
@@ -30,15 +38,28 @@ class OnlineController:
         self.drain_picks_since_replan = 0
         self.drain_replan_threshold = 10  # Replan after this many picks
         
-        # Enhanced drain parameters
-        self.drain_params = {
-            "color_continuity_bonus": 100.0,  # Huge bonus for continuing same color
-            "run_value_per_job": 15.0,        # Value per job in run
-            "chain_value_per_buffer": 20.0,   # Value when other buffers have same color
-            "lookahead_value_per_job": 5.0,   # Value for jobs in next run
-            "occupancy_pressure": 10.0,       # Pressure to drain fuller buffers
-            "rarity_bonus_max": 30.0,         # Max bonus for rare colors
-        }
+        # Enhanced drain parameters (see drain_planning.DEFAULT_DRAIN_PARAMS)
+        self.drain_params = dict(DEFAULT_DRAIN_PARAMS)
+        self.drain_params.update(p.get("drain_params", {}))
+
+        # Drain planners, by name from drain_planning.PLANNERS
+        self.drain_planner = p.get("drain_planner", "exact")                    # enter_drain_mode(use_milp=True)
+        self.drain_fallback_planner = p.get("drain_fallback_planner", "greedy")  # use_milp=False, or the above failed
+        self.replan_planner = p.get("replan_planner", "cpsat_warm")              # dynamic replanning during drain
+        self.drain_planner_options = p.get("drain_planner_options", {             # planner name -> options
+            "cpsat": {"horizon_slots": self.milp_horizon_per_call},
+            "cpsat_warm": {"horizon_slots": self.milp_horizon_per_call, "time_limit": 1.0},
+            "exact": {"max_states": 50_000},  # memory budget; larger state spaces fall back to beam
+        })
+        self.replanner: Optional[DrainPlanner] = None  # kept for the whole drain (warm-started sessions)
+        # solver_jobs.SolverJobs to run mid-drain replans on instead of in decide_pick's caller (set by
+        # PlantCore, whose writer thread would otherwise stall for the replanner's time limit)
+        self.solver_jobs = None
+        # background drain optimization (enter_drain_mode with solver_jobs)
+        self.drain_job = None                  # solver_jobs.SolverJob still to be swapped in
+        self._picked_since_job: dict = {}      # buffer id -> jobs picked since the job's snapshot
+        self._job_updates_seen = 0             # intermediate plans of drain_job already considered
+        self._drain_lock = threading.Lock()
 
     def total_capacity(self):
         return sum(b.capacity for b in self.plant.buffers.values())
@@ -62,104 +83,106 @@ class OnlineController:
             except Exception:
                 return None
 
-        # Build primary candidate set according to oven rules
-        primary_candidates = []
-        fallback_candidates = []  # for emergency cross-send
+        if self.scorer is not None:
+            # Batched path: candidate rows and all 7 strategies scored on NumPy feature arrays
+            primary_candidates, fallback_candidates = self.scorer.candidate_rows(O)
 
-        for b in self.plant.buffers.values():
-            if not b.input_available:
-                continue
-            # check free space relative to reserve
-            if b.occupancy() + b.reserve_headroom >= b.capacity:
-                continue
-            idx = buf_idx(b.id)
-            if O == "O2":
-                # O2 allowed only to L5-L9 (STRICT)
-                if idx is not None and idx >= 5:
-                    primary_candidates.append(b)
-                # O2 cannot send to L1-L4 ever
-            elif O == "O1":
-                # O1 prefers L1-L4; these are primary
-                if idx is not None and idx <= 4:
-                    primary_candidates.append(b)
+            def score_buffer_list(rows):
+                return self.scorer.best(job, rows, self.weights)
+        else:
+            # Build primary candidate set according to oven rules
+            primary_candidates = []
+            fallback_candidates = []  # for emergency cross-send
+
+            for b in self.plant.buffers.values():
+                if not b.input_available:
+                    continue
+                # check free space relative to reserve
+                if b.occupancy() + b.reserve_headroom >= b.capacity:
+                    continue
+                idx = buf_idx(b.id)
+                if O == "O2":
+                    # O2 allowed only to L5-L9 (STRICT)
+                    if idx is not None and idx >= 5:
+                        primary_candidates.append(b)
+                    # O2 cannot send to L1-L4 ever
+                elif O == "O1":
+                    # O1 prefers L1-L4; these are primary
+                    if idx is not None and idx <= 4:
+                        primary_candidates.append(b)
+                    else:
+                        # L5-L9 are fallback (cross-send) candidates only
+                        fallback_candidates.append(b)
                 else:
-                    # L5-L9 are fallback (cross-send) candidates only
-                    fallback_candidates.append(b)
-            else:
-                # unknown oven, allow any (defensive)
-                primary_candidates.append(b)
-
-        # Score function
-        def is_cross_send(b: BufferLine):
-            return (job.origin == "O1" and buf_idx(b.id) is not None and buf_idx(b.id) >= 5)
-
-        def score_buffer_list(candidate_list):
-            best = None
-            best_score = -1e9
-            for b in candidate_list:
-                score = 0.0
-                last_color = b.queue[-1].color if b.queue else None
+                    # unknown oven, allow any (defensive)
+                    primary_candidates.append(b)
+
+            # Score function
+            def is_cross_send(b: BufferLine):
+                return (job.origin == "O1" and buf_idx(b.id) is not None and buf_idx(b.id) >= 5)
+
+            def score_buffer_list(candidate_list):
+                best = None
+                best_score = -1e9
+                for b in candidate_list:
+                    score = 0.0
+                    last_color = b.tail_run()[0]
                 
-                # STRATEGY 1: Same color bonus (existing)
-                if last_color == job.color:
-                    score += self.weights["w_same"]
+                    # STRATEGY 1: Same color bonus (existing)
+                    if last_color == job.color_code:
+                        score += self.weights["w_same"]
                 
-                # STRATEGY 2: Building runs - if buffer has multiple of same color, prioritize it
-                if last_color == job.color and len(b.queue) > 0:
-                    # Count how many of this color at the tail
-                    tail_run = 1
-                    for idx in range(len(b.queue) - 2, -1, -1):
-                        if b.queue[idx].color == last_color:
-                            tail_run += 1
-                        else:
-                            break
-                    score += tail_run * 2.0  # Bonus for extending existing runs
+                    # STRATEGY 2: Building runs - if buffer has multiple of same color, prioritize it
+                    if last_color == job.color_code and len(b.queue) > 0:
+                        # Count how many of this color at the tail
+                        tail_run = b.tail_run()[1]
+                        score += tail_run * 2.0  # Bonus for extending existing runs
                 
-                # STRATEGY 3: Cross-send penalty (existing)
-                if is_cross_send(b):
-                    score -= self.weights["w_cross"]
+                    # STRATEGY 3: Cross-send penalty (existing)
+                    if is_cross_send(b):
+                        score -= self.weights["w_cross"]
                 
-                # STRATEGY 4: Occupancy-based scoring - prefer less full buffers
-                occ_frac = b.occupancy() / max(1.0, b.capacity)
-                score -= self.weights["w_occ"] * occ_frac
+                    # STRATEGY 4: Occupancy-based scoring - prefer less full buffers
+                    occ_frac = b.occupancy() / max(1.0, b.capacity)
+                    score -= self.weights["w_occ"] * occ_frac
                 
-                # STRATEGY 5: Output availability (existing)
-                if not b.output_available:
-                    score -= self.weights["w_outputdown"]
+                    # STRATEGY 5: Output availability (existing)
+                    if not b.output_available:
+                        score -= self.weights["w_outputdown"]
                 
-                # STRATEGY 6: Free space bonus (existing)
-                score += (b.free_space() / (1 + b.capacity))
+                    # STRATEGY 6: Free space bonus (existing)
+                    score += (b.free_space() / (1 + b.capacity))
                 
-                # STRATEGY 7: Color diversity penalty - avoid mixing too many colors in one buffer
-                unique_colors = len(set(j.color for j in b.queue))
-                if unique_colors > 3:  # More than 3 colors is suboptimal
-                    score -= (unique_colors - 3) * 5.0
+                    # STRATEGY 7: Color diversity penalty - avoid mixing too many colors in one buffer
+                    unique_colors = b.distinct_colors()
+                    if unique_colors > 3:  # More than 3 colors is suboptimal
+                        score -= (unique_colors - 3) * 5.0
                 
-                if score > best_score:
-                    best_score = score
-                    best = b
-            return best, best_score
+                    if score > best_score:
+                        best_score = score
+                        best = b
+                return best, best_score
 
         # First try primary candidates (strict rules)
-        if primary_candidates:
+        if len(primary_candidates):
             best_buf, _ = score_buffer_list(primary_candidates)
             if best_buf:
                 best_buf.push(job)
-                job._cross_send_emergency = False
+                job.cross_send_emergency = False
                 return best_buf.id
 
         # No primary candidate available -> either hold or emergency cross-send
         if hold_at_oven_allowed:
-            job.hold_since = time.time()
-            job._cross_send_emergency = False
+            job.hold_since = self.clock()
+            job.cross_send_emergency = False
             return None
 
         # If holding not allowed, allow fallback cross-send (O1 only!)
-        if fallback_candidates:
+        if len(fallback_candidates):
             best_buf, _ = score_buffer_list(fallback_candidates)
             if best_buf:
                 best_buf.push(job)
-                job._cross_send_emergency = True
+                job.cross_send_emergency = True
                 return best_buf.id
 
         # Last resort: try any buffer
@@ -174,136 +197,111 @@ class OnlineController:
                 min_occ = occ
         if last_resort:
             last_resort.push(job)
-            job._cross_send_emergency = (buf_idx(last_resort.id) is not None and buf_idx(last_resort.id) >= 5 and job.origin=="O1")
+            job.cross_send_emergency = (buf_idx(last_resort.id) is not None and buf_idx(last_resort.id) >= 5 and job.origin=="O1")
             return last_resort.id
 
         # Nowhere to put -> overflow
         raise RuntimeError("No buffer can accept job and holding not allowed")
 
-    def enter_drain_mode(self, use_milp: Optional[bool] = None):
+    def enter_drain_mode(self, use_milp: Optional[bool] = None, solver_jobs=None):
         """
         Switch controller to drain mode: compute an offline drain plan.
+        With solver_jobs (solver_jobs.SolverJobs) the optimizing planner runs in the background:
+        drain starts on the fallback plan and decide_pick swaps the optimized plan in when ready.
         Returns plan summary.
         """
         self.drain_mode = True
+        self.replanner = self.make_planner(self.replan_planner)
         if use_milp is None:
             use_milp = self.use_milp_for_drain
+        self._cancel_drain_job()
 
-        # Collect all remaining jobs
-        job_list = []
-        for b in self.plant.buffers.values():
-            job_list.extend(list(b.queue))
-
-        if not job_list:
+        queue_runs = self._queue_runs()
+        if not any(queue_runs.values()):
             self.drain_plan = deque()
             return {"status": "empty", "plan_len": 0}
 
-        # Try MILP planner
-        if use_milp:
+        background = {}
+        if use_milp and solver_jobs is not None:
+            with self._drain_lock:
+                self.drain_job = solver_jobs.submit_planner(
+                    self.drain_planner, self.planner_config(self.drain_planner), queue_runs, None)
+                self._picked_since_job = {}
+                self._job_updates_seen = 0
+            background = {"background_job": self.drain_job.id}
+            use_milp = False
+
+        # Optimizing planner first (MILP by default), then the fast fallback
+        names = [self.drain_planner] if use_milp else []
+        names.append(self.drain_fallback_planner)
+        for name in names:
             try:
-                from .milp_benchmark import milp_short_horizon
-                milp_res = milp_short_horizon(job_list, self.plant.buffers, 
-                                             horizon_slots=min(len(job_list), self.milp_horizon_per_call))
-                if milp_res.get("status") == "ok" and milp_res.get("sequence"):
-                    seq = milp_res["sequence"]
-                    # Compress sequence into pick commands
-                    plan = []
-                    for s in seq:
-                        if not plan or plan[-1]["buffer"] != s["buffer"]:
-                            plan.append({"buffer": s["buffer"], "n": 1})
-                        else:
-                            plan[-1]["n"] += 1
-                    self.drain_plan = deque(plan)
-                    return {"status": "milp_plan", "plan_len": len(self.drain_plan)}
+                planner = self.make_planner(name)
+                plan = planner.plan(queue_runs, None)
             except Exception as e:
-                pass  # Fall back to greedy
-
-        # Enhanced greedy drain planner with multi-strategy optimization
-        plan = []
-        local_queues = {bid: [job.color for job in b.queue] for bid, b in self.plant.buffers.items()}
-        
-        last_color = None  # Track last picked color for continuity
-        
-        while any(q for q in local_queues.values() if q):
-            best_bid = None
-            best_score = -1e9
-            best_run = 0
-            
-            for bid, q in local_queues.items():
-                if not q:
-                    continue
-                
-                head_color = q[0]
-                
-                # Calculate head run length
-                r = 1
-                for col in q[1:]:
-                    if col == head_color:
-                        r += 1
-                    else:
-                        break
-                
-                # STRATEGY 1: Color Continuity - MASSIVE bonus for same color as last pick
-                color_continuity = self.drain_params["color_continuity_bonus"] if (last_color and head_color == last_color) else 0.0
-                
-                # STRATEGY 2: Run Length Value - prefer longer runs
-                run_value = r * self.drain_params["run_value_per_job"]
-                
-                # STRATEGY 3: Chaining Potential - check if other buffers have same color
-                same_color_buffers = sum(1 for other_bid, other_q in local_queues.items() 
-                                        if other_bid != bid and other_q and other_q[0] == head_color)
-                chaining_potential = same_color_buffers * self.drain_params["chain_value_per_buffer"]
-                
-                # STRATEGY 4: Look-Ahead - what comes after this run?
-                next_color_after_run = q[r] if r < len(q) else None
-                next_run_length = 0
-                if next_color_after_run:
-                    for col in q[r:]:
-                        if col == next_color_after_run:
-                            next_run_length += 1
-                        else:
-                            break
-                look_ahead_value = next_run_length * self.drain_params["lookahead_value_per_job"]
-                
-                # STRATEGY 5: Occupancy Pressure - drain fuller buffers first
-                occ_frac = len(q) / max(1, self.plant.buffers[bid].capacity)
-                occupancy_pressure = occ_frac * self.drain_params["occupancy_pressure"]
-                
-                # STRATEGY 6: Color Rarity - prioritize rare colors (finish them quickly)
-                total_of_color = sum(colors.count(head_color) for colors in local_queues.values())
-                rarity_bonus = (1.0 / (total_of_color + 1)) * self.drain_params["rarity_bonus_max"]
-                
-                # Combined score with all strategies
-                score = (color_continuity + 
-                        run_value + 
-                        chaining_potential + 
-                        look_ahead_value + 
-                        occupancy_pressure + 
-                        rarity_bonus)
-                
-                if score > best_score:
-                    best_score = score
-                    best_bid = bid
-                    best_run = r
-            
-            if best_bid is None:
-                break
-            
-            # Pick the entire run (up to K_max)
-            to_pick = min(best_run, self.K_max)
-            plan.append({"buffer": best_bid, "n": to_pick})
-            
-            # Update state
-            last_color = local_queues[best_bid][0]
-            local_queues[best_bid] = local_queues[best_bid][to_pick:]
-        
-        self.drain_plan = deque(plan)
-        return {"status": "enhanced_greedy_plan", "plan_len": len(self.drain_plan)}
+                logger.warning("[DRAIN] Planner %s failed (%s), falling back", name, e)
+                continue
+            if plan:
+                self.drain_plan = deque(plan)
+                res = {"status": planner.status, "plan_len": len(self.drain_plan), "planner": name,
+                       "changeovers": count_changeovers(queue_runs, plan, None), **background}
+                if "winner" in planner.stats:
+                    # portfolio planner: which member's plan is used
+                    res["winner"] = planner.stats["winner"]
+                    logger.info("[DRAIN] Portfolio winner %s: %s changeovers", res["winner"], res["changeovers"])
+                return res
+        self.drain_plan = deque()
+        return {"status": "no_plan", "plan_len": 0, **background}
 
     def exit_drain_mode(self):
         """Turn off drain mode and clear plan."""
         self.drain_mode = False
         self.drain_plan = deque()
+        self.replanner = None
+        self._cancel_drain_job()
+
+    def _cancel_drain_job(self):
+        with self._drain_lock:
+            if self.drain_job is not None:
+                self.drain_job.cancel()
+                self.drain_job = None
+
+    def _adopt_drain_job(self):
+        """
+        Swap in the background drain plan if it beats the current plan: the job's latest
+        incumbent while it is running, its final plan once it has finished.
+        """
+        with self._drain_lock:
+            job = self.drain_job
+            if job is None:
+                return
+            if not job.done():
+                updates = job.intermediate(self._job_updates_seen)
+                if updates:
+                    self._job_updates_seen += len(updates)
+                    self._swap_in_job_plan(updates[-1]["plan"], f"{job.name} incumbent", strict=True)
+                return
+            self.drain_job = None
+            res = job.result()
+            if not res or not res.get("plan"):
+                logger.warning("[DRAIN] Background planner %s %s, keeping current plan", job.name, job.status)
+                return
+            self._swap_in_job_plan(res["plan"], f"{job.name} finished")
+
+    def _swap_in_job_plan(self, plan, source: str, strict: bool = False):
+        # the job planned from a snapshot; drop what has been picked since
+        plan = shift_plan(plan, self._picked_since_job)
+        queue_runs = self._queue_runs()
+        last = self._get_last_painted_code()
+        new = count_changeovers(queue_runs, plan, last)
+        current = count_changeovers(queue_runs, list(self.drain_plan), last)
+        better = new < current or (new == current and not strict)
+        if better:
+            self.drain_plan = deque(plan)
+            self.drain_picks_since_replan = 0
+        if better or not strict:
+            logger.info("[DRAIN] Background planner %s: %s changeovers left vs %s on the current plan, %s",
+                        source, new, current, "swapped in" if better else "kept current")
 
     def decide_pick(self):
         """
@@ -312,26 +310,22 @@ class OnlineController:
         """
         # Drain-mode behavior with dynamic replanning
         if self.drain_mode:
-            # Check if we should replan (every N picks or when plan is empty)
+            self._adopt_drain_job()
+            # Check if we should replan (every N picks or when plan is empty);
+            # not while a background plan is on its way, it replaces the current one anyway
             remaining_jobs = self.total_occupancy()
             
-            if self.drain_picks_since_replan >= self.drain_replan_threshold and remaining_jobs > 5:
-                # Replan with greedy (fast) for remaining jobs
-                print(f"[DRAIN] Dynamic replanning with {remaining_jobs} jobs remaining (picks since last plan: {self.drain_picks_since_replan})")
-                job_list = []
-                for b in self.plant.buffers.values():
-                    job_list.extend(list(b.queue))
-                if job_list:
-                    # Quick greedy replan (no MILP overhead)
-                    plan = []
-                    local_queues = {bid: [job.color for job in b.queue] for bid, b in self.plant.buffers.items()}
-                    last_history = self.plant.main_conveyor_history
-                    last_color = last_history[-1]["colors"][-1] if last_history and last_history[-1]["colors"] else None
-                    
-                    # Use enhanced greedy with current context
-                    self.drain_plan = self._enhanced_greedy_with_context(local_queues, last_color)
-                    self.drain_picks_since_replan = 0
-                    print(f"[DRAIN] Replanned: {len(self.drain_plan)} steps remaining")
+            if (self.drain_picks_since_replan >= self.drain_replan_threshold and remaining_jobs > 5
+                    and self.drain_job is None):
+                # Replan for remaining jobs, warm-started from what is left of the current plan
+                logger.debug("[DRAIN] Dynamic replanning with %d jobs remaining (picks since last plan: %d)",
+                             remaining_jobs, self.drain_picks_since_replan)
+                if self.solver_jobs is not None:
+                    self._submit_replan(self._queue_runs())  # keeps the current plan until it is done
+                else:
+                    self.drain_plan = deque(self._replan(self._queue_runs()))
+                    logger.debug("[DRAIN] Replanned: %d steps remaining", len(self.drain_plan))
+                self.drain_picks_since_replan = 0
             
             if self.drain_plan:
                 next_item = self.drain_plan.popleft()
@@ -342,39 +336,26 @@ class OnlineController:
                 self.drain_picks_since_replan += 1
                 return (b_id, n)
             else:
-                # No plan left: immediate greedy draining with look-ahead
-                candidate = None
-                cand_score = -1e9
-                last_painted_color = self._get_last_painted_color()
-                
-                for b in self.plant.buffers.values():
-                    if not b.output_available:
-                        continue
-                    R = b.head_run_length()
-                    occ_frac = b.occupancy() / max(1, b.capacity)
-                    
-                    head_color = b.queue[0].color if b.queue else None
-                    
-                    # Color continuity bonus
-                    color_bonus = 50.0 if (head_color and head_color == last_painted_color) else 0.0
-                    
-                    # Look-ahead: check if next color after run matches other buffers
-                    next_color_bonus = self._calculate_next_color_bonus(b, R)
-                    
-                    score = R * 2.0 + occ_frac * 5.0 + color_bonus + next_color_bonus
-                    if score > cand_score and b.occupancy() > 0:
-                        cand_score = score
-                        candidate = b
-                if candidate:
-                    n = min(candidate.head_run_length() if candidate.head_run_length()>0 else 1, self.K_max)
-                    return (candidate.id, n)
-                return (None, 0)
+                # No plan left (jobs arrived during drain, or skipped steps): replan over
+                # the buffers whose output is available and continue with that plan
+                queue_runs = self._queue_runs(output_available_only=True)
+                if not any(queue_runs.values()):
+                    return (None, 0)
+                if self.solver_jobs is not None:
+                    # greedy for now; the replanner's plan is swapped in when it is better
+                    self.drain_plan = deque(self.make_planner("greedy").plan(queue_runs, self._get_last_painted_code()))
+                    if self.drain_job is None:
+                        self._submit_replan(queue_runs)
+                else:
+                    self.drain_plan = deque(self._replan(queue_runs))
+                self.drain_picks_since_replan = 0
+                return self.decide_pick()
 
         # Normal-mode behavior
         candidate = None
         cand_score = -1e9
         global_occ_frac = self.total_occupancy() / max(1, self.total_capacity())
-        last_painted_color = self._get_last_painted_color()
+        last_painted_color = self._get_last_painted_code()
 
         for b in self.plant.buffers.values():
             if not b.output_available:
@@ -382,12 +363,12 @@ class OnlineController:
             occ_frac = b.occupancy() / max(1.0, b.capacity)
             R = b.head_run_length()
             
-            # Get head color
-            head_color = b.queue[0].color if b.queue else None
+            # Get head color code
+            head_color = b.head_code()
             
             # STRATEGY 1: Color continuity bonus - prefer same color as last painted
             color_continuity_bonus = 0
-            if head_color and head_color == last_painted_color:
+            if head_color is not None and head_color == last_painted_color:
                 color_continuity_bonus = 20.0  # Big bonus for continuing same color
             
             # STRATEGY 2: Look-ahead bonus - check if picking this creates good future opportunities
@@ -423,21 +404,52 @@ class OnlineController:
         # else don't pick
         return (None, 0)
 
+    def make_planner(self, name: str) -> DrainPlanner:
+        return make_planner(name, **self.planner_config(name))
+
+    def planner_config(self, name: str) -> dict:
+        """make_planner keyword arguments for a planner (picklable, for background jobs)."""
+        capacities = {bid: b.capacity for bid, b in self.plant.buffers.items()}
+        return {"capacities": capacities, "K_max": self.K_max, "drain_params": self.drain_params,
+                **self.drain_planner_options.get(name, {})}
+
+    def _replan(self, queue_runs) -> List[dict]:
+        """Replan the drain with the session planner; greedy if it fails."""
+        if self.replanner is None:
+            self.replanner = self.make_planner(self.replan_planner)
+        last = self._get_last_painted_code()
+        try:
+            return self.replanner.replan(queue_runs, last, list(self.drain_plan))
+        except Exception as e:
+            logger.warning("[DRAIN] Replanner %s failed (%s), using greedy", self.replan_planner, e)
+            return self.make_planner("greedy").plan(queue_runs, last)
+
+    def _submit_replan(self, queue_runs):
+        """Run the replanner as a solver job from the current plan; _adopt_drain_job swaps its plan in."""
+        with self._drain_lock:
+            self.drain_job = self.solver_jobs.submit_planner(
+                self.replan_planner, self.planner_config(self.replan_planner), queue_runs,
+                self._get_last_painted_code(), remaining=list(self.drain_plan))
+            self._picked_since_job = {}
+            self._job_updates_seen = 0
+
+    def _queue_runs(self, output_available_only: bool = False):
+        """Run-length encoded queues (buffer id -> [(color code, count), ...]) for the drain planners."""
+        return {bid: b.color_runs() for bid, b in self.plant.buffers.items()
+                if b.output_available or not output_available_only}
+
     def execute_pick(self, buffer_id: str, n: int, operator="controller"):
         """
         Pop n jobs from buffer and log it as a main conveyor trip (simulate painting).
         """
         b = self.plant.buffers[buffer_id]
-        picked = b.pop_n(n)
+        with self._drain_lock:
+            picked = b.pop_n(n)
+            if self.drain_job is not None:
+                self._picked_since_job[buffer_id] = self._picked_since_job.get(buffer_id, 0) + len(picked)
         if picked:
-            ts = time.time()
-            self.plant.main_conveyor_history.append({
-                "ts": ts,
-                "buffer": buffer_id,
-                "n": len(picked),
-                "colors": [p.color for p in picked],
-                "operator": operator
-            })
+            self.plant.main_conveyor_history.append(self.clock(), buffer_id, [p.color_code for p in picked],
+                                                    operator, self.plant.version)
         return picked
 
     def emergency_release_held(self, held_jobs: List[Job]):
@@ -463,12 +475,12 @@ class OnlineController:
 
     def _get_last_painted_color(self):
         """Get the last color that was painted (from main conveyor history)."""
-        if not self.plant.main_conveyor_history:
-            return None
-        last_entry = self.plant.main_conveyor_history[-1]
-        if last_entry.get("colors"):
-            return last_entry["colors"][-1]  # Last color in last pick
-        return None
+        last = self._get_last_painted_code()
+        return color_name(last) if last is not None else None
+
+    def _get_last_painted_code(self) -> Optional[int]:
+        """Interned code of the last painted color, for comparisons against buffer heads."""
+        return self.plant.main_conveyor_history.last_color
 
     def _calculate_next_color_bonus(self, buffer: BufferLine, current_run_length: int):
         """
@@ -479,107 +491,32 @@ class OnlineController:
             return 0  # No jobs after current run
         
         # Get color that comes after current run
-        next_color = buffer.queue[current_run_length].color if current_run_length < len(buffer.queue) else None
-        if not next_color:
+        if current_run_length == buffer.head_run_length():
+            next_color = buffer.next_run()[0]
+        else:
+            next_color = buffer.queue[current_run_length].color_code
+        if next_color is None:
             return 0
         
         # Check if any other buffer has this color at the head
-        for other_buffer in self.plant.buffers.values():
-            if other_buffer.id == buffer.id:
-                continue
-            if other_buffer.queue and other_buffer.queue[0].color == next_color:
-                # Found matching color in another buffer - this is good for chaining
-                return 10.0
+        heads = self.plant.buffers_with_head(next_color)
+        if len(heads) > 1 or (heads and buffer.id not in heads):
+            # Found matching color in another buffer - this is good for chaining
+            return 10.0
         return 0
 
-    def _calculate_cross_buffer_bonus(self, color: str):
+    def _calculate_cross_buffer_bonus(self, color: Optional[int]):
         """
-        Cross-buffer strategy: If multiple buffers have the same color available,
+        Cross-buffer strategy: If multiple buffers have the same color code available,
         give bonus (we can create longer combined runs).
         """
-        if not color:
+        if color is None:
             return 0
         
-        matching_buffers = 0
-        total_matching_jobs = 0
-        
-        for b in self.plant.buffers.values():
-            if b.queue and b.queue[0].color == color:
-                matching_buffers += 1
-                # Count how many of this color at the head
-                run = b.head_run_length()
-                total_matching_jobs += run
+        matching_buffers = len(self.plant.buffers_with_head(color))
+        total_matching_jobs = self.plant.head_run_totals.get(color, 0)
         
         # Bonus increases with more buffers having same color
         if matching_buffers > 1:
             return matching_buffers * 5.0 + (total_matching_jobs * 0.5)
         return 0
-
-    def _enhanced_greedy_with_context(self, local_queues: dict, last_color: str = None):
-        """
-        Enhanced greedy planner that can be called with current context for replanning.
-        Returns a deque of pick commands.
-        """
-        plan = []
-        
-        while any(q for q in local_queues.values() if q):
-            best_bid = None
-            best_score = -1e9
-            best_run = 0
-            
-            for bid, q in local_queues.items():
-                if not q:
-                    continue
-                
-                head_color = q[0]
-                
-                # Calculate head run length
-                r = 1
-                for col in q[1:]:
-                    if col == head_color:
-                        r += 1
-                    else:
-                        break
-                
-                # Multi-strategy scoring
-                color_continuity = self.drain_params["color_continuity_bonus"] if (last_color and head_color == last_color) else 0.0
-                run_value = r * self.drain_params["run_value_per_job"]
-                
-                same_color_buffers = sum(1 for other_bid, other_q in local_queues.items() 
-                                        if other_bid != bid and other_q and other_q[0] == head_color)
-                chaining_potential = same_color_buffers * self.drain_params["chain_value_per_buffer"]
-                
-                next_color_after_run = q[r] if r < len(q) else None
-                next_run_length = 0
-                if next_color_after_run:
-                    for col in q[r:]:
-                        if col == next_color_after_run:
-                            next_run_length += 1
-                        else:
-                            break
-                look_ahead_value = next_run_length * self.drain_params["lookahead_value_per_job"]
-                
-                occ_frac = len(q) / max(1, self.plant.buffers[bid].capacity)
-                occupancy_pressure = occ_frac * self.drain_params["occupancy_pressure"]
-                
-                total_of_color = sum(colors.count(head_color) for colors in local_queues.values())
-                rarity_bonus = (1.0 / (total_of_color + 1)) * self.drain_params["rarity_bonus_max"]
-                
-                score = (color_continuity + run_value + chaining_potential + 
-                        look_ahead_value + occupancy_pressure + rarity_bonus)
-                
-                if score > best_score:
-                    best_score = score
-                    best_bid = bid
-                    best_run = r
-            
-            if best_bid is None:
-                break
-            
-            to_pick = min(best_run, self.K_max)
-            plan.append({"buffer": best_bid, "n": to_pick})
-            
-            last_color = local_queues[best_bid][0]
-            local_queues[best_bid] = local_queues[best_bid][to_pick:]
-        
-        return deque(plan)
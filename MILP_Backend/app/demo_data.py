@@ -2,11 +2,13 @@
 from .models import BufferLine, PlantState
 from .utils import DEFAULT_CAPS
 
-def default_plant():
+def default_plant(queue_backend: str = "list"):
     buffers = {}
     for i in range(1, 5):
-        buffers[f"L{i}"] = BufferLine(id=f"L{i}", capacity=DEFAULT_CAPS[f"L{i}"], reserve_headroom=0)
+        buffers[f"L{i}"] = BufferLine(id=f"L{i}", capacity=DEFAULT_CAPS[f"L{i}"], reserve_headroom=0,
+                                       queue_backend=queue_backend)
     for i in range(5, 10):
-        buffers[f"L{i}"] = BufferLine(id=f"L{i}", capacity=DEFAULT_CAPS[f"L{i}"], reserve_headroom=1)
+        buffers[f"L{i}"] = BufferLine(id=f"L{i}", capacity=DEFAULT_CAPS[f"L{i}"], reserve_headroom=1,
+                                       queue_backend=queue_backend)
     plant = PlantState(buffers=buffers)
     return plant
@@ -0,0 +1,731 @@
+# app/drain_planning.py
+"""
+Drain planners behind one interface: run-length encoded queues plus the last painted
+color in, a pick plan out. Planners register by name so the controller (and the
+benchmarks) can pick them through params without touching controller internals.
+
+queue_runs: buffer id -> [(color code, run length), ...], head first
+plan:       [{"buffer": buffer id, "n": jobs to pick}, ...]
+"""
+from typing import Dict, List, Optional, Tuple
+from collections import deque
+import concurrent.futures as cf
+import heapq
+import time
+
+QueueRuns = Dict[str, List[Tuple[int, int]]]
+Plan = List[dict]
+
+DEFAULT_DRAIN_PARAMS = {
+    "color_continuity_bonus": 100.0,  # Huge bonus for continuing same color
+    "run_value_per_job": 15.0,        # Value per job in run
+    "chain_value_per_buffer": 20.0,   # Value when other buffers have same color
+    "lookahead_value_per_job": 5.0,   # Value for jobs in next run
+    "occupancy_pressure": 10.0,       # Pressure to drain fuller buffers
+    "rarity_bonus_max": 30.0,         # Max bonus for rare colors
+}
+
+PLANNERS: Dict[str, type] = {}
+
+
+def register_planner(name: str):
+    def deco(cls):
+        cls.name = name
+        PLANNERS[name] = cls
+        return cls
+    return deco
+
+
+def make_planner(name: str, capacities: Dict[str, int], K_max: int = 20,
+                 drain_params: Optional[dict] = None, **options) -> "DrainPlanner":
+    if name not in PLANNERS:
+        raise ValueError(f"Unknown drain planner {name!r}; available: {sorted(PLANNERS)}")
+    return PLANNERS[name](capacities, K_max=K_max, drain_params=drain_params, **options)
+
+
+def compress_sequence(buffer_ids: List[str], K_max: int) -> Plan:
+    """Turn a job-level buffer sequence into pick commands of at most K_max jobs."""
+    plan = []
+    for bid in buffer_ids:
+        if not plan or plan[-1]["buffer"] != bid or plan[-1]["n"] >= K_max:
+            plan.append({"buffer": bid, "n": 1})
+        else:
+            plan[-1]["n"] += 1
+    return plan
+
+
+def apply_plan(queue_runs: QueueRuns, plan: Plan) -> Tuple[QueueRuns, Optional[int]]:
+    """Queues left after executing plan, and the last color it paints (None if plan is empty)."""
+    runs = {bid: deque([c, n] for c, n in q) for bid, q in queue_runs.items()}
+    last = None
+    for step in plan:
+        q = runs[step["buffer"]]
+        n = step["n"]
+        while n > 0 and q:
+            take = min(n, q[0][1])
+            last = q[0][0]
+            q[0][1] -= take
+            n -= take
+            if q[0][1] == 0:
+                q.popleft()
+    return {bid: [(c, n) for c, n in q] for bid, q in runs.items()}, last
+
+
+def count_changeovers(queue_runs: QueueRuns, plan: Plan, last_color: Optional[int] = None) -> int:
+    """Color changes between consecutive painted jobs when plan is executed (from last_color, if known)."""
+    runs = {bid: deque([c, n] for c, n in q) for bid, q in queue_runs.items()}
+    changeovers = 0
+    for step in plan:
+        q = runs[step["buffer"]]
+        n = step["n"]
+        while n > 0 and q:
+            color = q[0][0]
+            if last_color is not None and color != last_color:
+                changeovers += 1
+            last_color = color
+            take = min(n, q[0][1])
+            q[0][1] -= take
+            n -= take
+            if q[0][1] == 0:
+                q.popleft()
+    return changeovers
+
+
+def plan_sequence(plan: Plan) -> List[str]:
+    """Buffer id of every job the plan picks, in pick order."""
+    return [step["buffer"] for step in plan for _ in range(step["n"])]
+
+
+def fit_plan(queue_runs: QueueRuns, plan: Plan) -> Plan:
+    """The steps of plan that still apply to queue_runs, clipped to the jobs left in each buffer."""
+    left = {bid: sum(n for _, n in q) for bid, q in queue_runs.items()}
+    fitted = []
+    for step in plan:
+        n = min(step["n"], left.get(step["buffer"], 0))
+        if n > 0:
+            fitted.append({"buffer": step["buffer"], "n": n})
+            left[step["buffer"]] -= n
+    return fitted
+
+
+def shift_plan(plan: Plan, picked: Dict[str, int]) -> Plan:
+    """
+    plan, minus jobs already picked since it was made: picked[bid] jobs left the head of
+    each buffer, which are the first picked[bid] jobs the plan takes from that buffer.
+    """
+    left = dict(picked)
+    shifted = []
+    for step in plan:
+        skip = min(step["n"], left.get(step["buffer"], 0))
+        if skip:
+            left[step["buffer"]] -= skip
+        if step["n"] > skip:
+            shifted.append({"buffer": step["buffer"], "n": step["n"] - skip})
+    return shifted
+
+
+def runs_to_plan(bids: List[str], moves: List[Tuple[int, int]], K_max: int) -> Plan:
+    """(buffer index, run length) moves -> pick commands, splitting runs longer than K_max."""
+    plan = []
+    for i, n in moves:
+        while n > 0:
+            take = min(n, K_max)
+            plan.append({"buffer": bids[i], "n": take})
+            n -= take
+    return plan
+
+
+class DrainPlanner:
+    """Base class for drain planners; subclasses implement plan()."""
+    name = "base"
+    status = "plan"  # reported by OnlineController.enter_drain_mode
+
+    def __init__(self, capacities: Dict[str, int], K_max: int = 20, drain_params: Optional[dict] = None, **options):
+        self.capacities = capacities
+        self.K_max = K_max
+        self.drain_params = dict(DEFAULT_DRAIN_PARAMS)
+        if drain_params:
+            self.drain_params.update(drain_params)
+        self.options = options
+        self.stats: dict = {}  # planner-specific details about the last plan() call
+        # set by whoever runs the planner in the background (see solver_jobs)
+        self.stop_event = None     # Event-like; once set, finish early with the best plan so far
+        self.on_incumbent = None   # callable(plan, changeovers), called with every improved plan
+
+    def stopped(self) -> bool:
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def publish(self, plan: Plan, changeovers: int):
+        if self.on_incumbent is not None:
+            self.on_incumbent(plan, changeovers)
+
+    def plan(self, queue_runs: QueueRuns, last_color: Optional[int] = None) -> Plan:
+        raise NotImplementedError
+
+    def replan(self, queue_runs: QueueRuns, last_color: Optional[int], remaining: Plan) -> Plan:
+        """Plan again mid-drain; remaining is the not yet executed part of the previous plan."""
+        return self.plan(queue_runs, last_color)
+
+
+@register_planner("greedy")
+class GreedyDrainPlanner(DrainPlanner):
+    """
+    Enhanced greedy planner (6 strategies): repeatedly takes the head run of the best-scoring buffer.
+    Buffer scores live in a max-heap; after each pick only buffers whose score inputs changed
+    (the picked one, and those whose head is the picked, new-head or previous last color) are rescored.
+    """
+    status = "enhanced_greedy_plan"
+
+    def plan(self, queue_runs: QueueRuns, last_color: Optional[int] = None) -> Plan:
+        dp = self.drain_params
+        order = {}    # bid -> position in plant order, breaks score ties like a linear scan would
+        runs = {}     # bid -> deque of [color, count]
+        length = {}   # bid -> jobs left
+        heads = {}    # color -> bids whose queue starts with that color
+        totals = {}   # color -> jobs of that color left across all queues
+        for i, (bid, q) in enumerate(queue_runs.items()):
+            order[bid] = i
+            runs[bid] = deque([c, n] for c, n in q if n > 0)
+            length[bid] = sum(n for _, n in runs[bid])
+            for c, n in runs[bid]:
+                totals[c] = totals.get(c, 0) + n
+            if runs[bid]:
+                heads.setdefault(runs[bid][0][0], set()).add(bid)
+
+        def score(bid):
+            q = runs[bid]
+            head_color, r = q[0]
+            # STRATEGY 1: Color Continuity - MASSIVE bonus for same color as last pick
+            color_continuity = dp["color_continuity_bonus"] if (last_color is not None and head_color == last_color) else 0.0
+            # STRATEGY 2: Run Length Value - prefer longer runs
+            run_value = r * dp["run_value_per_job"]
+            # STRATEGY 3: Chaining Potential - other buffers with the same head color
+            chaining_potential = (len(heads[head_color]) - 1) * dp["chain_value_per_buffer"]
+            # STRATEGY 4: Look-Ahead - length of the run after this one
+            next_run_length = q[1][1] if len(q) > 1 else 0
+            look_ahead_value = next_run_length * dp["lookahead_value_per_job"]
+            # STRATEGY 5: Occupancy Pressure - drain fuller buffers first
+            occ_frac = length[bid] / max(1, self.capacities[bid])
+            occupancy_pressure = occ_frac * dp["occupancy_pressure"]
+            # STRATEGY 6: Color Rarity - prioritize rare colors (finish them quickly)
+            rarity_bonus = (1.0 / (totals[head_color] + 1)) * dp["rarity_bonus_max"]
+            return (color_continuity + run_value + chaining_potential +
+                    look_ahead_value + occupancy_pressure + rarity_bonus)
+
+        heap = []
+        version = {bid: 0 for bid in runs}
+
+        def rescore(bid):
+            version[bid] += 1  # invalidates the buffer's older heap entries
+            if runs[bid]:
+                heapq.heappush(heap, (-score(bid), order[bid], version[bid], bid))
+
+        for bid in runs:
+            rescore(bid)
+
+        plan = []
+        while heap:
+            _, _, ver, bid = heapq.heappop(heap)
+            if ver != version[bid]:
+                continue
+            q = runs[bid]
+            head_color, r = q[0]
+
+            # Pick the entire run (up to K_max)
+            to_pick = min(r, self.K_max)
+            plan.append({"buffer": bid, "n": to_pick})
+
+            # Update state
+            affected = set(heads[head_color])
+            if last_color is not None and last_color != head_color:
+                affected |= heads.get(last_color, set())
+            last_color = head_color
+            totals[head_color] -= to_pick
+            length[bid] -= to_pick
+            if to_pick == r:
+                q.popleft()
+                heads[head_color].discard(bid)
+                if q:
+                    heads.setdefault(q[0][0], set()).add(bid)
+                    affected |= heads[q[0][0]]
+            else:
+                q[0][1] -= to_pick
+            affected.add(bid)
+            for other in affected:
+                rescore(other)
+
+        return plan
+
+
+@register_planner("cpsat")
+class CpSatDrainPlanner(DrainPlanner):
+    """
+    CP-SAT sequencing model from milp_benchmark over the first K jobs of every buffer
+    (options: model, "blocks" or "time_indexed"; items_per_buffer, horizon_slots,
+    time_limit, workers). Jobs beyond the model's horizon are appended with the greedy
+    planner so the plan always drains everything. With on_incumbent set, every solver
+    solution that beats the greedy plan is completed and published while the solve runs.
+    """
+    status = "milp_plan"
+    default_time_limit = 20.0
+    default_items_per_buffer = None  # milp_benchmark.HEAD_ITEMS_PER_BUFFER
+
+    def plan(self, queue_runs: QueueRuns, last_color: Optional[int] = None) -> Plan:
+        published = None
+        if self.on_incumbent is not None:
+            greedy = GreedyDrainPlanner(self.capacities, K_max=self.K_max, drain_params=self.drain_params)
+            first = greedy.plan(queue_runs, last_color)
+            published = count_changeovers(queue_runs, first, last_color)
+            self.publish(first, published)
+        res = self._solve(queue_runs, last_color, publish_below=published)
+        if res.get("status") != "ok" or not res.get("sequence"):
+            raise RuntimeError(f"CP-SAT drain model returned {res.get('status')}")
+        return self._complete(queue_runs, [s["buffer"] for s in res["sequence"]], last_color)
+
+    def _solve(self, queue_runs: QueueRuns, last_color: Optional[int], hint: Optional[Plan] = None,
+               horizon_slots: Optional[int] = None, publish_below: Optional[int] = None) -> dict:
+        """Run the sequencing model; with publish_below, publish completed incumbents with fewer changeovers."""
+        from .milp_benchmark import SEQUENCE_MODELS, HEAD_ITEMS_PER_BUFFER
+        K = self.options.get("items_per_buffer", self.default_items_per_buffer or HEAD_ITEMS_PER_BUFFER)
+        items = []
+        for bid, q in queue_runs.items():
+            colors = [c for c, n in q for _ in range(n)][:K]
+            items.extend((bid, c, None) for c in colors)
+        if not items:
+            return {"status": "no_items"}
+        on_solution = None
+        if publish_below is not None and self.on_incumbent is not None:
+            best = [publish_below]
+
+            def on_solution(update):
+                plan = self._complete(queue_runs, [s["buffer"] for s in update["sequence"]], last_color)
+                changeovers = count_changeovers(queue_runs, plan, last_color)
+                if changeovers < best[0]:
+                    best[0] = changeovers
+                    self.publish(plan, changeovers)
+
+        sequence = SEQUENCE_MODELS[self.options.get("model", "blocks")]
+        return sequence(items,
+                        horizon_slots=min(len(items), horizon_slots or self.options.get("horizon_slots", 300)),
+                        time_limit=self.options.get("time_limit", self.default_time_limit),
+                        workers=self.options.get("workers", 8),
+                        last_color=last_color,
+                        hint=None if hint is None else plan_sequence(hint),
+                        stop_event=self.stop_event,
+                        on_solution=on_solution)
+
+    def _complete(self, queue_runs: QueueRuns, buffer_ids: List[str], last_color: Optional[int]) -> Plan:
+        """Pick commands for a job-level sequence, then greedy for whatever it leaves queued."""
+        plan = compress_sequence(buffer_ids, self.K_max)
+        rest, last = apply_plan(queue_runs, plan)
+        greedy = GreedyDrainPlanner(self.capacities, K_max=self.K_max, drain_params=self.drain_params)
+        return plan + greedy.plan(rest, last if plan else last_color)
+
+
+@register_planner("cpsat_warm")
+class WarmCpSatDrainPlanner(CpSatDrainPlanner):
+    """
+    CP-SAT replanning session for drain mode: the controller keeps one instance per drain
+    and calls replan() with the part of the last plan it has not executed yet. That plan,
+    fitted to the current queues and finished greedily, and a fresh greedy plan are both
+    candidates; the one with fewer changeovers seeds the model through AddHint, and the
+    solver's plan is only used when it beats it. CP-SAT can't edit a solved model, so
+    each replan rebuilds the compact model over the shifted queues (milliseconds) and the
+    hint lets a short time_limit (default 1 s) go to improving it.
+    """
+    status = "milp_warm_plan"
+    default_time_limit = 1.0
+
+    def __init__(self, *args, **options):
+        super().__init__(*args, **options)
+        self.replans = 0
+        self.last_plan: Plan = []
+
+    def plan(self, queue_runs: QueueRuns, last_color: Optional[int] = None) -> Plan:
+        return self.replan(queue_runs, last_color, [])
+
+    def replan(self, queue_runs: QueueRuns, last_color: Optional[int], remaining: Plan) -> Plan:
+        greedy = GreedyDrainPlanner(self.capacities, K_max=self.K_max, drain_params=self.drain_params)
+        candidates = [("greedy", greedy.plan(queue_runs, last_color))]
+        if remaining:
+            kept = fit_plan(queue_runs, remaining)
+            rest, last = apply_plan(queue_runs, kept)
+            candidates.insert(0, ("remaining", kept + greedy.plan(rest, last if kept else last_color)))
+        hint_name, best = min(candidates, key=lambda c: count_changeovers(queue_runs, c[1], last_color))
+        best_changeovers = count_changeovers(queue_runs, best, last_color)
+        self.replans += 1
+        self.stats = {"replans": self.replans, "hint": hint_name, "hint_changeovers": best_changeovers}
+        self.publish(best, best_changeovers)
+
+        res = self._solve(queue_runs, last_color, hint=best, publish_below=best_changeovers)
+        if res.get("status") == "ok" and res.get("sequence"):
+            plan = self._complete(queue_runs, [s["buffer"] for s in res["sequence"]], last_color)
+            changeovers = count_changeovers(queue_runs, plan, last_color)
+            self.stats.update(res["stats"])
+            if changeovers < best_changeovers:
+                best, best_changeovers = plan, changeovers
+        self.stats["changeovers"] = best_changeovers
+        self.last_plan = best
+        return best
+
+
+@register_planner("rolling")
+class RollingHorizonDrainPlanner(CpSatDrainPlanner):
+    """
+    Rolling-horizon CP-SAT for drains of any size: each window sequences all of the first
+    items_per_buffer jobs (default 10) of every buffer, commits the first `commit` of them
+    (default 3/4 of the window) and solves the next window over the queues that are left,
+    starting from the last committed color. Windows hold the same depth of every buffer,
+    so a window can't save changeovers by leaving hard queues for later. The uncommitted
+    rest of a window, finished greedily, is the next window's hint. Model size and solve
+    time (time_limit per window, default 2 s) stay bounded however many jobs are queued;
+    the last window commits everything. A window without a solution commits its hint.
+    """
+    status = "rolling_plan"
+    default_time_limit = 2.0
+    default_items_per_buffer = 10
+
+    def plan(self, queue_runs: QueueRuns, last_color: Optional[int] = None) -> Plan:
+        K = self.options.get("items_per_buffer", self.default_items_per_buffer)
+        greedy = GreedyDrainPlanner(self.capacities, K_max=self.K_max, drain_params=self.drain_params)
+        self.stats = {"windows": 0, "solved_windows": 0, "solve_s": 0.0, "max_window_s": 0.0}
+
+        queues, last = queue_runs, last_color
+        committed: List[str] = []  # buffer id per committed job
+        tail: List[str] = []       # uncommitted rest of the previous window
+        while any(queues.values()):
+            window = sum(min(K, sum(n for _, n in q)) for q in queues.values())
+            hint = fit_plan(queues, compress_sequence(tail, self.K_max))
+            rest, hint_last = apply_plan(queues, hint)
+            hint += greedy.plan(rest, hint_last if hint else last)
+            if self.on_incumbent is not None:
+                incumbent = compress_sequence(committed + plan_sequence(hint), self.K_max)
+                self.publish(incumbent, count_changeovers(queue_runs, incumbent, last_color))
+            if self.stopped():
+                committed += plan_sequence(hint)
+                break
+            res = self._solve(queues, last, hint=hint, horizon_slots=window)
+            if res.get("status") == "ok" and res.get("sequence"):
+                seq = [s["buffer"] for s in res["sequence"]]
+                self.stats["solved_windows"] += 1
+                self.stats["solve_s"] += res["stats"]["solve_s"]
+                self.stats["max_window_s"] = max(self.stats["max_window_s"], res["stats"]["solve_s"])
+            else:
+                seq = plan_sequence(hint)[:window]
+            self.stats["windows"] += 1
+
+            total = sum(n for q in queues.values() for _, n in q)
+            n = len(seq) if len(seq) == total else max(1, self.options.get("commit", len(seq) * 3 // 4))
+            queues, last = apply_plan(queues, compress_sequence(seq[:n], self.K_max))
+            committed += seq[:n]
+            tail = seq[n:]
+
+        plan = compress_sequence(committed, self.K_max)
+        self.stats["changeovers"] = count_changeovers(queue_runs, plan, last_color)
+        return plan
+
+
+@register_planner("beam")
+class BeamDrainPlanner(DrainPlanner):
+    """
+    Beam search over (queue-head positions, last color), one head run per step.
+    Keeps the beam_width states with the fewest changeovers plus a lower bound (distinct
+    colors still queued other than the current one); runs matching the current color are
+    always taken immediately since that can never add a changeover. When time_budget
+    runs out the surviving partial states are finished greedily. The greedy plan is the
+    starting incumbent, so the result never has more changeovers than greedy.
+    options: beam_width (default 128), time_budget in seconds (default 0.5)
+    """
+    status = "beam_plan"
+
+    def plan(self, queue_runs: QueueRuns, last_color: Optional[int] = None) -> Plan:
+        deadline = time.perf_counter() + self.options.get("time_budget", 0.5)
+        width = self.options.get("beam_width", 128)
+        greedy = GreedyDrainPlanner(self.capacities, K_max=self.K_max, drain_params=self.drain_params)
+        best_plan = greedy.plan(queue_runs, last_color)
+        best = count_changeovers(queue_runs, best_plan, last_color)
+        self.stats = {"greedy_changeovers": best, "changeovers": best, "layers": 0, "timed_out": False}
+        self.publish(best_plan, best)
+
+        bids = list(queue_runs)
+        runs = [[(c, n) for c, n in queue_runs[bid] if n > 0] for bid in bids]
+
+        def close(pos, last, moves):
+            # take every head run of the current color: free, and never worse than later
+            pos = list(pos)
+            for i, q in enumerate(runs):
+                while pos[i] < len(q) and q[pos[i]][0] == last:
+                    moves = ((i, q[pos[i]][1]), moves)
+                    pos[i] += 1
+            return tuple(pos), moves
+
+        def bound(pos, last):
+            colors = {q[p][0] for q, p in zip(runs, pos) for p in range(p, len(q))}
+            colors.discard(last)
+            return len(colors)
+
+        def unwind(moves):
+            out = []
+            while moves is not None:
+                out.append(moves[0])
+                moves = moves[1]
+            return out[::-1]
+
+        pos, moves = close((0,) * len(runs), last_color, None)
+        beam = [(pos, last_color, 0, moves)]  # (head positions, last color, changeovers, moves linked list)
+        while beam:
+            if time.perf_counter() > deadline or self.stopped():
+                self.stats["timed_out"] = True
+                for pos, last, g, moves in beam:
+                    rest = {bids[i]: q[pos[i]:] for i, q in enumerate(runs)}
+                    tail = greedy.plan(rest, last)
+                    total = g + count_changeovers(rest, tail, last)
+                    if total < best:
+                        best = total
+                        best_plan = runs_to_plan(bids, unwind(moves), self.K_max) + tail
+                        self.publish(best_plan, best)
+                break
+            self.stats["layers"] += 1
+            expanded = {}
+            for pos, last, g, moves in beam:
+                for i, q in enumerate(runs):
+                    if pos[i] >= len(q):
+                        continue
+                    color, n = q[pos[i]]
+                    ng = g + (1 if last is not None and color != last else 0)
+                    npos, nmoves = close(pos[:i] + (pos[i] + 1,) + pos[i + 1:], color, ((i, n), moves))
+                    key = (npos, color)
+                    if key not in expanded or expanded[key][2] > ng:
+                        expanded[key] = (npos, color, ng, nmoves)
+            beam = []
+            for npos, color, ng, nmoves in expanded.values():
+                if all(p == len(q) for p, q in zip(npos, runs)):
+                    if ng < best:
+                        best = ng
+                        best_plan = runs_to_plan(bids, unwind(nmoves), self.K_max)
+                        self.publish(best_plan, best)
+                    continue
+                f = ng + bound(npos, color)
+                if f < best:
+                    beam.append((f, ng, npos, color, nmoves))
+            beam.sort(key=lambda e: (e[0], e[1]))
+            beam = [(npos, color, ng, nmoves) for _, ng, npos, color, nmoves in beam[:width]]
+
+        self.stats["changeovers"] = best
+        return best_plan
+
+
+@register_planner("exact")
+class ExactDrainPlanner(DrainPlanner):
+    """
+    Minimum-changeover drain plan by A* over (head run position per buffer, last color).
+    Draining is a shortest common supersequence over the buffers' run colors, so the
+    heuristic is the largest pairwise supersequence length of the remaining runs
+    (precomputed per buffer pair), which is admissible and consistent. Head runs of the
+    current color are taken immediately (never worse), so each step picks a color and
+    takes every head run of it; the greedy plan's changeover count prunes the search.
+    If more than max_states states would be stored, gives up and returns the
+    fallback planner's plan instead; stats["optimal"] says which happened.
+    options: max_states (default 50_000), fallback (planner name, default "beam")
+    """
+    status = "exact_plan"
+
+    def plan(self, queue_runs: QueueRuns, last_color: Optional[int] = None) -> Plan:
+        max_states = self.options.get("max_states", 50_000)
+        greedy = GreedyDrainPlanner(self.capacities, K_max=self.K_max, drain_params=self.drain_params)
+        incumbent = greedy.plan(queue_runs, last_color)
+        upper = count_changeovers(queue_runs, incumbent, last_color)
+        self.publish(incumbent, upper)
+
+        bids = list(queue_runs)
+        runs = [[(c, n) for c, n in queue_runs[bid] if n > 0] for bid in bids]
+        # suffix_colors[i][p]: bitmask of colors in runs[i][p:]
+        suffix_colors = []
+        for q in runs:
+            masks = [0] * (len(q) + 1)
+            for p in range(len(q) - 1, -1, -1):
+                masks[p] = masks[p + 1] | (1 << q[p][0])
+            suffix_colors.append(masks)
+        # scs[(i, j)][p][r]: shortest common supersequence of the run colors runs[i][p:] and runs[j][r:],
+        # i.e. the fewest same-color blocks that can drain both buffers from there
+        scs = {}
+        for i in range(len(runs)):
+            for j in range(i + 1, len(runs)):
+                a = [c for c, _ in runs[i]]
+                b = [c for c, _ in runs[j]]
+                t = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+                for p in range(len(a), -1, -1):
+                    for r in range(len(b), -1, -1):
+                        if p == len(a):
+                            t[p][r] = len(b) - r
+                        elif r == len(b):
+                            t[p][r] = len(a) - p
+                        elif a[p] == b[r]:
+                            t[p][r] = 1 + t[p + 1][r + 1]
+                        else:
+                            t[p][r] = 1 + min(t[p + 1][r], t[p][r + 1])
+                scs[(i, j)] = t
+
+        def h(pos, last):
+            # Heads never match the current color here (see close), so every remaining
+            # same-color block costs a changeover, except the very first one when there is
+            # no last color. Lower bounds: blocks needed for any pair of buffers (or a single
+            # buffer's runs), and one block per queued color.
+            blocks = 0
+            left = 0
+            for i, (q, masks) in enumerate(zip(runs, suffix_colors)):
+                left |= masks[pos[i]]
+                if len(q) - pos[i] > blocks:
+                    blocks = len(q) - pos[i]
+            for (i, j), t in scs.items():
+                if t[pos[i]][pos[j]] > blocks:
+                    blocks = t[pos[i]][pos[j]]
+            blocks = max(blocks, left.bit_count())
+            return blocks - 1 if last is None and blocks else blocks
+
+        def close(pos, last):
+            # take every head run of the current color: free, and never worse than later
+            pos = list(pos)
+            moves = []
+            for i, q in enumerate(runs):
+                while pos[i] < len(q) and q[pos[i]][0] == last:
+                    moves.append((i, q[pos[i]][1]))
+                    pos[i] += 1
+            return tuple(pos), moves
+
+        start_pos, start_moves = close((0,) * len(runs), last_color)
+        start = (start_pos, last_color)
+        came_from = {start: (None, start_moves)}
+        best_g = {start: 0}
+        heap = [(h(start_pos, last_color), 0, 0, start)]  # (f, -g, tiebreak, state)
+        counter = 0
+        goal = None
+        self.stats = {"greedy_changeovers": upper, "states": 0, "optimal": False}
+        popped = 0
+        while heap:
+            popped += 1
+            if popped % 1024 == 0 and self.stopped():
+                # stopped from outside: the greedy incumbent is the best plan we have
+                self.stats.update({"states": len(best_g), "stopped": True, "changeovers": upper})
+                return incumbent
+            f, neg_g, _, state = heapq.heappop(heap)
+            g = -neg_g
+            if g > best_g[state] or f >= upper:
+                continue
+            pos, last = state
+            if all(p == len(q) for p, q in zip(pos, runs)):
+                goal = state
+                upper = g
+                break
+            # one successor per head color: close() takes every head run of it at once
+            ng = g if last is None else g + 1
+            for color in {q[p][0] for q, p in zip(runs, pos) if p < len(q)}:
+                npos, moves = close(pos, color)
+                nstate = (npos, color)
+                if ng >= best_g.get(nstate, upper):
+                    continue
+                nf = ng + h(npos, color)
+                if nf >= upper:
+                    continue
+                best_g[nstate] = ng
+                came_from[nstate] = (state, moves)
+                counter += 1
+                heapq.heappush(heap, (nf, -ng, counter, nstate))
+            if len(best_g) > max_states:
+                self.stats["states"] = len(best_g)
+                fallback_name = self.options.get("fallback", "beam")
+                fallback = make_planner(fallback_name, self.capacities, K_max=self.K_max,
+                                        drain_params=self.drain_params)
+                fallback.stop_event, fallback.on_incumbent = self.stop_event, self.on_incumbent
+                plan = fallback.plan(queue_runs, last_color)
+                self.stats.update({"fallback": fallback_name,
+                                   "changeovers": count_changeovers(queue_runs, plan, last_color)})
+                return plan
+
+        self.stats["states"] = len(best_g)
+        self.stats["optimal"] = True
+        self.stats["changeovers"] = upper
+        if goal is None:
+            return incumbent  # nothing beats greedy, so greedy is optimal
+        moves = []
+        state = goal
+        while state is not None:
+            state, step = came_from[state]
+            moves.append(step)
+        return runs_to_plan(bids, [m for step in reversed(moves) for m in step], self.K_max)
+
+
+# portfolio members: planner name, optional label, that planner's options
+DEFAULT_PORTFOLIO = [
+    {"planner": "exact", "fallback": "greedy"},
+    {"planner": "beam", "beam_width": 256},
+    {"planner": "cpsat", "label": "cpsat_k30", "workers": 2},
+    {"planner": "cpsat", "label": "cpsat_k15", "items_per_buffer": 15, "workers": 2},
+    {"planner": "rolling", "workers": 2},
+]
+
+
+@register_planner("portfolio")
+class PortfolioDrainPlanner(DrainPlanner):
+    """
+    Runs several planners at once in solver_jobs worker processes on the same queue
+    snapshot and returns the plan with the fewest changeovers handed in by the deadline.
+    The greedy plan, computed here first, is the starting incumbent. Members' time_limit
+    and time_budget default to the deadline; at the deadline members still running are
+    stopped and get `grace` seconds to return their best plan, the rest are dropped.
+    stats has each member's outcome and the winner (label, "greedy" if none beat it).
+    options: members (default DEFAULT_PORTFOLIO), deadline in seconds (default 5.0),
+    grace in seconds (default 0.5)
+    """
+    status = "portfolio_plan"
+
+    def plan(self, queue_runs: QueueRuns, last_color: Optional[int] = None) -> Plan:
+        from .solver_jobs import SOLVER_JOBS  # solver_jobs imports this module
+        deadline_s = self.options.get("deadline", 5.0)
+        deadline = time.perf_counter() + deadline_s
+        greedy = GreedyDrainPlanner(self.capacities, K_max=self.K_max, drain_params=self.drain_params)
+        best_plan = greedy.plan(queue_runs, last_color)
+        best = greedy_changeovers = count_changeovers(queue_runs, best_plan, last_color)
+        winner = "greedy"
+        self.publish(best_plan, best)
+
+        jobs = {}
+        for i, member in enumerate(self.options.get("members", DEFAULT_PORTFOLIO)):
+            label = member.get("label", member["planner"])
+            if label in jobs:
+                label = f"{label}#{i}"
+            options = {k: v for k, v in member.items() if k not in ("planner", "label")}
+            options.setdefault("time_limit", deadline_s)
+            options.setdefault("time_budget", deadline_s)
+            config = {"capacities": self.capacities, "K_max": self.K_max,
+                      "drain_params": self.drain_params, **options}
+            jobs[label] = SOLVER_JOBS.submit_planner(member["planner"], config, queue_runs, last_color)
+
+        members = {label: {"planner": job.name} for label, job in jobs.items()}
+        pending = {job.future: label for label, job in jobs.items()}
+        stopping = False
+        while pending:
+            now = time.perf_counter()
+            if not stopping and (now >= deadline or self.stopped()):
+                for job in jobs.values():
+                    job.cancel()
+                stopping, deadline = True, now + self.options.get("grace", 0.5)
+            elif stopping and now >= deadline:
+                break
+            done, _ = cf.wait(pending, timeout=min(0.1, max(0.0, deadline - now)),
+                              return_when=cf.FIRST_COMPLETED)
+            for future in done:
+                label = pending.pop(future)
+                res = jobs[label].result()
+                members[label]["seconds"] = jobs[label].finished - jobs[label].submitted
+                if res is None:
+                    continue
+                members[label]["changeovers"] = res["changeovers"]
+                if res["changeovers"] < best:
+                    best_plan, best, winner = res["plan"], res["changeovers"], label
+                    self.publish(best_plan, best)
+        for label, job in jobs.items():
+            members[label]["status"] = job.status
+        self.stats = {"greedy_changeovers": greedy_changeovers, "changeovers": best, "winner": winner,
+                      "members": members}
+        return best_plan
@@ -0,0 +1,319 @@
+# app/event_log.py
+"""
+Append-only event log for crash recovery. A logged plant's writer (PlantCore) records every
+mutation: arrivals with the buffer they were assigned to, picks with how many jobs were
+taken, oven, buffer and conveyor toggles and drain transitions, as fixed-size binary records
+(RECORD); strings (job ids, color names, operators) go to a side file, one per line, and
+records refer to them by line. After each group of commands the records are written and
+fsynced together, before the callers get their results, so every acknowledged write is on disk.
+
+A log directory holds numbered segments: snapshot-K.pkl is the plant (a PlantState snapshot
+and drain mode) as of the start of events-K.bin / strings-K.bin. A new segment, with a snapshot,
+starts every SNAPSHOT_EVERY events and whenever the plant is replaced (/reset, /set-state);
+periodic snapshots are written in the background from a copy-on-write snapshot, and older
+segments are deleted once the newer snapshot is on disk. recover() loads the newest snapshot
+and replays the segments after it: records are read with NumPy and applied per buffer in bulk
+(FIFO queues: what is left is the tail of the pushes), so only the jobs still queued become
+Job objects.
+
+Replay a log directory from the command line (from MILP_Backend/):
+    python -m app.event_log <plant log dir>
+"""
+from typing import Dict, List, Optional, Tuple
+import glob
+import os
+import pickle
+import sys
+import threading
+import time
+import numpy as np
+from .models import Job, PlantState
+from .utils import color_code, color_name
+
+RECORD = np.dtype([
+    ("ts", "<f8"),   # arrival / pick time
+    ("ref", "<u4"),  # string line: job id (arrival) or operator (pick)
+    ("arg", "<u4"),  # string line of the color (arrival), or jobs picked (pick)
+    ("op", "u1"),
+    ("buffer", "u1"),  # index in the segment's snapshot plant's buffers; NO_BUFFER if held at the oven
+    ("flag", "u1"),    # oven (arrival, OVEN), field (BUFFER_FLAG)
+    ("value", "u1"),   # new state (toggles, DRAIN), emergency cross-send (arrival)
+])
+ARRIVAL, PICK, OVEN, BUFFER_FLAG, CONVEYOR, DRAIN = range(1, 7)
+NO_BUFFER = 255
+OVENS = ("O1", "O2")
+BUFFER_FIELDS = ("input_available", "output_available")
+
+
+def _escape(s: str) -> bytes:
+    return s.encode().replace(b"\\", b"\\\\").replace(b"\n", b"\\n")
+
+
+def _unescape(b: bytes) -> str:
+    return b.replace(b"\\n", b"\n").replace(b"\\\\", b"\\").decode() if b"\\" in b else b.decode()
+
+
+def _segment(directory: str, kind: str, k: int) -> str:
+    return os.path.join(directory, f"{kind}-{k:06d}.{'pkl' if kind == 'snapshot' else 'bin'}")
+
+
+def _segments(directory: str, kind: str) -> List[int]:
+    # segment numbers with a `kind` file (not counting a snapshot still being written, *.tmp)
+    ext = "pkl" if kind == "snapshot" else "bin"
+    return sorted(int(os.path.basename(p)[len(kind) + 1:-len(ext) - 1])
+                  for p in glob.glob(os.path.join(directory, f"{kind}-*.{ext}")))
+
+
+def _write_snapshot(path: str, plant: PlantState, drain_mode: bool):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump({"plant": plant, "drain_mode": drain_mode}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)  # a snapshot exists whole or not at all
+
+
+class EventLog:
+    """One plant's log, written by its PlantCore's writer thread only."""
+    SNAPSHOT_EVERY = 200_000  # events per segment: bounds replay at recovery
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.segment = max(_segments(directory, "events") + _segments(directory, "snapshot") + [-1])
+        self._events = self._strings = None
+        self._snapshotter: Optional[threading.Thread] = None
+
+    def _open(self, plant: PlantState):
+        # start the next segment, for this plant (its buffer order)
+        if self._events is not None:
+            self.flush()
+            self._events.close()
+            self._strings.close()
+        self.segment += 1
+        self._events = open(_segment(self.directory, "events", self.segment), "ab")
+        self._strings = open(_segment(self.directory, "strings", self.segment), "ab")
+        self._buffer_index = {bid: i for i, bid in enumerate(plant.buffers)}
+        self._rows: List[tuple] = []
+        self._lines: List[bytes] = []
+        self._n_strings = 0
+        self._interned: Dict[str, int] = {}  # colors and operators, once per segment
+        self.since_snapshot = 0
+
+    def _string(self, s: str) -> int:
+        self._lines.append(_escape(s))
+        self._n_strings += 1
+        return self._n_strings - 1
+
+    def _intern(self, s: str) -> int:
+        i = self._interned.get(s)
+        if i is None:
+            i = self._interned[s] = self._string(s)
+        return i
+
+    def _add(self, ts=0.0, ref=0, arg=0, op=0, buffer=NO_BUFFER, flag=0, value=0):
+        self._rows.append((ts, ref, arg, op, buffer, flag, value))
+
+    # events
+
+    def arrival(self, job: Job, buffer_id: Optional[str]):
+        self._add(job.arrival_ts, self._string(str(job.id)), self._intern(job.color), ARRIVAL,
+                  NO_BUFFER if buffer_id is None else self._buffer_index[buffer_id], OVENS.index(job.origin),
+                  job.cross_send_emergency)
+
+    def pick(self, ts: float, buffer_id: str, n: int, operator: str):
+        self._add(ts, self._intern(operator), n, PICK, self._buffer_index[buffer_id])
+
+    def oven(self, oven_id: str, on: bool):
+        self._add(op=OVEN, flag=OVENS.index(oven_id), value=on)
+
+    def buffer_flag(self, buffer_id: str, field: str, value: bool):
+        self._add(op=BUFFER_FLAG, buffer=self._buffer_index[buffer_id], flag=BUFFER_FIELDS.index(field),
+                  value=value)
+
+    def conveyor(self, busy: bool):
+        self._add(op=CONVEYOR, value=busy)
+
+    def drain(self, on: bool):
+        self._add(op=DRAIN, value=on)
+
+    def flush(self):
+        """Write and fsync the events so far (strings first: records never refer to lines not on disk)."""
+        if not self._rows:
+            return
+        if self._lines:
+            self._strings.write(b"\n".join(self._lines) + b"\n")
+            self._strings.flush()
+            os.fsync(self._strings.fileno())
+            self._lines = []
+        self._events.write(np.array(self._rows, dtype=RECORD).tobytes())
+        self._events.flush()
+        os.fsync(self._events.fileno())
+        self.since_snapshot += len(self._rows)
+        self._rows = []
+
+    def due(self) -> bool:
+        return self.since_snapshot >= self.SNAPSHOT_EVERY
+
+    def checkpoint(self, plant: PlantState, drain_mode: bool, wait: bool = False):
+        """
+        Start a new segment from this plant's state. wait: write the snapshot before returning
+        (required when the plant was replaced; otherwise it is written in the background, since
+        replaying the old segments gives the same state until it is on disk).
+        """
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        self._open(plant)
+        path = _segment(self.directory, "snapshot", self.segment)
+        snap, segment = plant.snapshot(), self.segment
+
+        def write():
+            _write_snapshot(path, snap, drain_mode)
+            for kind in ("snapshot", "events", "strings"):
+                for k in _segments(self.directory, kind):
+                    if k < segment:
+                        os.remove(_segment(self.directory, kind, k))
+
+        if wait:
+            write()
+            self._snapshotter = None
+        else:
+            self._snapshotter = threading.Thread(target=write, name="event-log-snapshot", daemon=True)
+            self._snapshotter.start()
+
+    def close(self):
+        if self._events is not None:
+            self.flush()
+            self._events.close()
+            self._strings.close()
+            self._events = None
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+
+
+def read_segment(directory: str, k: int) -> Tuple[np.ndarray, List[bytes]]:
+    """A segment's records and string lines; a torn tail (crash during a write) is dropped."""
+    with open(_segment(directory, "strings", k), "rb") as f:
+        data = f.read()
+    lines = data.split(b"\n")[:-1]  # the last one is empty, or cut off by a crash
+    records = np.fromfile(_segment(directory, "events", k), dtype=np.uint8)
+    records = records[:len(records) - len(records) % RECORD.itemsize].view(RECORD)
+    # records whose strings didn't make it to disk, and everything after them
+    refs = (records["op"] == ARRIVAL) & ((records["ref"] >= len(lines)) | (records["arg"] >= len(lines))) | \
+           (records["op"] == PICK) & (records["ref"] >= len(lines))
+    bad = np.flatnonzero(refs)
+    return (records[:bad[0]] if len(bad) else records), lines
+
+
+def replay(plant: PlantState, drain_mode: bool, records: np.ndarray, lines: List[bytes]) -> bool:
+    """Apply one segment's records to its snapshot plant; returns the drain mode after them."""
+    buffers = list(plant.buffers.values())
+    op = records["op"]
+    arrivals = records[op == ARRIVAL]
+    arrivals = arrivals[arrivals["buffer"] != NO_BUFFER]  # held at the oven: not in any queue
+    picks = records[op == PICK]
+
+    # color codes of the segment's color lines (codes are per process, names are not)
+    color_lines = np.unique(arrivals["arg"])
+    codes = np.zeros(int(color_lines.max()) + 1 if len(color_lines) else 1, dtype=np.int64)
+    for line in color_lines:
+        codes[line] = color_code(_unescape(lines[line]))
+    arrival_colors = codes[arrivals["arg"]]
+
+    # per buffer: the snapshot queue then this segment's pushes, FIFO; picks take from the front
+    painted, offsets, queued = [], [], 0
+    pick_starts = np.zeros(len(picks), dtype=np.int64)
+    for i, b in enumerate(buffers):
+        mine = np.flatnonzero(arrivals["buffer"] == i)
+        pick_idx = np.flatnonzero(picks["buffer"] == i)
+        n = picks["arg"][pick_idx].astype(np.int64)
+        popped = int(n.sum())
+        old = len(b.queue)
+        old_colors = np.fromiter((j.color_code for j in b.queue[:min(popped, old)]), dtype=np.int64)
+        painted.append(np.concatenate([old_colors, arrival_colors[mine][:max(0, popped - old)]]))
+        pick_starts[pick_idx] = queued + np.cumsum(n) - n
+        queued += len(painted[-1])
+        # jobs still queued: the snapshot's that weren't picked, then the newest pushes
+        kept = [] if popped >= old else list(b.queue[popped:])
+        for j in mine[max(0, popped - old):]:
+            r = arrivals[j]
+            job = Job(id=_unescape(lines[r["ref"]]), color=color_name(int(arrival_colors[j])),
+                      origin=OVENS[r["flag"]], arrival_ts=float(r["ts"]), assigned_buffer=b.id,
+                      cross_send_emergency=bool(r["value"]))
+            kept.append(job)
+        b.queue = type(b.queue)(kept)
+        b._shared = False
+        b._rebuild_runs()
+        b._pushed += len(mine)
+        b._popped += popped
+
+    # the pick log: each pick painted its buffer's next n colors
+    if len(picks):
+        n = picks["arg"].astype(np.int64)
+        allc = np.concatenate(painted)
+        idx = np.repeat(pick_starts - (np.cumsum(n) - n), n) + np.arange(int(n.sum()))
+        operators = [_unescape(lines[r]) for r in np.unique(picks["ref"])]
+        op_names = dict(zip(np.unique(picks["ref"]).tolist(), operators))
+        plant.main_conveyor_history.extend(
+            picks["ts"], [buffers[i].id for i in picks["buffer"]], n, allc[idx],
+            [op_names[r] for r in picks["ref"].tolist()])
+
+    # toggles and drain transitions, in order (last one wins)
+    for r in records[(op != ARRIVAL) & (op != PICK)]:
+        if r["op"] == OVEN:
+            plant.oven_states[OVENS[r["flag"]]] = bool(r["value"])
+        elif r["op"] == BUFFER_FLAG:
+            setattr(buffers[r["buffer"]], BUFFER_FIELDS[r["flag"]], bool(r["value"]))
+        elif r["op"] == CONVEYOR:
+            plant.main_conveyor_busy = bool(r["value"])
+        elif r["op"] == DRAIN:
+            drain_mode = bool(r["value"])
+    return drain_mode
+
+
+def recover(directory: str) -> Tuple[Optional[PlantState], bool, dict]:
+    """
+    The plant and drain mode from a log directory: the newest snapshot plus the segments after it.
+    None if there is no snapshot. The stats have events replayed and seconds taken.
+    """
+    t0 = time.perf_counter()
+    snapshots = _segments(directory, "snapshot")
+    if not snapshots:
+        return None, False, {"events": 0, "seconds": 0.0}
+    k = snapshots[-1]
+    with open(_segment(directory, "snapshot", k), "rb") as f:
+        state = pickle.load(f)
+    plant, drain_mode = state["plant"], state["drain_mode"]
+    for b in plant.buffers.values():
+        b._shared = False  # the queues are this plant's own now
+    t_load = time.perf_counter() - t0
+    events = 0
+    for seg in _segments(directory, "events"):
+        if seg >= k:
+            records, lines = read_segment(directory, seg)
+            drain_mode = replay(plant, drain_mode, records, lines)
+            events += len(records)
+    plant.reindex()
+    plant._reset_versions()
+    return plant, drain_mode, {"events": events, "segments": len(_segments(directory, "events")),
+                               "snapshot_s": t_load, "seconds": time.perf_counter() - t0}
+
+
+def main(argv):
+    if len(argv) != 1:
+        raise SystemExit("usage: python -m app.event_log <plant log dir>")
+    plant, drain_mode, stats = recover(argv[0])
+    if plant is None:
+        raise SystemExit(f"No snapshot in {argv[0]}")
+    rate = stats["events"] / max(stats["seconds"] - stats["snapshot_s"], 1e-9)
+    print(f"replayed {stats['events']} events in {stats['seconds']:.3f}s "
+          f"(snapshot {stats['snapshot_s']:.3f}s, {rate:,.0f} events/s)")
+    print(f"{sum(b.occupancy() for b in plant.buffers.values())} jobs queued, "
+          f"{plant.main_conveyor_history.total_colors} painted, drain mode {'on' if drain_mode else 'off'}")
+    for b in plant.buffers.values():
+        print(f"  {b.id}: {b.occupancy()}/{b.capacity}, in {'on' if b.input_available else 'off'}, "
+              f"out {'on' if b.output_available else 'off'}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
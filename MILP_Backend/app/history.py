@@ -0,0 +1,240 @@
+# app/history.py
+"""
+Main-conveyor pick log with bounded memory. The most recent `capacity` picks are kept
+column-wise in NumPy ring buffers (timestamp, plant version, buffer, count, operator,
+and the painted color codes in a second ring), and running aggregates cover everything
+since start: picks, jobs, changeovers, jobs per color and jobs painted in the last
+`window_s` seconds (per-bucket counts, so the window needs no retained picks).
+"""
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from .utils import color_name
+
+
+class ConveyorHistory:
+    def __init__(self, capacity: int = 1000, colors_per_pick: int = 20, window_s: float = 3600.0,
+                 bucket_s: float = 60.0):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.seq = np.zeros(capacity, dtype=np.int64)         # plant version when logged (/state?since=)
+        self.buffer = np.zeros(capacity, dtype=np.int32)      # index into buffer_ids
+        self.n = np.zeros(capacity, dtype=np.int32)
+        self.operator = np.zeros(capacity, dtype=np.int8)     # index into operators
+        self.color_start = np.zeros(capacity, dtype=np.int64)  # absolute position in the color ring
+        self.color_capacity = capacity * colors_per_pick
+        self.colors = np.zeros(self.color_capacity, dtype=np.int32)
+        self.buffer_ids: List[str] = []
+        self.operators: List[str] = []
+        self._buffer_index: Dict[str, int] = {}
+        self._operator_index: Dict[str, int] = {}
+        self.total_picks = 0    # picks ever logged; pick i lives in slot i % capacity while retained
+        self.first = 0          # oldest retained pick
+        self.total_colors = 0   # jobs ever logged (positions in the color ring)
+        # running aggregates
+        self.changeovers = 0       # color changes between consecutive painted jobs
+        self.pick_changeovers = 0  # picks whose first color differs from the previous pick's last
+        self.color_counts: List[int] = []                 # jobs painted per color code
+        self.last_color: Optional[int] = None
+        self.window_s = window_s
+        self.bucket_s = bucket_s
+        self.buckets = np.zeros(max(1, int(round(window_s / bucket_s))), dtype=np.int64)
+        self.last_bucket: Optional[int] = None
+
+    def __len__(self):
+        return self.total_picks - self.first
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def _intern(self, index: Dict[str, int], names: List[str], name: str) -> int:
+        i = index.get(name)
+        if i is None:
+            i = index[name] = len(names)
+            names.append(name)
+        return i
+
+    def append(self, ts: float, buffer_id: str, colors: List[int], operator: str = "controller", seq: int = 0):
+        """Log one pick: its timestamp, buffer, painted color codes (in order), who triggered it and the plant version."""
+        self._store(ts, buffer_id, colors, operator, seq)
+        self._aggregate(ts, colors, len(colors))
+
+    def extend(self, ts: np.ndarray, buffer_ids: Sequence[str], counts: np.ndarray, colors: np.ndarray,
+               operators: Sequence[str]):
+        """
+        Log many picks at once (event log replay): pick i painted colors[sum(counts[:i]):][:counts[i]].
+        Same state as appending them one by one (for timestamps in order), but the aggregates are
+        computed with NumPy over all picks and only the picks that stay retained go into the rings.
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        colors = np.asarray(colors, dtype=np.int64)
+        keep = np.flatnonzero(counts)
+        if not len(keep):
+            return
+        ends = np.cumsum(counts)
+        self._aggregate_bulk(np.asarray(ts, dtype=np.float64)[keep], counts[keep], colors, ends[keep])
+        tail = keep[-self.capacity:]
+        skipped = keep[:len(keep) - len(tail)]
+        if len(skipped):  # pushed out by the tail anyway
+            self.total_picks += len(skipped)
+            self.total_colors += int(ends[skipped[-1]] - (ends[skipped[0]] - counts[skipped[0]]))
+            self.first = self.total_picks
+        for i in tail:
+            self._store(float(ts[i]), buffer_ids[i], colors[ends[i] - counts[i]:ends[i]], operators[i], 0)
+
+    def _store(self, ts: float, buffer_id: str, colors, operator: str, seq: int):
+        k = len(colors)
+        stored = colors[-self.color_capacity:] if k > self.color_capacity else colors  # the newest that fit
+        slot = self.total_picks % self.capacity
+        if len(self) == self.capacity:
+            self.first += 1
+        self.ts[slot] = ts
+        self.seq[slot] = seq
+        self.buffer[slot] = self._intern(self._buffer_index, self.buffer_ids, buffer_id)
+        self.n[slot] = k
+        self.operator[slot] = self._intern(self._operator_index, self.operators, operator)
+        start = self.total_colors + k - len(stored)
+        self.color_start[slot] = start
+        self._write_colors(start, stored)
+        self.total_picks += 1
+        self.total_colors += k
+        # drop retained picks whose colors have been overwritten in the color ring
+        while self.first < self.total_picks and \
+                self.color_start[self.first % self.capacity] < self.total_colors - self.color_capacity:
+            self.first += 1
+
+    def _write_colors(self, start: int, colors: List[int]):
+        a = start % self.color_capacity
+        head = min(len(colors), self.color_capacity - a)
+        self.colors[a:a + head] = colors[:head]
+        if head < len(colors):
+            self.colors[:len(colors) - head] = colors[head:]  # wrapped around
+
+    def _aggregate(self, ts: float, colors: List[int], k: int):
+        # plain Python: a pick has a handful of jobs, too few for NumPy calls to pay off
+        if not k:
+            return
+        counts = self.color_counts
+        last = self.last_color
+        if last is not None and colors[0] != last:
+            self.pick_changeovers += 1
+        for c in colors:
+            if c >= len(counts):
+                counts.extend([0] * (c + 1 - len(counts)))
+            counts[c] += 1
+            if last is not None and c != last:
+                self.changeovers += 1
+            last = c
+        self.last_color = last
+        bucket = int(ts // self.bucket_s)
+        self._advance(bucket)
+        self.buckets[bucket % len(self.buckets)] += k
+
+    def _aggregate_bulk(self, ts: np.ndarray, counts: np.ndarray, colors: np.ndarray, ends: np.ndarray):
+        # _aggregate for many picks (none empty) over their concatenated colors
+        firsts, lasts = colors[ends - counts], colors[ends - 1]
+        self.pick_changeovers += int(np.count_nonzero(firsts[1:] != lasts[:-1]))
+        self.changeovers += int(np.count_nonzero(colors[1:] != colors[:-1]))
+        if self.last_color is not None:
+            self.pick_changeovers += int(firsts[0] != self.last_color)
+            self.changeovers += int(colors[0] != self.last_color)
+        self.last_color = int(colors[-1])
+        per_color = np.bincount(colors)
+        if len(per_color) > len(self.color_counts):
+            self.color_counts.extend([0] * (len(per_color) - len(self.color_counts)))
+        for c in np.flatnonzero(per_color):
+            self.color_counts[c] += int(per_color[c])
+        buckets = (ts // self.bucket_s).astype(np.int64)
+        self._advance(int(buckets.max()))
+        recent = buckets > self.last_bucket - len(self.buckets)  # the rest left the window
+        np.add.at(self.buckets, buckets[recent] % len(self.buckets), counts[recent])
+
+    def _advance(self, bucket: int):
+        # clear the buckets between the last one written and this one
+        if self.last_bucket is None or bucket - self.last_bucket >= len(self.buckets):
+            self.buckets[:] = 0
+        elif bucket > self.last_bucket:
+            for b in range(self.last_bucket + 1, bucket + 1):
+                self.buckets[b % len(self.buckets)] = 0
+        if self.last_bucket is None or bucket > self.last_bucket:
+            self.last_bucket = bucket
+
+    def throughput(self, now: Optional[float] = None) -> int:
+        """Jobs painted in the last window_s seconds (to bucket resolution), up to now or the last pick."""
+        if self.last_bucket is None:
+            return 0
+        n = len(self.buckets)
+        stale = 0 if now is None else int(now // self.bucket_s) - self.last_bucket  # buckets past the window
+        if stale <= 0:
+            return int(self.buckets.sum())
+        if stale >= n:
+            return 0
+        # read-only (no _advance), so concurrent readers of a published snapshot don't race
+        kept = (self.last_bucket - np.arange(n - stale)) % n
+        return int(self.buckets[kept].sum())
+
+    def entry(self, i: int) -> dict:
+        """Pick i of the retained ones (negative counts from the newest) as the API's dict."""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("history index out of range")
+        slot = (self.first + i) % self.capacity
+        start, k = int(self.color_start[slot]), int(self.n[slot])
+        stored = min(k, self.total_colors - start)  # fewer only for a pick larger than the color ring
+        pos = np.arange(start, start + stored) % self.color_capacity
+        return {
+            "ts": float(self.ts[slot]),
+            "buffer": self.buffer_ids[self.buffer[slot]],
+            "n": k,
+            "colors": [color_name(int(c)) for c in self.colors[pos]],
+            "operator": self.operators[self.operator[slot]],
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.entry(i)
+
+    def recent(self, limit: Optional[int] = None) -> List[dict]:
+        """The newest `limit` retained picks (all retained ones by default), oldest first."""
+        count = len(self) if limit is None else min(limit, len(self))
+        return [self.entry(i) for i in range(len(self) - count, len(self))]
+
+    def since(self, seq: int, limit: Optional[int] = None) -> List[dict]:
+        """Retained picks logged at a plant version after seq (the newest `limit` of them), oldest first."""
+        i = len(self)
+        while i > 0 and self.seq[(self.first + i - 1) % self.capacity] > seq:
+            i -= 1
+        count = len(self) - i if limit is None else min(limit, len(self) - i)
+        return [self.entry(j) for j in range(len(self) - count, len(self))]
+
+    def summary(self, now: Optional[float] = None) -> dict:
+        return {
+            "picks": self.total_picks,
+            "jobs": self.total_colors,
+            "changeovers": self.changeovers,
+            "retained_picks": len(self),
+            "window_s": self.window_s,
+            "jobs_in_window": self.throughput(now),
+            "color_counts": {color_name(c): int(n) for c, n in enumerate(self.color_counts) if n},
+        }
+
+    def recode(self, codes: Sequence[int]):
+        """Translate the color codes in place, old code c -> codes[c] (a history pickled by another process)."""
+        codes = np.asarray(codes, dtype=np.int32)
+        self.colors = codes[self.colors]
+        counts = [0] * (int(codes.max()) + 1)
+        for c, n in enumerate(self.color_counts):
+            counts[codes[c]] += n
+        self.color_counts = counts
+        if self.last_color is not None:
+            self.last_color = int(codes[self.last_color])
+
+    def copy(self) -> "ConveyorHistory":
+        """Independent copy; bounded by capacity, not by how long the plant has run."""
+        h = ConveyorHistory.__new__(ConveyorHistory)
+        h.__dict__.update(self.__dict__)
+        for name in ("ts", "seq", "buffer", "n", "operator", "color_start", "colors", "color_counts", "buckets"):
+            setattr(h, name, getattr(self, name).copy())  # arrays, and the color_counts list
+        h.buffer_ids, h.operators = list(self.buffer_ids), list(self.operators)
+        h._buffer_index, h._operator_index = dict(self._buffer_index), dict(self._operator_index)
+        return h
@@ -1,15 +1,15 @@
 # app/main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .demo_data import default_plant
-from .controller import OnlineController
-from .simulator import PlantSim
-from .milp_benchmark import milp_short_horizon
-from .models import Job
-import simpy
-import uuid
-from .utils import sample_color
-from typing import Dict
+from fastapi.responses import JSONResponse, StreamingResponse
+from .solver_jobs import SOLVER_JOBS
+from .sim_batch import run_batch
+from .plants import DEFAULT_PLANT, UnknownPlant, make_plants
+from pydantic import BaseModel, Field
+import asyncio
+import json
+import os
+from typing import Annotated, Dict, List, Literal, Optional, Union
 
 app = FastAPI(title="Smart Sequencing Backend")
 
@@ -22,136 +22,338 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-PLANT = default_plant()
-CONTROLLER = OnlineController(PLANT)
+# named plants, each with its own single-writer core (app/plants.py): handlers change a plant
+# only through PLANTS.call(plant, command) and read it through PLANTS.read(plant, read), served
+# from its latest published snapshot. PLANT_SHARDS=N hosts them in N worker processes;
+# PLANT_LOG_DIR logs every plant's mutations there (app/event_log.py) and recovers them at start.
+PLANTS = make_plants(int(os.environ.get("PLANT_SHARDS", 0)), os.environ.get("PLANT_LOG_DIR"))
+for recovered in PLANTS.recover():
+    print(f"Recovered plant {recovered['plant_id']}: {recovered['events']} events replayed "
+          f"in {recovered['seconds']:.2f}s")
+if DEFAULT_PLANT not in PLANTS.ids():
+    PLANTS.create(DEFAULT_PLANT)
+
+
+@app.on_event("startup")
+def startup():
+    SOLVER_JOBS.start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    PLANTS.stop()
+    SOLVER_JOBS.shutdown()
+
+
+@app.exception_handler(UnknownPlant)
+def unknown_plant(request: Request, e: UnknownPlant):
+    return JSONResponse(status_code=404, content={"detail": f"Plant {e.args[0]} not found"})
+
 
 @app.get("/")
 def get_check():
     return {"message":"Sequencing Backend is running."}
 
+
+class PlantSpec(BaseModel):
+    plant_id: str = Field(min_length=1, max_length=64, pattern=r"^[A-Za-z0-9_.-]+$")
+    capacities: Optional[Dict[str, int]] = None  # per buffer (L1-L9), the demo capacities if omitted
+    queue_backend: Literal["list", "runs"] = "list"
+    params: Optional[dict] = None                # OnlineController settings
+
+
+@app.get("/plants")
+def list_plants():
+    return {"plants": PLANTS.ids()}
+
+
+@app.post("/plants")
+def create_plant(spec: PlantSpec):
+    """
+    Add a plant: its own buffers (the demo layout, optionally other capacities), controller and
+    writer. Every plant endpoint takes ?plant=<plant_id> (default: the "default" plant).
+    """
+    try:
+        res = PLANTS.create(spec.plant_id, spec.capacities, spec.queue_backend, spec.params)
+    except ValueError as e:
+        raise HTTPException(409 if "already exists" in str(e) else 400, str(e))
+    return {"status": "created", **res}
+
+
+@app.delete("/plants/{plant_id}")
+def delete_plant(plant_id: str):
+    """Remove a plant (cancelling its background drain job, if any)."""
+    if plant_id == DEFAULT_PLANT:
+        raise HTTPException(400, "The default plant cannot be removed")
+    PLANTS.remove(plant_id)
+    return {"status": "removed", "plant_id": plant_id}
+
+
 @app.get("/state")
-def get_state():
-    return {
-        "buffers": {k: v.to_dict() for k, v in PLANT.buffers.items()},
-        "main_history": PLANT.main_conveyor_history,
-        "total_capacity": CONTROLLER.total_capacity(),
-        "total_occupancy": CONTROLLER.total_occupancy(),
-        "oven_states": PLANT.oven_states,
-        "main_conveyor_busy": PLANT.main_conveyor_busy
-    }
+def get_state(since: int = 0, history_limit: int = 100, plant: str = DEFAULT_PLANT):
+    """
+    Plant state with its version. since: the version of a state the client already has; then
+    buffers holds only the buffers changed after it, as BufferLine.to_delta (jobs popped from the
+    head, jobs pushed to the tail) or, after many changes, with the whole queue, and main_history
+    only the picks logged after it (full is false). full is true when since is 0 or from before
+    the last /reset.
+    history_limit: at most this many (newest) picks in main_history; history_stats covers every
+    pick since start. Served from the latest published snapshot, without waiting for writes.
+    """
+    return PLANTS.read(plant, "state", since, history_limit)
+
+
+@app.get("/state/stream")
+async def stream_state(request: Request, since: int = 0, history_limit: int = 100, interval: float = 0.25,
+                       plant: str = DEFAULT_PLANT):
+    """
+    Server-sent events: a "state" event (state_payload since the previous one) whenever the plant
+    version changes, checked every interval seconds. The event id is the version, so a reconnecting
+    EventSource resumes from Last-Event-ID with a delta.
+    """
+    last = int(request.headers.get("last-event-id") or since)
+    interval = max(interval, 0.05)
+    PLANTS.read(plant, "buffer_ids")  # 404 before the stream starts
+
+    async def events():
+        nonlocal last
+        idle = 0.0
+        while not await request.is_disconnected():
+            payload = await asyncio.to_thread(PLANTS.read, plant, "state_if_changed", last, history_limit)
+            if payload is not None:
+                last = payload["version"]
+                idle = 0.0
+                yield f"id: {last}\nevent: state\ndata: {json.dumps(payload)}\n\n"
+            elif idle >= 15.0:
+                idle = 0.0
+                yield ": keepalive\n\n"  # keeps proxies from closing an idle stream
+            await asyncio.sleep(interval)
+            idle += interval
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+class JobIn(BaseModel):
+    id: str
+    color: str
+    origin: Literal["O1", "O2"] = "O1"
+    arrival_ts: Optional[float] = None  # now if omitted
+
+
+class BufferIn(BaseModel):
+    capacity: int = Field(ge=1)
+    queue: List[JobIn] = []  # head first
+    input_available: bool = True
+    output_available: bool = True
+    reserve_headroom: int = Field(0, ge=0)
+
+
+class PlantStateIn(BaseModel):
+    buffers: Dict[str, BufferIn]
+    oven_states: Dict[Literal["O1", "O2"], bool] = {}
+    main_conveyor_busy: bool = False
 
 
 @app.post("/set-state")
-def set_state(state):
-    global PLANT, CONTROLLER
-    PLANT = state
-    CONTROLLER = OnlineController(PLANT)
+def set_state(state: PlantStateIn, plant: str = DEFAULT_PLANT):
+    """
+    Replace the plant's buffers, queues and flags (the shape /state returns; extra fields such as
+    occupancy are ignored) under the current controller settings; like /reset, drain mode ends and
+    /state?since= clients get a full state next.
+    """
+    try:
+        PLANTS.call(plant, "set_state", state.model_dump())
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     return {"status": "state_set"}
 
 
 @app.post("/arrival")
-def arrival(oven: str = "O1", color: str = None):
+def arrival(oven: str = "O1", color: str = None, plant: str = DEFAULT_PLANT):
     if oven not in ["O1", "O2"]:
         raise HTTPException(400, "oven must be O1 or O2")
-    
-    # If O2 is off, reroute all jobs to O1
-    original_oven = oven
-    if oven == "O2" and not PLANT.oven_states.get("O2", True):
-        oven = "O1"
-        print(f"Oven O2 is OFF - Rerouting job from {original_oven} to O1")
-    
-    color = color or sample_color()
-    job = Job(id=str(uuid.uuid4()), color=color, origin=oven)
-    assigned = CONTROLLER.assign_job(job, hold_at_oven_allowed=True)
-    
-    return {
-        "job_id": job.id, 
-        "assigned_buffer": assigned, 
-        "job": job.to_dict(),
-        "original_oven": original_oven,
-        "rerouted": original_oven != oven
-    }
+    return PLANTS.call(plant, "arrive", oven, color)
 
 
 @app.post("/trigger_pick")
-def trigger_pick_manual(buffer_id: str = None, n: int = 1):
-    if not buffer_id:
-        buffer_id, n = CONTROLLER.decide_pick()
-        if not buffer_id:
-            return {"status": "no_pick"}
-    picked = CONTROLLER.execute_pick(buffer_id, n, operator="manual")
-    return {"picked_n": len(picked), "colors": [p.color for p in picked]}
+def trigger_pick_manual(buffer_id: str = None, n: int = 1, plant: str = DEFAULT_PLANT):
+    res = PLANTS.call(plant, "pick", buffer_id, n)
+    if not res["buffer_id"]:
+        return {"status": "no_pick"}
+    return {"picked_n": res["picked_n"], "colors": res["colors"]}
+
+
+class ArrivalEvent(BaseModel):
+    type: Literal["arrival"]
+    oven: Literal["O1", "O2"] = "O1"
+    color: Optional[str] = None   # sampled from the color distribution if omitted
+    id: Optional[str] = None      # the MES job id; a uuid4 if omitted
+
+
+class PickEvent(BaseModel):
+    type: Literal["pick"]
+    buffer_id: Optional[str] = None  # the controller decides (buffer and n) if omitted
+    n: int = Field(1, ge=1)
+
+
+class EventBatch(BaseModel):
+    events: List[Annotated[Union[ArrivalEvent, PickEvent], Field(discriminator="type")]]
+
+
+@app.post("/events")
+def ingest_events(batch: EventBatch, plant: str = DEFAULT_PLANT):
+    """
+    Apply an ordered batch of oven arrivals and picks as one command (no other request
+    interleaves), as /arrival and /trigger_pick would one at a time. Returns one result per
+    event, in order: arrivals with job_id, assigned_buffer (null: held at the oven) and rerouted,
+    picks with buffer_id (null: nothing to pick), picked_n and colors. Unknown buffer ids reject
+    the whole batch before any event is applied.
+    """
+    unknown = {e.buffer_id for e in batch.events if e.type == "pick" and e.buffer_id} - set(
+        PLANTS.read(plant, "buffer_ids"))
+    if unknown:
+        raise HTTPException(404, f"Unknown buffers {sorted(unknown)}")
+    res = PLANTS.call(plant, "events", [e.model_dump() for e in batch.events])
+    if res["rerouted"]:
+        print(f"Oven O2 is OFF - Rerouted {res['rerouted']} jobs of the batch to O1")
+    return {"status": "applied", "events": len(res["results"]), "results": res["results"]}
 
 
 @app.post("/run_sim")
-def run_sim(seconds: int = 3600, o1_rate: float = 6.0, o2_rate: float = 6.0):
-    env = simpy.Environment()
-    # clone plant to avoid mutating global state
-    import copy
-    plant_copy = copy.deepcopy(PLANT)
-    ctrl = OnlineController(plant_copy, params={
-        "R_min": CONTROLLER.R_min,
-        "occ_high": CONTROLLER.occ_high_threshold,
-        "global_high": CONTROLLER.global_high_threshold,
-        "hold_limit": CONTROLLER.HOLD_LIMIT,
-        "K_max": CONTROLLER.K_max
-    })
-    sim = PlantSim(env, plant_copy, ctrl, o1_rate=o1_rate,
-                   o2_rate=o2_rate, max_time=seconds)
-    stats = sim.run(until=seconds)
-    return {"stats": stats, "final_buffers": {k: v.to_dict() for k, v in plant_copy.buffers.items()}}
+def run_sim(seconds: int = 3600, o1_rate: float = 6.0, o2_rate: float = 6.0, event_driven: bool = False,
+            seed: Optional[int] = None, plant: str = DEFAULT_PLANT):
+    # event_driven: skip the 1 s ticks (PlantSim event-driven mode), for long runs
+    # seed: reproducible arrivals and colors (own random.Random instead of the global one)
+    # simulated on a copy of the plant's published snapshot: the live plant is untouched
+    return PLANTS.read(plant, "run_sim", seconds, o1_rate, o2_rate, event_driven, seed)
+
+
+@app.post("/run_sim_batch")
+def run_sim_batch(replications: int = 8, seconds: int = 3600, o1_rate: float = 6.0, o2_rate: float = 6.0,
+                  seed: int = 0, event_driven: bool = True, confidence: float = 0.95, plant: str = DEFAULT_PLANT):
+    """
+    Monte Carlo batch (sim_batch.run_batch): replications seeded seed, seed+1, ... from the demo
+    plant with the plant's current controller settings, in parallel worker processes. Returns mean,
+    std and confidence interval of throughput, changeovers, overflows and cross-sends, plus every run.
+    """
+    if replications < 2 or not 0 < confidence < 1:
+        raise HTTPException(400, "Need replications >= 2 and 0 < confidence < 1")
+    return run_batch(replications, seed=seed, seconds=seconds, o1_rate=o1_rate, o2_rate=o2_rate,
+                     params=PLANTS.read(plant, "sim_params"), event_driven=event_driven, confidence=confidence)
 
 
 @app.post("/milp")
-def run_milp(horizon_slots: int = 50):
-    # run MILP on current plant heads
-    jobs = []
-    for b in PLANT.buffers.values():
-        for job in b.queue:
-            jobs.append(job)
-    res = milp_short_horizon(jobs, PLANT.buffers, horizon_slots=horizon_slots)
-    return res
+def run_milp(horizon_slots: int = 50, model: str = "time_indexed", background: bool = False,
+             plant: str = DEFAULT_PLANT):
+    # run MILP on current plant heads; model: "time_indexed" or "blocks" (milp_benchmark.SEQUENCE_MODELS)
+    # background: submit as a solver job and return its id right away (see /solver_jobs)
+    # solved on the published snapshot; writes go on meanwhile
+    try:
+        if background:
+            job = SOLVER_JOBS.submit_sequence(model, PLANTS.read(plant, "head_items"), horizon_slots)
+            return {"status": "submitted", "job_id": job.id}
+        return PLANTS.read(plant, "milp", horizon_slots, model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.post("/reset")
-def reset():
-    global PLANT, CONTROLLER
-    PLANT = default_plant()
-    CONTROLLER = OnlineController(PLANT)
+def reset(plant: str = DEFAULT_PLANT):
+    # rebuilds the plant as created; continues the version sequence: /state?since= clients get a full state next
+    PLANTS.reset(plant)
     return {"status": "reset"}
 
 
 @app.post("/enter_drain")
-def enter_drain(use_milp: bool = True):
+def enter_drain(use_milp: bool = True, background: bool = False, plant: str = DEFAULT_PLANT):
     """
     Signal the controller to switch to drain mode and compute an optimal drain plan.
-    use_milp: attempt MILP planning; if False or MILP fails, will use greedy planner.
+    use_milp: use the optimizing planner (exact by default); if False or it fails, will use greedy planner.
+    background: start draining on the greedy plan right away and run the optimizing planner as a
+    solver job; the controller swaps its plan in when it finishes (detail.background_job is the id).
+    Planning runs on the plant's writer thread, so its other writes wait for it (reads and other
+    plants don't); use background for long planners. With PLANT_SHARDS the job runs in the plant's
+    shard: follow it with /drain_status, not /solver_jobs.
     """
     try:
-        res = CONTROLLER.enter_drain_mode(use_milp=use_milp)
+        res = PLANTS.call(plant, "enter_drain", use_milp, background)
         return {"status": "drain_mode_entered", "detail": res}
+    except UnknownPlant:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/exit_drain")
-def exit_drain():
+def exit_drain(plant: str = DEFAULT_PLANT):
     """Exit drain mode and return to normal operation."""
-    CONTROLLER.exit_drain_mode()
+    PLANTS.call(plant, "exit_drain")
     return {"status": "drain_mode_exited"}
 
 
 @app.get("/drain_status")
-def drain_status():
+def drain_status(plant: str = DEFAULT_PLANT):
     """Get current drain mode status."""
-    return {
-        "drain_mode": getattr(CONTROLLER, "drain_mode", False),
-        "plan_len": len(getattr(CONTROLLER, "drain_plan", []))
-    }
+    return PLANTS.call(plant, "drain_status")
+
+
+def _solver_job(job_id: str):
+    job = SOLVER_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Solver job {job_id} not found")
+    return job
+
+
+@app.get("/solver_jobs")
+def list_solver_jobs():
+    """Background solver jobs, most recent last."""
+    return {"jobs": [job.to_dict() for job in SOLVER_JOBS.jobs.values()]}
+
+
+@app.get("/solver_jobs/{job_id}")
+def solver_job_status(job_id: str):
+    """Status (pending, running, done, failed, cancelled), elapsed seconds and result summary."""
+    return _solver_job(job_id).to_dict()
+
+
+@app.get("/solver_jobs/{job_id}/intermediate")
+def solver_job_intermediate(job_id: str, since: int = 0):
+    """
+    Improving solutions published so far (from index since), each with t (seconds since submit):
+    drain jobs send changeovers and plan, /milp jobs objective, bound, solve_s and sequence.
+    """
+    updates = _solver_job(job_id).intermediate(since)
+    return {"since": since, "next": since + len(updates), "updates": updates}
+
+
+@app.get("/solver_jobs/{job_id}/incumbent")
+def solver_job_incumbent(job_id: str):
+    """Best solution published so far (null before the first), usable before the job finishes."""
+    job = _solver_job(job_id)
+    return {"status": job.status, "incumbent": job.incumbent()}
+
+
+@app.get("/solver_jobs/{job_id}/result")
+def solver_job_result(job_id: str):
+    """Full result (plan or sequence) once the job has finished."""
+    job = _solver_job(job_id)
+    res = job.result()
+    if res is None:
+        raise HTTPException(409, f"Solver job {job_id} is {job.status}")
+    return res
+
+
+@app.post("/solver_jobs/{job_id}/cancel")
+def cancel_solver_job(job_id: str):
+    """Cancel a job: pending jobs never start, running ones stop and keep their best solution so far."""
+    job = _solver_job(job_id)
+    job.cancel()
+    return job.to_dict()
 
 
 @app.post("/toggle_oven")
-def toggle_oven(oven_id: str):
+def toggle_oven(oven_id: str, plant: str = DEFAULT_PLANT):
     """Toggle oven state (only O2 can be toggled, O1 is always on)."""
     if oven_id not in ["O1", "O2"]:
         raise HTTPException(400, "oven_id must be O1 or O2")
@@ -161,67 +363,60 @@ def toggle_oven(oven_id: str):
         raise HTTPException(400, "Oven O1 cannot be toggled - it is always active")
     
     # Only O2 can be toggled
-    current_state = PLANT.oven_states.get(oven_id, True)
-    PLANT.oven_states[oven_id] = not current_state
+    new_state = PLANTS.call(plant, "toggle_oven", oven_id)
     
     return {
         "status": "success",
         "oven_id": oven_id,
-        "new_state": PLANT.oven_states[oven_id],
-        "message": f"Oven {oven_id} {'activated' if PLANT.oven_states[oven_id] else 'deactivated'}"
+        "new_state": new_state,
+        "message": f"Oven {oven_id} {'activated' if new_state else 'deactivated'}"
     }
 
 
 @app.post("/toggle_buffer")
-def toggle_buffer(buffer_id: str, field: str = "input_available"):
+def toggle_buffer(buffer_id: str, field: str = "input_available", plant: str = DEFAULT_PLANT):
     """Toggle buffer input or output availability."""
-    if buffer_id not in PLANT.buffers:
+    if buffer_id not in PLANTS.read(plant, "buffer_ids"):
         raise HTTPException(404, f"Buffer {buffer_id} not found")
     
     if field not in ["input_available", "output_available"]:
         raise HTTPException(400, "field must be 'input_available' or 'output_available'")
     
-    buffer = PLANT.buffers[buffer_id]
-    current_value = getattr(buffer, field)
-    setattr(buffer, field, not current_value)
+    new_state = PLANTS.call(plant, "toggle_buffer", buffer_id, field)
     
     return {
         "status": "success",
         "buffer_id": buffer_id,
         "field": field,
-        "new_state": getattr(buffer, field),
-        "message": f"Buffer {buffer_id} {field.replace('_', ' ')} {'enabled' if getattr(buffer, field) else 'disabled'}"
+        "new_state": new_state,
+        "message": f"Buffer {buffer_id} {field.replace('_', ' ')} {'enabled' if new_state else 'disabled'}"
     }
 
 
 @app.post("/set_buffer_state")
-def set_buffer_state(buffer_id: str, input_available: bool = None, output_available: bool = None):
+def set_buffer_state(buffer_id: str, input_available: bool = None, output_available: bool = None,
+                     plant: str = DEFAULT_PLANT):
     """Set buffer input and/or output availability states."""
-    if buffer_id not in PLANT.buffers:
+    if buffer_id not in PLANTS.read(plant, "buffer_ids"):
         raise HTTPException(404, f"Buffer {buffer_id} not found")
     
-    buffer = PLANT.buffers[buffer_id]
-    
-    if input_available is not None:
-        buffer.input_available = input_available
-    if output_available is not None:
-        buffer.output_available = output_available
+    res = PLANTS.call(plant, "set_buffer_state", buffer_id, input_available, output_available)
     
     return {
         "status": "success",
         "buffer_id": buffer_id,
-        "input_available": buffer.input_available,
-        "output_available": buffer.output_available
+        "input_available": res["input_available"],
+        "output_available": res["output_available"]
     }
 
 
 @app.post("/toggle_main_conveyor")
-def toggle_main_conveyor():
+def toggle_main_conveyor(plant: str = DEFAULT_PLANT):
     """Toggle main conveyor busy state."""
-    PLANT.main_conveyor_busy = not PLANT.main_conveyor_busy
+    new_state = PLANTS.call(plant, "toggle_main_conveyor")
     
     return {
         "status": "success",
-        "new_state": PLANT.main_conveyor_busy,
-        "message": f"Main conveyor {'blocked' if PLANT.main_conveyor_busy else 'unblocked'}"
+        "new_state": new_state,
+        "message": f"Main conveyor {'blocked' if new_state else 'unblocked'}"
     }
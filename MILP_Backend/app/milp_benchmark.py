@@ -1,28 +1,59 @@
 # app/milp_benchmark.py
 from ortools.sat.python import cp_model
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 from .models import Job, BufferLine, PlantState
-from .utils import changeover_cost
+from .utils import changeover_cost, color_name
+from collections import defaultdict
 import math
+import threading
+import time
 
-def milp_short_horizon(jobs: List[Job], buffers: Dict[str, BufferLine], horizon_slots: int = 50):
+HEAD_ITEMS_PER_BUFFER = 30  # K: jobs per buffer the model sees (increased from 10)
+
+def milp_short_horizon(jobs: List[Job], buffers: Dict[str, BufferLine], horizon_slots: int = 50,
+                       model: str = "time_indexed", on_solution=None):
     """
     Simple CP-SAT to sequence up to horizon_slots jobs from heads of buffers.
     We model pick slots 0..horizon_slots-1; at most one buffer chosen per slot.
     Each job can be scheduled at most once (we only consider current head-run aggregated jobs).
     This is a simplified benchmark: aggregate-level to compute sequence minimizing changeovers.
+    model: "time_indexed" (sequence_items) or "blocks" (sequence_runs), see SEQUENCE_MODELS.
+    on_solution: called with every improving solution while the solver runs (see sequence_items).
     """
-    # Prepare candidate items: for each buffer, take up to K items from head preserving order
-    K = 30  # Increased from 10 to see more jobs per buffer
-    items = []  # (buffer_id, color)
-    from copy import deepcopy
+    items = head_items(buffers)
+    if model not in SEQUENCE_MODELS:
+        raise ValueError(f"Unknown sequencing model {model!r}; available: {sorted(SEQUENCE_MODELS)}")
+    return SEQUENCE_MODELS[model](items, horizon_slots=horizon_slots, on_solution=on_solution)
+
+
+def head_items(buffers: Dict[str, BufferLine], K: int = HEAD_ITEMS_PER_BUFFER) -> List[Tuple[str, int, object]]:
+    """Candidate items for the models: up to K jobs from the head of each buffer, in queue order."""
+    items = []  # (buffer_id, color code, job_id)
     for b in buffers.values():
-        for i, job in enumerate(b.queue[:K]):
-            items.append((b.id, job.color, job.id))
+        for job in b.queue[:K]:
+            items.append((b.id, job.color_code, job.id))
+    return items
+
 
+def sequence_items(items: List[Tuple[str, int, object]], horizon_slots: int = 50,
+                   time_limit: float = 20.0, workers: int = 8,
+                   last_color: Optional[int] = None, hint: Optional[List[str]] = None,
+                   stop_event=None, on_solution=None):
+    """
+    CP-SAT core of milp_short_horizon on prepared (buffer_id, color code, job_id) items,
+    listed head first within each buffer.
+    last_color: color painted before the first slot (changing away from it counts).
+    hint: buffer id of every job in a known pick order (e.g. an earlier plan), used as AddHint.
+    stop_event: threading/multiprocessing Event; setting it ends the search early
+    (the best solution so far is returned).
+    on_solution: called from the solver with {"t", "objective", "bound", "sequence"} for every
+    improving solution, so callers can use the incumbent before the time limit. Either way
+    stats["trace"] lists (seconds, objective, bound) per solution, for time-to-quality charts.
+    """
     if not items:
         return {"status": "no_items"}
 
+    t0 = time.perf_counter()
     model = cp_model.CpModel()
     S = len(items)
     T = min(horizon_slots, S)
@@ -63,7 +94,6 @@ def milp_short_horizon(jobs: List[Job], buffers: Dict[str, BufferLine], horizon_
         model.Add(sum(t * x[(t,s)] for t in range(T)) == pos[s]).OnlyEnforceIf(scheduled[s])
 
     # precedence constraints per buffer
-    from collections import defaultdict
     buf_items = defaultdict(list)
     for idx, (bid, color, jid) in enumerate(items):
         buf_items[bid].append(idx)
@@ -71,15 +101,19 @@ def milp_short_horizon(jobs: List[Job], buffers: Dict[str, BufferLine], horizon_
         for i in range(len(s_list)-1):
             s1 = s_list[i]
             s2 = s_list[i+1]
-            # if both scheduled then pos[s1] < pos[s2]
+            # FIFO: s2 can only be picked after s1, so scheduling s2 needs s1 scheduled earlier
+            model.AddImplication(scheduled[s2], scheduled[s1])
             model.Add(pos[s1] < pos[s2]).OnlyEnforceIf([scheduled[s1], scheduled[s2]])
 
     # objective: minimize total changeovers (color changes) in scheduled sequence
     # We approximate: add variables prev_color_change[t] that indicate color change between slot t-1 and t
     # We'll linearize by computing color at each slot via indicator variables.
-    colors = list({c for _, c, _ in items})
+    colors = sorted({c for _, c, _ in items})
     color_idx = {c:i for i,c in enumerate(colors)}
     C = len(colors)
+    items_of_color = defaultdict(list)  # color code -> item indices
+    for s, (_, c, _) in enumerate(items):
+        items_of_color[c].append(s)
 
     y = {}  # y[t,c] = 1 if slot t has color c
     for t in range(T):
@@ -87,69 +121,301 @@ def milp_short_horizon(jobs: List[Job], buffers: Dict[str, BufferLine], horizon_
             y[(t,c)] = model.NewBoolVar(f"y_t{t}_c{c}")
         # link y with x: y[t,c] == sum_s [x[t,s] & item_color==c]
         for c_idx, c in enumerate(colors):
-            model.Add(sum(x[(t,s)] for s in range(S) if items[s][1] == c) == y[(t,c)])
+            model.Add(sum(x[(t,s)] for s in items_of_color[c]) == y[(t,c_idx)])
 
     # Ensure at most one color per slot
     for t in range(T):
         model.Add(sum(y[(t,c)] for c in range(C)) <= 1)
 
-    # compute changeovers: z[t] = 1 if slot t and t-1 exist and color differs
+    # slot_used[t] = 1 if slot t holds an item; slots fill from the front so an empty
+    # slot can't be used to hide a color change
+    slot_used = {}
+    for t in range(T):
+        slot_used[t] = model.NewBoolVar(f"slot_used_{t}")
+        model.Add(sum(x[(t,s)] for s in range(S)) == slot_used[t])
+        if t > 0:
+            model.Add(slot_used[t] <= slot_used[t-1])
+
+    # compute changeovers: z[t] = 1 if slot t is used and its color differs from slot t-1
     z = {}
     for t in range(1, T):
         z[t] = model.NewBoolVar(f"z_{t}")
-        # z[t] >= y[t,c] - y[t-1,c] for any c when they differ. Use linearization:
-        # For all pairs of colors c1,c2 with c1!=c2: if y[t,c1]==1 and y[t-1,c2]==1 then z[t]==1
-        # Simpler relaxation: z[t] >= sum_c y[t,c] + sum_c y[t-1,c] - 2*same_color_match
-        # We'll implement exact: z[t] >= y[t,c1] + y[t-1,c2] for any c1!=c2 minus 1
-        # Instead, compute same_color[t] = sum_c (y[t,c] & y[t-1,c]) and z[t] = scheduled_t_minus1_and_t - same_color
-        scheduled_t = model.NewBoolVar(f"scheduled_t{t}")
-        scheduled_t_minus = model.NewBoolVar(f"scheduled_t{t-1}")
-        model.Add(sum(x[(t,s)] for s in range(S)) == scheduled_t)
-        model.Add(sum(x[(t-1,s)] for s in range(S)) == scheduled_t_minus)
+        # same_color[t] = 1 iff slots t and t-1 are both used with the same color:
+        # same_color <= sum_c y[t,c] ; same_color <= sum_c y[t-1,c];
+        # and for each c, y[t,c] + y[t-1,c] - 1 <= same_color <= 1 - y[t,c] + y[t-1,c]
         same_color = model.NewBoolVar(f"same_color_{t}")
-        # same_color => exists c with y[t,c]==1 and y[t-1,c]==1
-        # force same_color == 1 if any c satisfies both y vars
-        # same_color <= sum_c y[t,c] ; same_color <= sum_c y[t-1,c]; and for each c, same_color >= y[t,c] + y[t-1,c] -1
         model.Add(same_color <= sum(y[(t,c)] for c in range(C)))
         model.Add(same_color <= sum(y[(t-1,c)] for c in range(C)))
         for c in range(C):
             model.Add(same_color >= y[(t,c)] + y[(t-1,c)] - 1)
+            model.Add(same_color <= 1 - y[(t,c)] + y[(t-1,c)])
 
-        # z[t] is 1 iff both scheduled and not same_color
-        model.Add(z[t] >= scheduled_t)
-        model.Add(z[t] >= scheduled_t_minus)
-        model.Add(z[t] <= scheduled_t)
-        model.Add(z[t] <= scheduled_t_minus)
-        # z[t] <= 1 - same_color + bigM*(1 - both_scheduled)
-        # enforce: if both scheduled and same_color==1 -> z==0 ; if both scheduled and same_color==0 -> z==1
-        model.Add(z[t] + same_color >= scheduled_t)  # when scheduled_t=1 and scheduled_t_minus=1 and same_color=0 -> z>=1
-        model.Add(z[t] <= 1 - same_color + (1 - scheduled_t) + (1 - scheduled_t_minus))
+        # slot t-1 is always used when slot t is, so z[t] = slot_used[t] and not same_color
+        model.Add(z[t] >= slot_used[t] - same_color)
+        model.Add(z[t] <= slot_used[t])
+        model.Add(z[t] <= 1 - same_color)
 
     # objective: minimize sum z[t] (changeovers) and maximize scheduled items
     obj_terms = []
+    if last_color is not None:
+        # slot 0 is a changeover unless it continues the color painted before
+        obj_terms.append(slot_used[0] - y[(0, color_idx[last_color])] if last_color in color_idx else slot_used[0])
     for t in range(1, T):
         obj_terms.append(z[t])
-    # penalize unscheduled items lightly so solver schedules more
+    # an unscheduled item costs more than the most changeovers a sequence can have (T, one per
+    # slot counting slot 0 against last_color), so the solver always fills the horizon
     for s in range(S):
-        obj_terms.append((1 - scheduled[s]) * 0.01)  # 0.01 penalty per unscheduled
+        obj_terms.append((1 - scheduled[s]) * (T + 1))
 
     model.Minimize(sum(obj_terms))
+    if hint is not None:
+        order = dict((s, t) for t, s in enumerate(_hint_order(items, hint, T)))
+        for (t, s), var in x.items():
+            model.AddHint(var, order.get(s) == t)
 
-    solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 20.0  # Increased from 10.0
-    solver.parameters.num_search_workers = 8
-    res = solver.Solve(model)
-    if res == cp_model.OPTIMAL or res == cp_model.FEASIBLE:
+    build_s = time.perf_counter() - t0
+
+    def extract(value):
         seq = []
         for t in range(T):
             for s in range(S):
-                if solver.Value(x[(t,s)]) == 1:
+                if value(x[(t,s)]) == 1:
                     seq.append({
                         "time_slot": t,
                         "buffer": items[s][0],
-                        "color": items[s][1],
+                        "color": color_name(items[s][1]),
                         "job_id": items[s][2]
                     })
-        return {"status": "ok", "sequence": seq}
+        return seq
+
+    stream = _SolutionStream(extract, on_solution)
+    solver, res = _solve_model(model, time_limit, workers, stop_event, stream)
+    if res == cp_model.OPTIMAL or res == cp_model.FEASIBLE:
+        return {"status": "ok", "sequence": extract(solver.Value), "stats": _solve_stats(solver, res, build_s, stream)}
+    elif res == cp_model.INFEASIBLE:
+        return {"status": "infeasible"}
     else:
+        return {"status": "no_solution"}  # time limit hit before any solution was found
+
+
+def sequence_runs(items: List[Tuple[str, int, object]], horizon_slots: int = 50,
+                  time_limit: float = 20.0, workers: int = 8,
+                  last_color: Optional[int] = None, hint: Optional[List[str]] = None,
+                  stop_event=None, on_solution=None):
+    """
+    Compact alternative to sequence_items on the same items and objective.
+    Consecutive same-color items of a buffer are merged into one run, and runs are
+    assigned to color blocks instead of items to time slots: block b has one color, a run
+    sits in a block of its color, and the runs of a buffer sit in strictly increasing
+    blocks. Every block after the first is one changeover (the first too, unless it has
+    last_color). The block count comes from a greedy pass, or the hint if that needs more
+    blocks, so the model has about runs x blocks literals instead of items x slots. When
+    the horizon is shorter than the items, runs at the back of a buffer can be left out
+    and the last taken run can be cut short. last_color, hint, stop_event and on_solution
+    as in sequence_items.
+    """
+    if not items:
+        return {"status": "no_items"}
+
+    t0 = time.perf_counter()
+    S = len(items)
+    T = min(horizon_slots, S)
+
+    # runs[r] = (buffer_id, color code, item indices); succ[r] = next run of the same buffer
+    runs = []
+    succ = {}
+    tail_of_buffer = {}
+    first_of_buffer = {}
+    for s, (bid, c, _) in enumerate(items):
+        r = tail_of_buffer.get(bid)
+        if r is not None and runs[r][1] == c:
+            runs[r][2].append(s)
+            continue
+        if r is not None:
+            succ[r] = len(runs)
+        else:
+            first_of_buffer[bid] = len(runs)
+        tail_of_buffer[bid] = len(runs)
+        runs.append((bid, c, [s]))
+    N = len(runs)
+
+    # greedy blocks for the first T jobs: continue last_color while any head has it, else paint
+    # the first waiting head color, taking every head run of that color. Also the hint when
+    # none is given.
+    heads = list(first_of_buffer.values())
+    greedy_order = []
+    B = 0
+    color = last_color
+    while len(greedy_order) < T and any(r is not None for r in heads):
+        if not any(r is not None and runs[r][1] == color for r in heads):
+            color = runs[next(r for r in heads if r is not None)][1]
+        for i, r in enumerate(heads):
+            if r is not None and runs[r][1] == color:
+                greedy_order.extend([runs[r][0]] * len(runs[r][2]))
+                heads[i] = succ.get(r)
+        B += 1
+        color = None
+    if hint is None:
+        hint = greedy_order
+
+    # hinted blocks (and how many jobs of each run): a new block at every color change
+    hint_block = {}
+    hint_take = {}
+    hint_colors = []  # color of each hinted block
+    run_of = {s: r for r, (_, _, idx) in enumerate(runs) for s in idx}
+    for s in _hint_order(items, hint, T):
+        r = run_of[s]
+        if not hint_colors or hint_colors[-1] != items[s][1]:
+            hint_colors.append(items[s][1])
+        hint_block.setdefault(r, len(hint_colors) - 1)
+        hint_take[r] = hint_take.get(r, 0) + 1
+    B = max(B, len(hint_colors))
+    colors = sorted({c for _, c, _ in runs})
+
+    model = cp_model.CpModel()
+    y = {}  # y[b,c] = 1 if block b is painted color c
+    for b in range(B):
+        for c in colors:
+            y[(b, c)] = model.NewBoolVar(f"y_b{b}_c{c}")
+        model.Add(sum(y[(b, c)] for c in colors) <= 1)
+    used = [model.NewBoolVar(f"used_{b}") for b in range(B)]
+    for b in range(B):
+        model.Add(sum(y[(b, c)] for c in colors) == used[b])
+        if b > 0:
+            model.Add(used[b] <= used[b - 1])
+            # two adjacent blocks of one color could always be merged
+            for c in colors:
+                model.AddBoolOr([y[(b - 1, c)].Not(), y[(b, c)].Not()])
+
+    a = {}  # a[r,b] = 1 if run r is painted in block b
+    visited = [model.NewBoolVar(f"visited_{r}") for r in range(N)]
+    take = [model.NewIntVar(0, len(runs[r][2]), f"take_{r}") for r in range(N)]
+    block = [model.NewIntVar(0, B - 1, f"block_{r}") for r in range(N)]
+    for r, (_, c, idx) in enumerate(runs):
+        for b in range(B):
+            a[(r, b)] = model.NewBoolVar(f"a_r{r}_b{b}")
+            model.AddImplication(a[(r, b)], y[(b, c)])
+        model.Add(sum(a[(r, b)] for b in range(B)) == visited[r])
+        model.Add(sum(b * a[(r, b)] for b in range(B)) == block[r]).OnlyEnforceIf(visited[r])
+        model.Add(take[r] >= 1).OnlyEnforceIf(visited[r])
+        model.Add(take[r] == 0).OnlyEnforceIf(visited[r].Not())
+        q = succ.get(r)
+        if q is not None:
+            # FIFO: the next run only after this one is taken completely, in a later block
+            model.AddImplication(visited[q], visited[r])
+            model.Add(take[r] == len(idx)).OnlyEnforceIf(visited[q])
+            model.Add(block[r] < block[q]).OnlyEnforceIf(visited[q])
+    model.Add(sum(take) == T)
+
+    if last_color is None:
+        model.Minimize(sum(used) - 1)
+    else:
+        model.Minimize(sum(used) - (y[(0, last_color)] if last_color in colors else 0))
+    for b in range(B):
+        model.AddHint(used[b], b < len(hint_colors))
+        for c in colors:
+            model.AddHint(y[(b, c)], b < len(hint_colors) and hint_colors[b] == c)
+    for r in range(N):
+        model.AddHint(visited[r], r in hint_block)
+        model.AddHint(take[r], hint_take.get(r, 0))
+        model.AddHint(block[r], hint_block.get(r, 0))
+        for b in range(B):
+            model.AddHint(a[(r, b)], hint_block.get(r) == b)
+    build_s = time.perf_counter() - t0
+
+    def extract(value):
+        # runs sharing a block have the same color, so their order inside it is free
+        order = sorted((value(block[r]), r) for r in range(N) if value(visited[r]))
+        seq = []
+        for _, r in order:
+            for s in runs[r][2][:value(take[r])]:
+                seq.append({
+                    "time_slot": len(seq),
+                    "buffer": items[s][0],
+                    "color": color_name(items[s][1]),
+                    "job_id": items[s][2]
+                })
+        return seq
+
+    stream = _SolutionStream(extract, on_solution)
+    solver, res = _solve_model(model, time_limit, workers, stop_event, stream)
+    if res == cp_model.OPTIMAL or res == cp_model.FEASIBLE:
+        return {"status": "ok", "sequence": extract(solver.Value), "stats": _solve_stats(solver, res, build_s, stream)}
+    elif res == cp_model.INFEASIBLE:
         return {"status": "infeasible"}
+    else:
+        return {"status": "no_solution"}  # time limit hit before any solution was found
+
+
+def _hint_order(items: List[Tuple[str, int, object]], hint: List[str], T: int) -> List[int]:
+    """Item indices in the pick order of hint (buffer id per job), skipping jobs that aren't items; at most T."""
+    per_buffer = defaultdict(list)
+    for s, (bid, _, _) in enumerate(items):
+        per_buffer[bid].append(s)
+    taken = defaultdict(int)
+    order = []
+    for bid in hint:
+        k = taken[bid]
+        taken[bid] += 1
+        if k < len(per_buffer[bid]):
+            order.append(per_buffer[bid][k])
+            if len(order) == T:
+                break
+    return order
+
+
+class _SolutionStream(cp_model.CpSolverSolutionCallback):
+    """Records (seconds, objective, bound) of every solution and hands its sequence to on_solution."""
+
+    def __init__(self, extract, on_solution=None):
+        super().__init__()
+        self.extract = extract  # sequence from a value(var) function
+        self.on_solution = on_solution
+        self.trace = []
+
+    def on_solution_callback(self):
+        t, objective, bound = self.WallTime(), self.ObjectiveValue(), self.BestObjectiveBound()
+        self.trace.append((t, objective, bound))
+        if self.on_solution is not None:
+            self.on_solution({"t": t, "objective": objective, "bound": bound,
+                              "sequence": self.extract(self.Value)})
+
+
+def _solve_model(model: cp_model.CpModel, time_limit: float, workers: int, stop_event=None,
+                 callback: Optional[cp_model.CpSolverSolutionCallback] = None):
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit
+    solver.parameters.num_search_workers = workers
+    if stop_event is None:
+        return solver, solver.Solve(model, callback)
+    # the event may live in another process (Manager proxy), so poll it instead of waiting on it
+    done = threading.Event()
+
+    def watch():
+        while not done.wait(0.05):
+            if stop_event.is_set():
+                solver.StopSearch()
+                return
+
+    threading.Thread(target=watch, daemon=True).start()
+    try:
+        return solver, solver.Solve(model, callback)
+    finally:
+        done.set()
+
+
+def _solve_stats(solver: cp_model.CpSolver, res, build_s: float, stream: _SolutionStream) -> dict:
+    return {
+        "optimal": res == cp_model.OPTIMAL,
+        "objective": solver.ObjectiveValue(),
+        "bound": solver.BestObjectiveBound(),
+        "build_s": build_s,
+        "solve_s": solver.WallTime(),
+        "trace": stream.trace,
+    }
+
+
+SEQUENCE_MODELS = {
+    "time_indexed": sequence_items,
+    "blocks": sequence_runs,
+}
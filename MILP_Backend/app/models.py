@@ -1,18 +1,28 @@
 # app/models.py
-from typing import Optional, List
+from typing import Optional, List, Dict, Set, Deque, Tuple, Iterable, Iterator, Union
+from collections import deque
 from dataclasses import dataclass, field
 from enum import Enum
+import copy
 import time
 import uuid
+from .utils import COLORS, color_code, color_name
+from .history import ConveyorHistory
 
-@dataclass
+@dataclass(slots=True)
 class Job:
-    id: str
+    # slotted: long simulations allocate millions of these
+    id: Union[str, int]  # uuid string from the API, sequential int inside PlantSim
     color: str
     origin: str  # 'O1' or 'O2'
     arrival_ts: float = field(default_factory=time.time)
     assigned_buffer: Optional[str] = None
     hold_since: Optional[float] = None
+    cross_send_emergency: bool = False  # set by OnlineController.assign_job
+    color_code: int = field(init=False, repr=False, compare=False)  # interned color, see utils.COLORS
+
+    def __post_init__(self):
+        self.color_code = color_code(self.color)
 
     def to_dict(self):
         return {
@@ -24,6 +34,170 @@ class Job:
             "hold_since": self.hold_since
         }
 
+class RunQueue:
+    """
+    Job queue for BufferLine(queue_backend="runs"). Behaves like the list backend for everything
+    the controller, planners and API read (len, iteration, indexing, slicing), but popping k
+    jobs only moves a head offset instead of shifting the whole list, and share() is O(1):
+    jobs are only ever appended to the list, so a shared queue just keeps its own offsets.
+    Only the owner appends in place; a shared queue copies its jobs before its first append.
+    """
+    __slots__ = ("_jobs", "_start", "_end", "_owner")
+    COMPACT_AT = 1024  # popped jobs kept in the list before it is rebuilt without them
+
+    def __init__(self, jobs: Iterable[Job] = ()):
+        self._jobs: List[Job] = list(jobs)  # jobs[_start:_end] are queued
+        self._start = 0
+        self._end = len(self._jobs)
+        self._owner = True
+
+    def _own(self):
+        self._jobs = self._jobs[self._start:self._end]
+        self._start, self._end, self._owner = 0, len(self._jobs), True
+
+    def append(self, job: Job):
+        if not self._owner:
+            self._own()
+        self._jobs.append(job)
+        self._end += 1
+
+    def popleft_n(self, n: int) -> List[Job]:
+        popped = self._jobs[self._start:min(self._start + n, self._end)]
+        self._start += len(popped)
+        if self._start >= self.COMPACT_AT and 2 * self._start >= self._end:
+            self._own()  # a new list: shared queues keep the old one
+        return popped
+
+    def share(self) -> "RunQueue":
+        """O(1) copy for a copy-on-write snapshot; this queue keeps appending to the list."""
+        q = RunQueue.__new__(RunQueue)
+        q._jobs, q._start, q._end, q._owner = self._jobs, self._start, self._end, False
+        return q
+
+    def copy(self) -> "RunQueue":
+        """Independent queue holding the same jobs."""
+        return RunQueue(self._jobs[self._start:self._end])
+
+    def __getstate__(self):
+        return (self._jobs[self._start:self._end],)  # not the jobs outside this queue's offsets
+
+    def __setstate__(self, state):
+        self.__init__(state[0])
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __bool__(self):
+        return self._end > self._start
+
+    def __iter__(self):
+        return iter(self._jobs[self._start:self._end])
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step != 1:
+                return list(self)[idx]
+            return self._jobs[self._start + start:self._start + max(start, stop)]
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("RunQueue index out of range")
+        return self._jobs[self._start + idx]
+
+    def __eq__(self, other):
+        if isinstance(other, (RunQueue, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"RunQueue({list(self)!r})"
+
+
+class RunIndex:
+    """
+    Run-length index of a buffer's queue: (color code, count) runs, head first. Like RunQueue,
+    runs are only appended to shared lists and dropped by moving an offset, so share() is
+    O(1) and the owner keeps writing while snapshots read. Positions count every job ever
+    added: run i starts at _starts[i] and ends where run i + 1 starts, or at _tail.
+    """
+    __slots__ = ("_colors", "_starts", "_first", "_count", "_head", "_tail", "_owner")
+    COMPACT_AT = 64  # dropped runs kept in the lists before they are rebuilt without them
+
+    def __init__(self, runs: Iterable[Tuple[int, int]] = ()):
+        self._colors: List[int] = []
+        self._starts: List[int] = []
+        self._first = self._count = 0  # runs _first.._count-1 are this index's
+        self._head = self._tail = 0    # positions of the head job and one past the tail job
+        self._owner = True
+        for color, n in runs:
+            self.add(color, n)
+
+    def _own(self):
+        self._colors = self._colors[self._first:self._count]
+        self._starts = self._starts[self._first:self._count]
+        self._first, self._count, self._owner = 0, len(self._colors), True
+
+    def _end(self, i: int) -> int:
+        return self._starts[i + 1] if i + 1 < self._count else self._tail
+
+    def __getitem__(self, i: int) -> Tuple[int, int]:
+        """Run i from the head (negative: from the tail): (color code, count)."""
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("RunIndex index out of range")
+        i += self._first
+        return (self._colors[i], self._end(i) - max(self._starts[i], self._head))
+
+    def add(self, color: int, n: int):
+        """n jobs of this color at the tail."""
+        if self._count == self._first or self._colors[self._count - 1] != color:
+            if not self._owner:
+                self._own()
+            self._colors.append(color)
+            self._starts.append(self._tail)
+            self._count += 1
+        self._tail += n
+
+    def remove(self, n: int) -> List[Tuple[int, int]]:
+        """Drop n jobs from the head; returns the (color code, count) taken from each run."""
+        taken = []
+        while n > 0 and self._first < self._count:
+            end = self._end(self._first)
+            k = min(n, end - self._head)
+            taken.append((self._colors[self._first], k))
+            self._head += k
+            n -= k
+            if self._head == end:
+                self._first += 1
+        if self._first >= self.COMPACT_AT and 2 * self._first >= self._count:
+            self._own()
+        return taken
+
+    def share(self) -> "RunIndex":
+        """O(1) copy for a copy-on-write snapshot; this index keeps appending to the lists."""
+        r = RunIndex.__new__(RunIndex)
+        r._colors, r._starts, r._first, r._count = self._colors, self._starts, self._first, self._count
+        r._head, r._tail, r._owner = self._head, self._tail, False
+        return r
+
+    def __getstate__(self):
+        return (list(self),)
+
+    def __setstate__(self, state):
+        self.__init__(state[0])
+
+    def __len__(self):
+        return self._count - self._first
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        for i in range(len(self)):
+            yield self[i]
+
+QUEUE_BACKENDS = ("list", "runs")
+BUFFER_LOG_LEN = 64  # changes per buffer that /state?since= can send as job deltas
+
 @dataclass
 class BufferLine:
     id: str
@@ -32,6 +206,72 @@ class BufferLine:
     input_available: bool = True
     output_available: bool = True
     reserve_headroom: int = 0  # reserved slots for emergency cross-sends
+    queue_backend: str = "list"  # "list" (plain list of jobs) or "runs" (RunQueue)
+    # run-length encoding of the queue, kept current by push/pop_n: (color code, count) runs, head first
+    _runs: RunIndex = field(default_factory=RunIndex, init=False, repr=False, compare=False)
+    _color_counts: Dict[int, int] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _plant: Optional["PlantState"] = field(default=None, init=False, repr=False, compare=False)
+    _version: int = field(default=0, init=False, repr=False, compare=False)  # bumped on every push/pop
+    _pushed: int = field(default=0, init=False, repr=False, compare=False)  # jobs ever pushed, for state deltas
+    _popped: int = field(default=0, init=False, repr=False, compare=False)  # jobs ever popped
+    _shared: bool = field(default=False, init=False, repr=False, compare=False)  # shared with a snapshot
+
+    def __post_init__(self):
+        if self.queue_backend not in QUEUE_BACKENDS:
+            raise ValueError(f"Unknown queue backend {self.queue_backend!r}")
+        if self.queue_backend == "runs" and not isinstance(self.queue, RunQueue):
+            self.queue = RunQueue(self.queue)
+        elif self.queue_backend == "list" and not isinstance(self.queue, list):
+            self.queue = list(self.queue)
+        self._rebuild_runs()
+
+    def snapshot(self) -> "BufferLine":
+        """
+        Copy-on-write copy in O(1): shares the Job objects (which don't change once queued)
+        with this buffer, and the run index and a runs-backend queue through their share(),
+        so later pushes and pops on either side stay O(1). A list-backend queue and the color
+        counts are shared as they are; whichever side is changed first copies them.
+        """
+        self._shared = True
+        snap = copy.copy(self)
+        snap._plant = None
+        snap._runs = self._runs.share()
+        if isinstance(self.queue, RunQueue):
+            snap.queue = self.queue.share()
+        return snap
+
+    def _unshare(self):
+        if not isinstance(self.queue, RunQueue):
+            self.queue = self.queue.copy()
+        self._color_counts = dict(self._color_counts)
+        self._shared = False
+
+    def _rebuild_runs(self):
+        self._runs = RunIndex()
+        self._color_counts = {}
+        for j in self.queue:
+            self._add_to_tail(j.color_code, 1)
+
+    def _add_to_tail(self, color: int, n: int):
+        self._runs.add(color, n)
+        self._color_counts[color] = self._color_counts.get(color, 0) + n
+
+    def _remove_from_head(self, n: int):
+        for color, take in self._runs.remove(n):
+            left = self._color_counts[color] - take
+            if left:
+                self._color_counts[color] = left
+            else:
+                del self._color_counts[color]
+
+    def _head(self) -> Tuple[Optional[int], int]:
+        return self._runs[0] if self._runs else (None, 0)
+
+    def _notify_head(self, old_head: Tuple[Optional[int], int]):
+        self._version += 1
+        if self._plant is not None:
+            self._plant._update_head(self.id, old_head, self._head())
+            self._plant.touch(self.id)
 
     def occupancy(self):
         return len(self.queue)
@@ -42,26 +282,61 @@ class BufferLine:
     def push(self, job: Job):
         if self.occupancy() + self.reserve_headroom >= self.capacity:
             raise ValueError(f"Buffer {self.id} overflow")
+        if self._shared:
+            self._unshare()
+        old_head = self._head()
         self.queue.append(job)
         job.assigned_buffer = self.id
+        self._pushed += 1
+        self._add_to_tail(job.color_code, 1)
+        self._notify_head(old_head)
 
     def pop_n(self, n=1):
-        popped = []
-        for _ in range(min(n, self.occupancy())):
-            popped.append(self.queue.pop(0))
+        k = min(n, self.occupancy())
+        if k <= 0:
+            return []
+        if self._shared:
+            self._unshare()
+        if isinstance(self.queue, RunQueue):
+            popped = self.queue.popleft_n(k)
+        else:
+            popped = self.queue[:k]
+            del self.queue[:k]
+        if popped:
+            self._popped += len(popped)
+            old_head = self._head()
+            self._remove_from_head(len(popped))
+            self._notify_head(old_head)
         return popped
 
+    def head_color(self) -> Optional[str]:
+        return color_name(self._runs[0][0]) if self._runs else None
+
+    def head_code(self) -> Optional[int]:
+        return self._runs[0][0] if self._runs else None
+
     def head_run_length(self):
-        if not self.queue:
-            return 0
-        head_color = self.queue[0].color
-        cnt = 0
-        for j in self.queue:
-            if j.color == head_color:
-                cnt += 1
-            else:
-                break
-        return cnt
+        return self._runs[0][1] if self._runs else 0
+
+    def next_run(self) -> Tuple[Optional[int], int]:
+        """(color code, length) of the run right after the head run, or (None, 0)."""
+        if len(self._runs) < 2:
+            return (None, 0)
+        return self._runs[1]
+
+    def tail_run(self) -> Tuple[Optional[int], int]:
+        if not self._runs:
+            return (None, 0)
+        return self._runs[-1]
+
+    def color_count(self, color: int) -> int:
+        return self._color_counts.get(color, 0)
+
+    def distinct_colors(self) -> int:
+        return len(self._color_counts)
+
+    def color_runs(self) -> List[Tuple[int, int]]:
+        return [(c, n) for c, n in self._runs]
 
     def to_dict(self):
         return {
@@ -74,9 +349,153 @@ class BufferLine:
             "reserve_headroom": self.reserve_headroom
         }
 
+    def to_delta(self, pushed: int, popped: int) -> dict:
+        """
+        to_dict() for a client that holds the queue as it was `pushed` pushes and `popped` pops
+        ago: instead of "queue", how many jobs to drop from its head ("popped") and the jobs to
+        append ("pushed"), so the size follows the change, not the queue.
+        """
+        n = self.occupancy()
+        new = min(pushed, n)  # pushed jobs that were popped again are neither sent nor dropped
+        return {
+            "id": self.id,
+            "capacity": self.capacity,
+            "occupancy": n,
+            "input_available": self.input_available,
+            "output_available": self.output_available,
+            "popped": popped - pushed + new,
+            "pushed": [j.to_dict() for j in self.queue[n - new:n]],
+            "reserve_headroom": self.reserve_headroom
+        }
+
 @dataclass
 class PlantState:
     buffers: dict = field(default_factory=dict)  # id -> BufferLine
     oven_states: dict = field(default_factory=lambda: {"O1": True, "O2": True})  # O1 is always True
     main_conveyor_busy: bool = False
-    main_conveyor_history: List[dict] = field(default_factory=list)  # logs
+    main_conveyor_history: ConveyorHistory = field(default_factory=ConveyorHistory)  # pick log
+    # head color code -> ids of buffers whose queue starts with that color, and the summed head-run lengths
+    head_index: Dict[int, Set[str]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    head_run_totals: Dict[int, int] = field(default_factory=dict, init=False, repr=False, compare=False)
+    # change tracking for /state?since=: version goes up on every change, buffer_versions holds the
+    # version of each buffer's last change; deltas from before base_version need the full state
+    version: int = field(default=1, init=False, repr=False, compare=False)
+    base_version: int = field(default=1, init=False, repr=False, compare=False)
+    buffer_versions: Dict[str, int] = field(default_factory=dict, init=False, repr=False, compare=False)
+    # per buffer (version, jobs pushed, jobs popped) after each of its recent changes
+    buffer_logs: Dict[str, Deque[Tuple[int, int, int]]] = field(default_factory=dict, init=False, repr=False,
+                                                                compare=False)
+
+    def __post_init__(self):
+        self.reindex()
+        self._reset_versions()
+
+    def reindex(self):
+        """Attach every buffer to this plant and rebuild the head-color index from scratch."""
+        self.head_index = {}
+        self.head_run_totals = {}
+        for b in self.buffers.values():
+            b._plant = self
+            self._update_head(b.id, (None, 0), b._head())
+
+    def __getstate__(self):
+        # color codes are per process (utils.COLORS): a pickled plant carries the names behind them
+        return dict(self.__dict__, _color_names=COLORS.names())
+
+    def __setstate__(self, state):
+        names = state.pop("_color_names", None)
+        self.__dict__.update(state)
+        if names is not None:
+            codes = [color_code(name) for name in names]
+            if codes != list(range(len(codes))):
+                self.recode(codes)
+
+    def recode(self, codes: List[int]):
+        """
+        Move the plant to this process's color codes, old code c -> codes[c]: jobs get their
+        code again from their color, and the run indexes and the conveyor history follow.
+        """
+        for b in self.buffers.values():
+            for job in b.queue:
+                job.color_code = color_code(job.color)
+            if isinstance(b.queue, RunQueue):
+                b.queue = RunQueue(list(b.queue))
+            b._rebuild_runs()
+            b._shared = False
+        self.main_conveyor_history.recode(codes)
+        self.reindex()
+
+    def snapshot(self) -> "PlantState":
+        """
+        Independent plant for simulations, what-if planning and PlantCore's published reads,
+        in time independent of the number of queued jobs: buffers are copy-on-write
+        (BufferLine.snapshot), and the conveyor history is bounded, so copying it costs the
+        same after any uptime. Versions are kept, so /state?since= deltas work on it.
+        """
+        snap = PlantState(buffers={bid: b.snapshot() for bid, b in self.buffers.items()},
+                          oven_states=dict(self.oven_states),
+                          main_conveyor_busy=self.main_conveyor_busy,
+                          main_conveyor_history=self.main_conveyor_history.copy())
+        snap.version, snap.base_version = self.version, self.base_version
+        snap.buffer_versions = dict(self.buffer_versions)
+        snap.buffer_logs = {bid: log.copy() for bid, log in self.buffer_logs.items()}
+        return snap
+
+    def _reset_versions(self):
+        self.buffer_versions = {}
+        self.buffer_logs = {}
+        for bid in self.buffers:
+            self.buffer_versions[bid] = self.version
+            self._log_buffer(bid)
+
+    def _log_buffer(self, buffer_id: str):
+        b = self.buffers[buffer_id]
+        log = self.buffer_logs.get(buffer_id)
+        if log is None:
+            log = self.buffer_logs[buffer_id] = deque(maxlen=BUFFER_LOG_LEN)
+        log.append((self.version, b._pushed, b._popped))
+
+    def touch(self, buffer_id: Optional[str] = None):
+        """Record a change (to that buffer, or to plant-wide state such as oven states)."""
+        self.version += 1
+        if buffer_id is not None:
+            self.buffer_versions[buffer_id] = self.version
+            self._log_buffer(buffer_id)
+
+    def continue_versions(self, previous: "PlantState"):
+        """Take over from a replaced plant: versions keep rising, and older deltas become full states."""
+        self.version = self.base_version = previous.version + 1
+        self._reset_versions()
+
+    def changed_since(self, since: int) -> Optional[List[str]]:
+        """Ids of buffers changed after version `since`, or None when only the full state will do."""
+        if since < self.base_version or since > self.version:
+            return None
+        return [bid for bid, v in self.buffer_versions.items() if v > since]
+
+    def buffer_delta(self, buffer_id: str, since: int) -> dict:
+        """BufferLine.to_delta since version `since`, or to_dict() if its log doesn't reach back that far."""
+        b = self.buffers[buffer_id]
+        for version, pushed, popped in reversed(self.buffer_logs[buffer_id]):
+            if version <= since:
+                return b.to_delta(b._pushed - pushed, b._popped - popped)
+        return b.to_dict()
+
+    def buffers_with_head(self, color: int) -> Set[str]:
+        return self.head_index.get(color, set())
+
+    def _update_head(self, buffer_id: str, old_head, new_head):
+        if old_head == new_head:
+            return
+        old_color, old_run = old_head
+        if old_color is not None:
+            self.head_run_totals[old_color] -= old_run
+            ids = self.head_index[old_color]
+            ids.discard(buffer_id)
+            if not ids:
+                del self.head_index[old_color]
+                del self.head_run_totals[old_color]
+        new_color, new_run = new_head
+        if new_color is not None:
+            self.head_index.setdefault(new_color, set()).add(buffer_id)
+            self.head_run_totals[new_color] = self.head_run_totals.get(new_color, 0) + new_run
@@ -0,0 +1,145 @@
+# app/plant_core.py
+"""
+Single-writer core for the live plant: every mutation of the plant and controller
+(arrivals, picks, toggles, drain mode, reset) is a command that one writer thread
+applies in submission order, so API handlers on FastAPI's thread pool never race on
+BufferLine queues or the drain plan and every mutation is linearizable. After each
+group of commands that changed the plant, the writer publishes a copy-on-write
+snapshot (PlantState.snapshot); readers such as /state take the latest one without a
+lock and never wait for or hold up the writer. With an EventLog, commands record their
+mutations in it and each group is fsynced before it is published and acknowledged.
+If that fails (the log can't be written, or publishing raises), the plant may hold changes
+nobody can rely on: the core fails the group's commands and every one after it instead of
+applying them, and submit raises right away.
+"""
+from typing import Callable, Optional
+import concurrent.futures as cf
+import queue
+import threading
+from .controller import OnlineController
+from .event_log import EventLog
+from .models import PlantState
+from .solver_jobs import SOLVER_JOBS
+
+_STOP = object()  # stop() sentinel
+
+
+class PlantCore:
+    MAX_GROUP = 256  # commands applied before a snapshot is published, at most
+
+    def __init__(self, plant: PlantState, params: Optional[dict] = None, log: Optional[EventLog] = None):
+        self.plant = plant                                 # writer thread only
+        self.params = params
+        self.controller = self._controller(plant)          # writer thread only
+        self.log = log                                     # writer thread only; commands append to it
+        self._view = plant.snapshot()
+        self.error: Optional[BaseException] = None         # why the writer stopped applying commands
+        self._commands: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="plant-core", daemon=True)
+                self._thread.start()
+
+    def submit(self, command: Callable, *args, **kwargs) -> cf.Future:
+        """Queue command(core, *args, **kwargs) for the writer; the future has its result or exception."""
+        if self.error is not None:
+            raise self._failure()
+        if self._thread is None:
+            self._start()
+        future = cf.Future()
+        self._commands.put((future, command, args, kwargs))
+        return future
+
+    def call(self, command: Callable, *args, **kwargs):
+        """submit and wait: returns once the command and all commands submitted before it are applied."""
+        return self.submit(command, *args, **kwargs).result()
+
+    def view(self) -> PlantState:
+        """Latest published snapshot; read-only for callers (it may be shared with other readers)."""
+        return self._view
+
+    def stop(self):
+        if self._thread is not None:
+            self._commands.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        if self.log is not None and self.error is None:  # a failed log isn't flushed again
+            self.log.close()
+
+    def _run(self):
+        item = self._commands.get()
+        while item is not _STOP:
+            plant, version = self.plant, self.plant.version
+            done = []
+            while item is not None and item is not _STOP and len(done) < self.MAX_GROUP:
+                done.append(self._apply(*item))
+                try:
+                    item = self._commands.get_nowait()
+                except queue.Empty:
+                    item = None
+            try:
+                if self.log is not None:  # durable before anyone sees it
+                    self.log.flush()
+                    if self.log.due():
+                        self.log.checkpoint(self.plant, self.controller.drain_mode)
+                # publish before resolving, so a caller's next read sees its own command
+                self._publish(plant, version)
+            except BaseException as e:
+                self.error = e
+                done = [(future, None, self._failure()) for future, _, _ in filter(None, done)]
+            for future, result, error in filter(None, done):
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+            if self.error is not None:
+                break
+            if item is None:
+                item = self._commands.get()
+        # failed: the rest is answered with the error until stop()
+        while item is not _STOP:
+            if item is not None and item[0].set_running_or_notify_cancel():
+                item[0].set_exception(self._failure())
+            item = self._commands.get()
+
+    def _failure(self) -> RuntimeError:
+        error = RuntimeError(f"Plant core stopped: {type(self.error).__name__}: {self.error}")
+        error.__cause__ = self.error
+        return error
+
+    def _apply(self, future: cf.Future, command: Callable, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return None  # cancelled before it ran
+        try:
+            return future, command(self, *args, **kwargs), None
+        except BaseException as e:
+            return future, None, e
+
+    def _controller(self, plant: PlantState) -> OnlineController:
+        controller = OnlineController(plant, self.params)
+        controller.solver_jobs = SOLVER_JOBS  # drain replans must not hold up the writer thread
+        return controller
+
+    def _publish(self, plant: PlantState, version: int):
+        if self.plant is not plant or self.plant.version != version:
+            self._view = self.plant.snapshot()
+
+    # commands that replace the plant; run them through call()
+
+    def replace_plant(self, plant: PlantState, params: Optional[dict] = None):
+        """
+        Swap in another plant with a new controller (continuing the version sequence), with
+        these controller settings or, without, the current ones.
+        """
+        self.controller.exit_drain_mode()  # cancels a background drain job
+        plant.continue_versions(self.plant)
+        self.plant = plant
+        if params is not None:
+            self.params = params
+        self.controller = self._controller(plant)
+        if self.log is not None:
+            self.log.checkpoint(plant, False, wait=True)
@@ -0,0 +1,535 @@
+# app/plants.py
+"""
+Multi-plant hosting. Every named plant has its own PlantState and controller behind its
+own PlantCore (single writer, snapshot reads), so plants share no state and one plant's
+drain planning never queues behind another's arrivals.
+
+The API talks to plants by name through COMMANDS (run on the plant's writer) and READS
+(served from its published snapshot), so the same calls work in-process (PlantHost)
+and across worker processes (ShardedPlants): there each plant lives in the shard
+process shard_of(plant_id) picks, requests go over a pipe by command name, and a
+pure-Python drain planner on one shard holds no GIL the other shards need.
+
+With a log directory every plant writes an EventLog to <log_dir>/<plant_id> (next to its
+spec, plant.json), and recover() brings the logged plants back after a restart or crash.
+"""
+from typing import Callable, Dict, List, Optional
+import concurrent.futures as cf
+import json
+import multiprocessing as mp
+import os
+import pickle
+import random
+import shutil
+import threading
+import time
+import uuid
+import zlib
+import simpy
+from .controller import OnlineController
+from .demo_data import default_plant
+from .event_log import EventLog, NO_BUFFER, recover as recover_log
+from .milp_benchmark import milp_short_horizon, head_items
+from .models import BufferLine, Job, PlantState
+from .plant_core import PlantCore
+from .simulator import PlantSim
+from .solver_jobs import SOLVER_JOBS
+from .utils import color_name, sample_color
+
+DEFAULT_PLANT = "default"
+
+
+class UnknownPlant(KeyError):
+    pass
+
+
+def state_payload(plant: PlantState, since: int = 0, history_limit: int = 100) -> dict:
+    # full state of a published snapshot, or with since from an earlier payload's version only
+    # what changed after it
+    changed = plant.changed_since(since)
+    history = plant.main_conveyor_history
+    limit = max(0, history_limit)
+    return {
+        "version": plant.version,
+        "full": changed is None,
+        "buffers": ({k: b.to_dict() for k, b in plant.buffers.items()} if changed is None
+                    else {k: plant.buffer_delta(k, since) for k in changed}),
+        "main_history": history.recent(limit) if changed is None else history.since(since, limit),
+        "history_stats": history.summary(time.time()),
+        "total_capacity": sum(b.capacity for b in plant.buffers.values()),
+        "total_occupancy": sum(b.occupancy() for b in plant.buffers.values()),
+        "oven_states": plant.oven_states,
+        "main_conveyor_busy": plant.main_conveyor_busy
+    }
+
+
+# commands: run on the plant's writer thread, with the live plant and controller
+
+def arrive(core: PlantCore, oven: str, color: Optional[str] = None, job_id: Optional[str] = None,
+           log: bool = True) -> dict:
+    # If O2 is off, reroute all jobs to O1
+    original_oven = oven
+    if oven == "O2" and not core.plant.oven_states.get("O2", True):
+        oven = "O1"
+        if log:
+            print(f"Oven O2 is OFF - Rerouting job from {original_oven} to O1")
+
+    color = color or sample_color()
+    job = Job(id=job_id or str(uuid.uuid4()), color=color, origin=oven)
+    assigned = core.controller.assign_job(job, hold_at_oven_allowed=True)
+    if core.log is not None:
+        core.log.arrival(job, assigned)
+    return {
+        "job_id": job.id,
+        "assigned_buffer": assigned,
+        "job": job.to_dict(),
+        "original_oven": original_oven,
+        "rerouted": original_oven != oven
+    }
+
+
+def pick(core: PlantCore, buffer_id: Optional[str], n: int, operator: str = "manual") -> dict:
+    # a given buffer, or the controller's choice; buffer_id None when it has nothing to pick
+    if not buffer_id:
+        buffer_id, n = core.controller.decide_pick()
+        if not buffer_id:
+            return {"buffer_id": None, "picked_n": 0, "colors": []}
+    picked = core.controller.execute_pick(buffer_id, n, operator=operator)
+    if core.log is not None and picked:
+        core.log.pick(core.plant.main_conveyor_history.entry(-1)["ts"], buffer_id, len(picked), operator)
+    return {"buffer_id": buffer_id, "picked_n": len(picked), "colors": [p.color for p in picked]}
+
+
+def apply_events(core: PlantCore, events: List[dict]) -> dict:
+    """Ordered arrivals and picks (dicts as /events takes them) as one command."""
+    results = []
+    rerouted = 0
+    for e in events:
+        if e["type"] == "arrival":
+            res = arrive(core, e["oven"], e.get("color"), e.get("id"), log=False)
+            rerouted += res["rerouted"]
+            results.append({"type": "arrival", "job_id": res["job_id"], "assigned_buffer": res["assigned_buffer"],
+                            "rerouted": res["rerouted"]})
+        else:
+            results.append({"type": "pick", **pick(core, e.get("buffer_id"), e.get("n", 1))})
+    return {"results": results, "rerouted": rerouted}
+
+
+def toggle_oven(core: PlantCore, oven_id: str) -> bool:
+    plant = core.plant
+    plant.oven_states[oven_id] = not plant.oven_states.get(oven_id, True)
+    plant.touch()
+    if core.log is not None:
+        core.log.oven(oven_id, plant.oven_states[oven_id])
+    return plant.oven_states[oven_id]
+
+
+def toggle_buffer(core: PlantCore, buffer_id: str, field: str) -> bool:
+    buffer = core.plant.buffers[buffer_id]
+    setattr(buffer, field, not getattr(buffer, field))
+    core.plant.touch(buffer_id)
+    if core.log is not None:
+        core.log.buffer_flag(buffer_id, field, getattr(buffer, field))
+    return getattr(buffer, field)
+
+
+def set_buffer_state(core: PlantCore, buffer_id: str, input_available: Optional[bool] = None,
+                     output_available: Optional[bool] = None) -> dict:
+    buffer = core.plant.buffers[buffer_id]
+    if input_available is not None:
+        buffer.input_available = input_available
+    if output_available is not None:
+        buffer.output_available = output_available
+    core.plant.touch(buffer_id)
+    if core.log is not None:
+        core.log.buffer_flag(buffer_id, "input_available", buffer.input_available)
+        core.log.buffer_flag(buffer_id, "output_available", buffer.output_available)
+    return {"input_available": buffer.input_available, "output_available": buffer.output_available}
+
+
+def toggle_main_conveyor(core: PlantCore) -> bool:
+    core.plant.main_conveyor_busy = not core.plant.main_conveyor_busy
+    core.plant.touch()
+    if core.log is not None:
+        core.log.conveyor(core.plant.main_conveyor_busy)
+    return core.plant.main_conveyor_busy
+
+
+def enter_drain(core: PlantCore, use_milp: bool = True, background: bool = False) -> dict:
+    res = core.controller.enter_drain_mode(use_milp=use_milp, solver_jobs=SOLVER_JOBS if background else None)
+    if core.log is not None:
+        core.log.drain(True)
+    return res
+
+
+def exit_drain(core: PlantCore):
+    core.controller.exit_drain_mode()
+    if core.log is not None:
+        core.log.drain(False)
+
+
+def drain_status(core: PlantCore) -> dict:
+    ctrl = core.controller
+    return {
+        "drain_mode": getattr(ctrl, "drain_mode", False),
+        "plan_len": len(getattr(ctrl, "drain_plan", [])),
+        "background_job": ctrl.drain_job.to_dict() if ctrl.drain_job is not None else None
+    }
+
+
+def set_state(core: PlantCore, state: dict):
+    # a new plant from a PlantStateIn dict, with the current plant's queue backend and controller settings
+    backend = next(iter(core.plant.buffers.values())).queue_backend if core.plant.buffers else "list"
+    core.replace_plant(plant_from_dict(state, backend))
+
+
+COMMANDS: Dict[str, Callable] = {
+    "arrive": arrive,
+    "pick": pick,
+    "events": apply_events,
+    "toggle_oven": toggle_oven,
+    "toggle_buffer": toggle_buffer,
+    "set_buffer_state": set_buffer_state,
+    "toggle_main_conveyor": toggle_main_conveyor,
+    "enter_drain": enter_drain,
+    "exit_drain": exit_drain,
+    "drain_status": drain_status,
+    "replace_plant": PlantCore.replace_plant,
+    "set_state": set_state,
+}
+
+
+# reads: served from the published snapshot (plus controller settings), never waiting for the writer
+
+def sim_params(core: PlantCore) -> dict:
+    # the live controller's settings, for simulated controllers (plain attribute reads)
+    ctrl = core.controller
+    return {
+        "R_min": ctrl.R_min,
+        "occ_high": ctrl.occ_high_threshold,
+        "global_high": ctrl.global_high_threshold,
+        "hold_limit": ctrl.HOLD_LIMIT,
+        "K_max": ctrl.K_max
+    }
+
+
+def state_if_changed(core: PlantCore, since: int, history_limit: int = 100) -> Optional[dict]:
+    view = core.view()
+    return state_payload(view, since, history_limit) if view.version != since else None
+
+
+def run_sim(core: PlantCore, seconds: int, o1_rate: float, o2_rate: float, event_driven: bool,
+            seed: Optional[int]) -> dict:
+    # copy-on-write snapshot of the published view: the live plant is untouched and the copy costs O(buffers)
+    plant_copy = core.view().snapshot()
+    ctrl = OnlineController(plant_copy, params=sim_params(core))
+    sim = PlantSim(simpy.Environment(), plant_copy, ctrl, o1_rate=o1_rate, o2_rate=o2_rate, max_time=seconds,
+                   event_driven=event_driven, rng=None if seed is None else random.Random(seed))
+    stats = sim.run(until=seconds)
+    return {"stats": stats, "final_buffers": {k: v.to_dict() for k, v in plant_copy.buffers.items()}}
+
+
+def milp(core: PlantCore, horizon_slots: int, model: str) -> dict:
+    plant = core.view()
+    jobs = [job for b in plant.buffers.values() for job in b.queue]
+    return milp_short_horizon(jobs, plant.buffers, horizon_slots=horizon_slots, model=model)
+
+
+READS: Dict[str, Callable] = {
+    "state": lambda core, since=0, history_limit=100: state_payload(core.view(), since, history_limit),
+    "state_if_changed": state_if_changed,
+    "buffer_ids": lambda core: list(core.view().buffers),
+    "head_items": lambda core: [(bid, color_name(c), jid) for bid, c, jid in head_items(core.view().buffers)],
+    "sim_params": sim_params,
+    "run_sim": run_sim,
+    "milp": milp,
+}
+
+
+def make_plant(capacities: Optional[Dict[str, int]] = None, queue_backend: str = "list") -> PlantState:
+    """The demo plant's L1-L9 layout (oven rules depend on it), with optional per-buffer capacities."""
+    plant = default_plant(queue_backend)
+    for bid, cap in (capacities or {}).items():
+        if bid not in plant.buffers:
+            raise ValueError(f"Unknown buffer {bid!r}; plants have {sorted(plant.buffers)}")
+        plant.buffers[bid].capacity = cap
+    return plant
+
+
+def plant_from_dict(state: dict, queue_backend: str = "list") -> PlantState:
+    """A plant from /state's shape (buffers with their queues, oven states, conveyor), as /set-state takes it."""
+    if len(state["buffers"]) >= NO_BUFFER:
+        raise ValueError(f"At most {NO_BUFFER - 1} buffers")
+    buffers = {}
+    for bid, b in state["buffers"].items():
+        if len(b["queue"]) + b["reserve_headroom"] > b["capacity"]:
+            raise ValueError(f"Buffer {bid}: {len(b['queue'])} jobs don't fit capacity {b['capacity']} "
+                             f"with {b['reserve_headroom']} reserved")
+        jobs = [Job(id=j["id"], color=j["color"], origin=j["origin"], arrival_ts=j["arrival_ts"] or time.time(),
+                    assigned_buffer=bid) for j in b["queue"]]
+        buffers[bid] = BufferLine(id=bid, capacity=b["capacity"], queue=jobs, input_available=b["input_available"],
+                                  output_available=b["output_available"], reserve_headroom=b["reserve_headroom"],
+                                  queue_backend=queue_backend)
+    return PlantState(buffers=buffers, oven_states={"O1": True, **state["oven_states"]},
+                      main_conveyor_busy=state["main_conveyor_busy"])
+
+
+class PlantHost:
+    """
+    Plants of this process by id, each a PlantCore; specs are kept so reset rebuilds the same plant.
+    log_dir: log every plant's mutations there (EventLog), so recover() can bring them back.
+    """
+
+    def __init__(self, log_dir: Optional[str] = None):
+        self.cores: Dict[str, PlantCore] = {}
+        self.specs: Dict[str, dict] = {}
+        self.log_dir = log_dir
+        self._lock = threading.Lock()
+
+    def create(self, plant_id: str, capacities: Optional[Dict[str, int]] = None, queue_backend: str = "list",
+               params: Optional[dict] = None) -> dict:
+        spec = {"capacities": capacities, "queue_backend": queue_backend, "params": params}
+        plant = make_plant(capacities, queue_backend)
+        with self._lock:
+            if plant_id in self.cores:
+                raise ValueError(f"Plant {plant_id!r} already exists")
+            log = None
+            if self.log_dir is not None:
+                directory = os.path.join(self.log_dir, plant_id)
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, "plant.json"), "w") as f:
+                    json.dump(spec, f)
+                log = EventLog(directory)
+                log.checkpoint(plant, False, wait=True)
+            self.cores[plant_id], self.specs[plant_id] = PlantCore(plant, params, log), spec
+        return {"plant_id": plant_id, **spec}
+
+    def recover(self, shard: int = 0, shards: int = 1) -> List[dict]:
+        """
+        Bring back the plants logged in log_dir (those of this shard, for ShardedPlants) as of their
+        last acknowledged write. A plant that was draining re-enters drain mode with the fallback
+        planner (plans aren't logged). Returns plant_id, events replayed and seconds per plant.
+        """
+        if self.log_dir is None or not os.path.isdir(self.log_dir):
+            return []
+        recovered = []
+        for plant_id in sorted(os.listdir(self.log_dir)):
+            directory = os.path.join(self.log_dir, plant_id)
+            spec_path = os.path.join(directory, "plant.json")
+            if plant_id in self.cores or shard_of(plant_id, shards) != shard or not os.path.isfile(spec_path):
+                continue
+            plant, drain_mode, stats = recover_log(directory)
+            if plant is None:
+                continue
+            with open(spec_path) as f:
+                spec = json.load(f)
+            log = EventLog(directory)
+            core = PlantCore(plant, spec["params"], log)
+            if drain_mode:
+                core.controller.enter_drain_mode(use_milp=False)
+            log.checkpoint(plant, drain_mode)  # later recoveries start from here
+            with self._lock:
+                self.cores[plant_id], self.specs[plant_id] = core, spec
+            recovered.append({"plant_id": plant_id, "events": stats["events"], "seconds": stats["seconds"]})
+        return recovered
+
+    def remove(self, plant_id: str):
+        """Stop the plant and delete its log."""
+        with self._lock:
+            core = self.core(plant_id)
+            del self.cores[plant_id], self.specs[plant_id]
+        core.call(lambda c: c.controller.exit_drain_mode())  # cancels a background drain job
+        core.stop()
+        if self.log_dir is not None:
+            shutil.rmtree(os.path.join(self.log_dir, plant_id), ignore_errors=True)
+
+    def ids(self) -> List[str]:
+        return list(self.cores)
+
+    def core(self, plant_id: str) -> PlantCore:
+        core = self.cores.get(plant_id)
+        if core is None:
+            raise UnknownPlant(plant_id)
+        return core
+
+    def submit(self, plant_id: str, name: str, *args) -> cf.Future:
+        return self.core(plant_id).submit(COMMANDS[name], *args)
+
+    def call(self, plant_id: str, name: str, *args):
+        """Run command `name` on the plant's writer and wait for it."""
+        return self.submit(plant_id, name, *args).result()
+
+    def read(self, plant_id: str, name: str, *args):
+        """Run read `name` on the plant's latest snapshot, in the calling thread."""
+        return READS[name](self.core(plant_id), *args)
+
+    def reset(self, plant_id: str):
+        spec = self.specs.get(plant_id)
+        if spec is None:
+            raise UnknownPlant(plant_id)
+        self.call(plant_id, "replace_plant", make_plant(spec["capacities"], spec["queue_backend"]), spec["params"])
+
+    def stop(self):
+        for core in list(self.cores.values()):
+            core.stop()
+
+
+def shard_of(plant_id: str, shards: int) -> int:
+    # stable across processes and restarts, unlike hash()
+    return zlib.crc32(plant_id.encode()) % shards
+
+
+def _shard_main(conn, index: int, shards: int, log_dir: Optional[str]):
+    # runs in a shard process: a PlantHost fed over the pipe; commands go to the plant's writer,
+    # reads to a thread pool (a long /run_sim doesn't hold up /state), replies as they finish
+    host = PlantHost(log_dir)
+    SOLVER_JOBS.start()  # this shard's plants replan drains on it
+    readers = cf.ThreadPoolExecutor(max_workers=4)
+    send_lock = threading.Lock()
+
+    def reply(msg_id, fn, *args):
+        try:
+            out = (msg_id, True, fn(*args))
+        except BaseException as e:
+            out = (msg_id, False, e)
+        send(out)
+
+    def reply_future(msg_id, future: cf.Future):
+        e = future.exception()
+        send((msg_id, e is None, future.result() if e is None else e))
+
+    def send(out):
+        try:
+            data = pickle.dumps(out)
+        except Exception as e:  # an unpicklable result or exception
+            data = pickle.dumps((out[0], False, RuntimeError(f"{type(e).__name__}: {e}")))
+        with send_lock:
+            conn.send_bytes(data)
+
+    while True:
+        msg_id, kind, plant_id, name, args = conn.recv()
+        if kind == "stop":
+            host.stop()
+            readers.shutdown(wait=False)
+            SOLVER_JOBS.shutdown()
+            send((msg_id, True, None))
+            return
+        if kind == "call":
+            try:
+                future = host.submit(plant_id, name, *args)
+            except BaseException as e:
+                send((msg_id, False, e))
+                continue
+            future.add_done_callback(lambda f, msg_id=msg_id: reply_future(msg_id, f))
+        elif kind == "read":
+            readers.submit(reply, msg_id, host.read, plant_id, name, *args)
+        elif kind == "recover":
+            reply(msg_id, host.recover, index, shards)
+        else:  # create, remove, reset: host bookkeeping, quick
+            reply(msg_id, getattr(host, kind), plant_id, *args)
+
+
+class _Shard:
+    def __init__(self, ctx, index: int, shards: int, log_dir: Optional[str]):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_shard_main, args=(child, index, shards, log_dir), name="plant-shard")
+        self.process.start()
+        child.close()
+        self.pending: Dict[int, cf.Future] = {}
+        self.lock = threading.Lock()
+        self.ids = iter(range(1, 1 << 62))
+        self.receiver = threading.Thread(target=self._receive, daemon=True)
+        self.receiver.start()
+
+    def request(self, kind: str, plant_id: Optional[str], name: Optional[str], args: tuple) -> cf.Future:
+        future = cf.Future()
+        with self.lock:
+            msg_id = next(self.ids)
+            self.pending[msg_id] = future
+            self.conn.send((msg_id, kind, plant_id, name, args))
+        return future
+
+    def _receive(self):
+        while True:
+            try:
+                msg_id, ok, value = pickle.loads(self.conn.recv_bytes())
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                future = self.pending.pop(msg_id)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        with self.lock:  # the shard is gone
+            for future in self.pending.values():
+                future.set_exception(RuntimeError("Plant shard process exited"))
+            self.pending.clear()
+
+
+class ShardedPlants:
+    """
+    PlantHost's interface over `shards` worker processes (spawn, as in solver_jobs); a plant lives
+    in shard shard_of(plant_id). Arguments and results cross a pipe, so they must pickle.
+    """
+
+    def __init__(self, shards: int, log_dir: Optional[str] = None):
+        self.n = shards
+        self.log_dir = log_dir
+        self._shards: Optional[List[_Shard]] = None
+        self._plants: Dict[str, int] = {}  # plant id -> shard, for ids()
+        self._lock = threading.Lock()
+
+    def _start(self) -> List[_Shard]:
+        with self._lock:
+            if self._shards is None:
+                ctx = mp.get_context("spawn")
+                self._shards = [_Shard(ctx, i, self.n, self.log_dir) for i in range(self.n)]
+            return self._shards
+
+    def _shard(self, plant_id: str) -> _Shard:
+        return self._start()[shard_of(plant_id, self.n)]
+
+    def recover(self) -> List[dict]:
+        futures = [shard.request("recover", None, None, ()) for shard in self._start()]
+        recovered = [p for f in futures for p in f.result()]
+        for p in recovered:
+            self._plants[p["plant_id"]] = shard_of(p["plant_id"], self.n)
+        return recovered
+
+    def create(self, plant_id: str, capacities: Optional[Dict[str, int]] = None, queue_backend: str = "list",
+               params: Optional[dict] = None) -> dict:
+        res = self._shard(plant_id).request("create", plant_id, None, (capacities, queue_backend, params)).result()
+        self._plants[plant_id] = shard_of(plant_id, self.n)
+        return dict(res, shard=self._plants[plant_id])
+
+    def remove(self, plant_id: str):
+        self._shard(plant_id).request("remove", plant_id, None, ()).result()
+        self._plants.pop(plant_id, None)
+
+    def ids(self) -> List[str]:
+        return list(self._plants)
+
+    def submit(self, plant_id: str, name: str, *args) -> cf.Future:
+        return self._shard(plant_id).request("call", plant_id, name, args)
+
+    def call(self, plant_id: str, name: str, *args):
+        return self.submit(plant_id, name, *args).result()
+
+    def read(self, plant_id: str, name: str, *args):
+        return self._shard(plant_id).request("read", plant_id, name, args).result()
+
+    def reset(self, plant_id: str):
+        self._shard(plant_id).request("reset", plant_id, None, ()).result()
+
+    def stop(self):
+        with self._lock:
+            shards, self._shards = self._shards, None
+        for shard in shards or []:
+            shard.request("stop", None, None, ()).result()
+            shard.process.join()
+
+
+def make_plants(shards: int = 0, log_dir: Optional[str] = None):
+    """In-process plants for shards=0, else that many shard processes; logged to log_dir if given."""
+    return ShardedPlants(shards, log_dir) if shards > 0 else PlantHost(log_dir)
@@ -0,0 +1,104 @@
+# app/scoring.py
+from typing import Optional, Tuple
+import numpy as np
+from .models import Job, BufferLine, PlantState
+
+
+def buffer_number(bid: str) -> Optional[int]:
+    """'L7' -> 7; None for ids that don't follow the L<n> scheme."""
+    try:
+        return int(bid[1:])
+    except Exception:
+        return None
+
+
+class VectorScorer:
+    """
+    Batched scoring for OnlineController.assign_job.
+    Keeps per-buffer features in NumPy arrays (one row per buffer, in plant.buffers order)
+    and scores every candidate at once. Each strategy applies the same float operations
+    in the same order as the per-buffer loop, so both paths pick the same buffer.
+    """
+    AUTO_MIN_BUFFERS = 32  # below this the plain loop is faster than NumPy call overhead
+
+    def __init__(self, plant: PlantState):
+        self.plant = plant
+        self._build()
+
+    def _build(self):
+        self.buffers = list(self.plant.buffers.values())
+        n = len(self.buffers)
+        nums = [buffer_number(b.id) for b in self.buffers]
+        self.low_line = np.array([x is not None and x <= 4 for x in nums], dtype=bool)   # L1-L4
+        self.high_line = np.array([x is not None and x >= 5 for x in nums], dtype=bool)  # L5-L9
+        self.capacity = np.zeros(n, dtype=np.int64)
+        self.reserve = np.zeros(n, dtype=np.int64)
+        self.occupancy = np.zeros(n, dtype=np.int64)
+        self.tail_color = np.full(n, -1, dtype=np.int64)
+        self.tail_run = np.zeros(n, dtype=np.int64)
+        self.distinct = np.zeros(n, dtype=np.int64)
+        self.input_ok = np.zeros(n, dtype=bool)
+        self.output_ok = np.zeros(n, dtype=bool)
+        self._seen_versions = [-1] * n
+
+    def refresh(self):
+        """Re-read rows whose buffer changed since the last call; availability flags every time."""
+        if len(self.buffers) != len(self.plant.buffers):
+            self._build()
+        for i, b in enumerate(self.buffers):
+            self.input_ok[i] = b.input_available
+            self.output_ok[i] = b.output_available
+            if self._seen_versions[i] == b._version:
+                continue
+            self._seen_versions[i] = b._version
+            tail_color, tail_run = b.tail_run()
+            self.capacity[i] = b.capacity
+            self.reserve[i] = b.reserve_headroom
+            self.occupancy[i] = b.occupancy()
+            self.tail_color[i] = -1 if tail_color is None else tail_color
+            self.tail_run[i] = tail_run
+            self.distinct[i] = b.distinct_colors()
+
+    def candidate_rows(self, origin: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Row indices of (primary, fallback) candidates under the oven rules in assign_job."""
+        self.refresh()
+        ok = self.input_ok & (self.occupancy + self.reserve < self.capacity)
+        none = np.zeros(0, dtype=np.int64)
+        if origin == "O2":
+            return np.flatnonzero(ok & self.high_line), none
+        if origin == "O1":
+            return np.flatnonzero(ok & self.low_line), np.flatnonzero(ok & ~self.low_line)
+        return np.flatnonzero(ok), none
+
+    def scores(self, job: Job, rows: np.ndarray, weights: dict) -> np.ndarray:
+        occ = self.occupancy[rows]
+        cap = self.capacity[rows]
+        same = self.tail_color[rows] == job.color_code
+        score = np.zeros(len(rows))
+        # STRATEGY 1: Same color bonus
+        score += np.where(same, weights["w_same"], 0.0)
+        # STRATEGY 2: Building runs
+        score += np.where(same & (occ > 0), self.tail_run[rows] * 2.0, 0.0)
+        # STRATEGY 3: Cross-send penalty
+        if job.origin == "O1":
+            score -= np.where(self.high_line[rows], weights["w_cross"], 0.0)
+        # STRATEGY 4: Occupancy-based scoring
+        score -= weights["w_occ"] * (occ / np.maximum(1.0, cap))
+        # STRATEGY 5: Output availability
+        score -= np.where(self.output_ok[rows], 0.0, weights["w_outputdown"])
+        # STRATEGY 6: Free space bonus
+        score += (cap - occ - self.reserve[rows]) / (1 + cap)
+        # STRATEGY 7: Color diversity penalty
+        distinct = self.distinct[rows]
+        score -= np.where(distinct > 3, (distinct - 3) * 5.0, 0.0)
+        return score
+
+    def best(self, job: Job, rows: np.ndarray, weights: dict) -> Tuple[Optional[BufferLine], float]:
+        """Highest-scoring candidate (first one on ties), like score_buffer_list in assign_job."""
+        if not len(rows):
+            return None, -1e9
+        score = self.scores(job, rows, weights)
+        i = int(np.argmax(score))
+        if not score[i] > -1e9:
+            return None, -1e9
+        return self.buffers[rows[i]], float(score[i])
@@ -2,82 +2,120 @@
 import simpy
 import random
 import time
-from typing import Callable, List
+import heapq
+from typing import Callable, List, Optional
 from .models import Job, BufferLine, PlantState
 from .utils import sample_color
 from .controller import OnlineController
 from .demo_data import default_plant
-import uuid
+import itertools
 
 class PlantSim:
     def __init__(self, env: simpy.Environment, plant: PlantState, controller: OnlineController,
-                 o1_rate=6.0, o2_rate=6.0, max_time=3600):
+                 o1_rate=6.0, o2_rate=6.0, max_time=3600, event_driven=False,
+                 rng: Optional[random.Random] = None):
         """
         o1_rate, o2_rate are average inter-arrival times in seconds (exponential)
+        event_driven: instead of waking every simulated second, the conveyor worker sleeps
+        until a job arrives or a held job is released, and the held-job monitor until the
+        next hold expiry (much faster for long runs)
+        rng: random.Random for arrival times and colors (seeded replications); default the global one
         """
         self.env = env
         self.plant = plant
         self.controller = controller
+        controller.clock = lambda: env.now  # hold_since and pick timestamps in simulated seconds
         self.o1_rate = o1_rate
         self.o2_rate = o2_rate
         self.max_time = max_time
-        self.held_jobs = []  # jobs waiting at ovens
+        self.event_driven = event_driven
+        self.rng = rng or random
+        self.held_jobs = []  # jobs waiting at ovens: heap of (hold expiry, seq, job)
         self.stats = {"throughput": 0, "changeovers": 0, "overflows": 0, "cross_sends": 0}
+        self._job_ids = itertools.count(1)
+        self._held_seq = itertools.count()
+        # event-driven wake-ups, replaced by a fresh event each time a process goes to sleep
+        self._plant_changed = env.event()
+        self._job_held = env.event()
+
+    def new_job(self, color: str, origin: str) -> Job:
+        # sequential int ids: uuid4 strings cost more to build and keep than the rest of the job
+        return Job(id=next(self._job_ids), color=color, origin=origin, arrival_ts=self.env.now)
+
+    def _wake(self, event: simpy.Event):
+        if not event.triggered:
+            event.succeed()
 
     def oven_process(self, oven_name: str, interarrival_mean: float):
         while True:
-            yield self.env.timeout(random.expovariate(1.0/interarrival_mean))
-            color = sample_color()
-            job = Job(id=str(uuid.uuid4()), color=color, origin=oven_name, arrival_ts=self.env.now)
+            yield self.env.timeout(self.rng.expovariate(1.0/interarrival_mean))
+            color = sample_color(self.rng)
+            job = self.new_job(color, oven_name)
             assigned = self.controller.assign_job(job, hold_at_oven_allowed=True)
             if assigned is None:
                 # held at oven
-                self.held_jobs.append(job)
+                expiry = job.hold_since + self.controller.HOLD_LIMIT
+                heapq.heappush(self.held_jobs, (expiry, next(self._held_seq), job))
+                self._wake(self._job_held)
             else:
                 # assigned, if cross-sent and oven==O1 and assigned to L5..L9, count cross
                 if oven_name == "O1" and int(assigned[1:]) >= 5:
                     self.stats["cross_sends"] += 1
+                self._wake(self._plant_changed)
+
+    def release_expired(self):
+        """Force-assign the held jobs whose hold limit has passed (cross-sends allowed)."""
+        now = self.env.now
+        to_release = []
+        while self.held_jobs and self.held_jobs[0][0] <= now:
+            to_release.append(heapq.heappop(self.held_jobs)[2])
+        if not to_release:
+            return
+        res = self.controller.emergency_release_held(to_release)
+        # increment cross-sends if from O1 to L5..L9
+        origin = {job.id: job.origin for job in to_release}
+        for jid, buf in res:
+            if origin[jid] == "O1" and int(buf[1:]) >= 5:
+                self.stats["cross_sends"] += 1
+        # no buffer could take the rest
+        self.stats["overflows"] += len(to_release) - len(res)
+        if res:
+            self._wake(self._plant_changed)
 
     def held_job_monitor(self):
-        """Periodically check held jobs and release if hold exceeds limit"""
+        """Release held jobs past the hold limit: every second, or (event-driven) at the next expiry"""
         while True:
-            yield self.env.timeout(1.0)
-            now = self.env.now
-            to_release = []
-            for job in list(self.held_jobs):
-                if job.hold_since and (now - job.hold_since) >= self.controller.HOLD_LIMIT:
-                    to_release.append(job)
-                    self.held_jobs.remove(job)
-            if to_release:
-                res = self.controller.emergency_release_held(to_release)
-                # increment cross-sends if from O1 to L5..L9
-                for jid, buf in res:
-                    if job.origin == "O1" and int(buf[1:]) >= 5:
-                        self.stats["cross_sends"] += 1
+            if not self.event_driven:
+                yield self.env.timeout(1.0)
+            elif self.held_jobs:
+                yield self.env.timeout(max(0.0, self.held_jobs[0][0] - self.env.now))
+            else:
+                self._job_held = self.env.event()
+                yield self._job_held
+                continue
+            self.release_expired()
 
     def main_conveyor_worker(self):
-        """Periodically ask controller to pick and simulate processing time"""
+        """Ask controller to pick and simulate processing time: every second, or (event-driven) whenever there may be something to pick"""
         while True:
-            yield self.env.timeout(1.0)  # check every second
+            if not self.event_driven:
+                yield self.env.timeout(1.0)  # check every second
             buf_id, n = self.controller.decide_pick()
-            if buf_id:
-                picked = self.controller.execute_pick(buf_id, n)
-                if picked:
-                    # simulate processing time proportional to n (just a placeholder)
-                    process_time = 5.0 + 0.5 * len(picked)
-                    yield self.env.timeout(process_time)
-                    # update stats
-                    self.stats["throughput"] += len(picked)
-                    # compute changeovers in this pick (internal)
-                    # if previous pick exists, compare last color
-                    # simple calculation:
-                    if len(self.plant.main_conveyor_history) >= 2:
-                        prev = self.plant.main_conveyor_history[-2]
-                        cur = self.plant.main_conveyor_history[-1]
-                        prev_last = prev["colors"][-1]
-                        cur_first = cur["colors"][0]
-                        if prev_last != cur_first:
-                            self.stats["changeovers"] += 1
+            history = self.plant.main_conveyor_history
+            before = history.pick_changeovers
+            picked = self.controller.execute_pick(buf_id, n) if buf_id else []
+            if picked:
+                # simulate processing time proportional to n (just a placeholder)
+                process_time = 5.0 + 0.5 * len(picked)
+                yield self.env.timeout(process_time)
+                # update stats
+                self.stats["throughput"] += len(picked)
+                # changeover if this pick starts with a different color than the previous pick ended
+                self.stats["changeovers"] += history.pick_changeovers - before
+            elif self.event_driven:
+                # nothing to pick until a job arrives or a held job is released
+                self._plant_changed = self.env.event()
+                yield self._plant_changed
 
     def run(self, until=3600):
         env = self.env
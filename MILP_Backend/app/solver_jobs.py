@@ -0,0 +1,173 @@
+# app/solver_jobs.py
+"""
+Background solver jobs: drain planners and /milp sequencing run in a process pool, so
+API handlers return right away instead of blocking on CP-SAT for up to time_limit.
+Each job gets an id; workers publish improved plans (intermediate solutions) to a
+Manager list and watch a Manager event for cancellation, so the API can poll, fetch
+incumbents and cancel while the solve is running.
+"""
+from typing import Dict, List, Optional
+import concurrent.futures as cf
+import multiprocessing as mp
+import os
+import threading
+import time
+import uuid
+from .drain_planning import QueueRuns, make_planner, count_changeovers
+from .milp_benchmark import SEQUENCE_MODELS
+from .utils import color_code
+
+
+def _run_planner(name: str, config: dict, queue_runs: QueueRuns, last_color: Optional[int],
+                 remaining: Optional[list], submitted: float, updates, cancel) -> dict:
+    # runs in a worker process; with remaining (the unexecuted part of the current plan) it replans
+    planner = make_planner(name, **config)
+    planner.stop_event = cancel
+    planner.on_incumbent = lambda plan, changeovers: updates.append(
+        {"t": time.time() - submitted, "changeovers": changeovers, "plan": plan})
+    plan = planner.plan(queue_runs, last_color) if remaining is None else planner.replan(queue_runs, last_color, remaining)
+    return {"status": planner.status, "planner": name, "plan": plan,
+            "changeovers": count_changeovers(queue_runs, plan, last_color), "stats": planner.stats}
+
+
+def _run_sequence(model: str, items: list, horizon_slots: int, time_limit: float, workers: int,
+                  submitted: float, updates, cancel) -> dict:
+    # runs in a worker process; every improving sequence is published as it is found.
+    # items carry color names: codes are per process, so they are interned again here
+    items = [(bid, color_code(color), jid) for bid, color, jid in items]
+
+    def on_solution(update):
+        updates.append(dict(update, t=time.time() - submitted, solve_s=update["t"]))
+
+    return SEQUENCE_MODELS[model](items, horizon_slots=horizon_slots, time_limit=time_limit,
+                                  workers=workers, stop_event=cancel, on_solution=on_solution)
+
+
+class SolverJob:
+    """One submitted solve; status is pending, running, done, failed or cancelled."""
+
+    def __init__(self, kind: str, name: str, future: cf.Future, cancel, updates, submitted: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind          # "drain_plan" or "milp"
+        self.name = name          # planner or sequencing model
+        self.future = future
+        self.cancel_event = cancel
+        self.updates = updates
+        self.submitted = submitted
+        self.finished: Optional[float] = None
+        future.add_done_callback(lambda _: setattr(self, "finished", time.time()))
+
+    @property
+    def status(self) -> str:
+        if self.future.cancelled() or self.cancel_event.is_set():
+            return "cancelled"
+        if not self.future.done():
+            return "running" if self.future.running() else "pending"
+        return "failed" if self.future.exception() is not None else "done"
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self) -> Optional[dict]:
+        """The worker's result once finished (also after a cancel, with the best found so far)."""
+        if not self.future.done() or self.future.cancelled() or self.future.exception() is not None:
+            return None
+        return self.future.result()
+
+    def intermediate(self, since: int = 0) -> List[dict]:
+        return list(self.updates[since:])
+
+    def incumbent(self) -> Optional[dict]:
+        """Latest (best) intermediate solution, or None before the first one."""
+        try:
+            return self.updates[-1]
+        except IndexError:
+            return None
+
+    def cancel(self):
+        if self.future.done():
+            return
+        if not self.future.cancel():
+            self.cancel_event.set()  # already running: the worker stops its search
+
+    def to_dict(self) -> dict:
+        end = self.finished or time.time()
+        d = {"job_id": self.id, "kind": self.kind, "name": self.name, "status": self.status,
+             "elapsed": end - self.submitted, "intermediate": len(self.updates)}
+        if self.future.done() and not self.future.cancelled() and self.future.exception() is not None:
+            d["error"] = str(self.future.exception())
+        res = self.result()
+        if res is not None:
+            d["result"] = {k: v for k, v in res.items() if k not in ("plan", "sequence")}
+        return d
+
+
+class SolverJobs:
+    """Process pool plus the registry of submitted jobs (the most recent max_jobs are kept)."""
+
+    def __init__(self, max_workers: Optional[int] = None, max_jobs: int = 100):
+        # at least the default portfolio's size, so its members all start right away
+        self.max_workers = max_workers or max(5, os.cpu_count() or 1)
+        self.max_jobs = max_jobs
+        self.jobs: Dict[str, SolverJob] = {}
+        self._pool: Optional[cf.ProcessPoolExecutor] = None
+        self._manager = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the pool's manager process now (about half a second) instead of on the first
+        submit, which may come from a plant's writer thread (a drain replan).
+        """
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        if self._pool is None:
+            # spawn: workers must not inherit the API's threads (uvicorn, CP-SAT) via fork
+            ctx = mp.get_context("spawn")
+            self._manager = ctx.Manager()
+            self._pool = cf.ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+
+    def _submit(self, kind: str, name: str, fn, *args) -> SolverJob:
+        with self._lock:
+            self._start()
+            updates, cancel = self._manager.list(), self._manager.Event()
+            submitted = time.time()
+            future = self._pool.submit(fn, *args, submitted, updates, cancel)
+            job = SolverJob(kind, name, future, cancel, updates, submitted)
+            self.jobs[job.id] = job
+            finished = [jid for jid, j in self.jobs.items() if j.done()]
+            for jid in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+                del self.jobs[jid]
+        return job
+
+    def submit_planner(self, name: str, config: dict, queue_runs: QueueRuns,
+                       last_color: Optional[int] = None, remaining: Optional[list] = None) -> SolverJob:
+        """
+        config: make_planner keyword arguments (capacities, K_max, drain_params, planner options).
+        remaining: replan mid-drain (DrainPlanner.replan) from this unexecuted plan instead of planning.
+        """
+        return self._submit("drain_plan", name, _run_planner, name, config, queue_runs, last_color, remaining)
+
+    def submit_sequence(self, model: str, items: list, horizon_slots: int,
+                        time_limit: float = 20.0, workers: int = 8) -> SolverJob:
+        """items: (buffer_id, color name, job_id), as the "head_items" plant read returns them."""
+        if model not in SEQUENCE_MODELS:
+            raise ValueError(f"Unknown sequencing model {model!r}; available: {sorted(SEQUENCE_MODELS)}")
+        return self._submit("milp", model, _run_sequence, model, items, horizon_slots, time_limit, workers)
+
+    def get(self, job_id: str) -> Optional[SolverJob]:
+        return self.jobs.get(job_id)
+
+    def shutdown(self):
+        with self._lock:
+            for job in self.jobs.values():
+                job.cancel()
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._manager.shutdown()
+                self._pool = self._manager = None
+
+
+SOLVER_JOBS = SolverJobs()  # shared by the API and the portfolio planner
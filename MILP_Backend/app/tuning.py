@@ -0,0 +1,236 @@
+# app/tuning.py
+"""
+Parameter search for OnlineController settings on seeded PlantSim replications
+(sim_batch). A configuration is a flat dict over SEARCH_SPACE keys ("R_min",
+"scores.w_same", "drain_params.run_value_per_job", ...); to_params turns it into
+controller params. Every replication of every configuration in a round goes to one
+process pool, results are cached on disk (JSON lines keyed by configuration and
+evaluation settings) so reruns and widened searches only simulate what is new, and
+the answer is the Pareto front over the objectives (by default most throughput, fewest
+changeovers, fewest cross-sends).
+
+Run from MILP_Backend/:
+    python -m app.tuning [--method grid|random|halving] [--params R_min,K_max,...] [--configs N]
+                         [--replications R] [--hours H] [--rate S] [--cache PATH]
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import concurrent.futures as cf
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+from .drain_planning import DEFAULT_DRAIN_PARAMS
+from .sim_batch import make_executor, run_replication, summarize
+
+# candidate values per parameter; defaults of OnlineController are among them
+SEARCH_SPACE: Dict[str, list] = {
+    "R_min": [2, 4, 6, 8, 12],
+    "occ_high": [0.8, 0.9, 0.95],
+    "global_high": [0.75, 0.85, 0.9, 0.95],
+    "hold_limit": [10.0, 30.0, 60.0, 120.0],
+    "K_max": [5, 10, 20, 40],
+    "scores.w_same": [5.0, 10.0, 20.0],
+    "scores.w_cross": [10.0, 20.0, 40.0],
+    "scores.w_occ": [0.5, 1.0, 2.0],
+    "scores.w_outputdown": [25.0, 50.0, 100.0],
+    **{f"drain_params.{k}": [v / 2, v, v * 2] for k, v in DEFAULT_DRAIN_PARAMS.items()},
+}
+# normal-mode knobs; drain_params only act in drain mode (tuned with drain=True)
+DEFAULT_PARAMS = [k for k in SEARCH_SPACE if not k.startswith("drain_params.")]
+
+# (metric, +1 to maximize / -1 to minimize)
+DEFAULT_OBJECTIVES = [("throughput", 1), ("changeovers", -1), ("cross_sends", -1)]
+
+
+def to_params(config: dict) -> dict:
+    """OnlineController params for a flat configuration."""
+    params = {}
+    for key, value in config.items():
+        group, _, name = key.partition(".")
+        if name:
+            params.setdefault(group, {})[name] = value
+        else:
+            params[key] = value
+    return params
+
+
+class TuningCache:
+    """Evaluated configurations on disk, one JSON object per line."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.entries[entry["key"]] = entry
+
+    @staticmethod
+    def key(config: dict, settings: dict) -> str:
+        blob = json.dumps({"config": config, "settings": settings}, sort_keys=True)
+        return hashlib.sha1(blob.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.entries.get(key)
+
+    def put(self, key: str, entry: dict):
+        entry = dict(entry, key=key)
+        self.entries[key] = entry
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def evaluate(configs: List[dict], replications: int, seconds: float, rates: Tuple[float, float],
+             seed: int, drain: bool, executor: cf.Executor, cache: TuningCache) -> List[dict]:
+    """Metric summaries per configuration: cached ones as they are, the others simulated together."""
+    settings = {"replications": replications, "seconds": seconds, "rates": list(rates),
+                "seed": seed, "drain": drain}
+    keys = [TuningCache.key(c, settings) for c in configs]
+    futures = {}
+    for config, key in zip(configs, keys):
+        if cache.get(key) is None and key not in futures:
+            futures[key] = (config, [executor.submit(run_replication, seed + i, seconds, rates[0], rates[1],
+                                                     to_params(config), True, drain)
+                                     for i in range(replications)])
+    for key, (config, fs) in futures.items():
+        runs = [f.result() for f in fs]
+        cache.put(key, {"config": config, "settings": settings, "metrics": summarize(runs)})
+    return [cache.get(key) for key in keys]
+
+
+def dominates(a: dict, b: dict, objectives) -> bool:
+    better = False
+    for name, sign in objectives:
+        x, y = sign * a["metrics"][name]["mean"], sign * b["metrics"][name]["mean"]
+        if x < y:
+            return False
+        better |= x > y
+    return better
+
+
+def pareto_ranks(results: List[dict], objectives) -> List[int]:
+    """Non-dominated sorting: 0 for the Pareto front, 1 for the front once it is removed, ..."""
+    ranks = [None] * len(results)
+    rank = 0
+    left = set(range(len(results)))
+    while left:
+        front = {i for i in left if not any(dominates(results[j], results[i], objectives) for j in left if j != i)}
+        for i in front:
+            ranks[i] = rank
+        left -= front
+        rank += 1
+    return ranks
+
+
+def pareto_front(results: List[dict], objectives=DEFAULT_OBJECTIVES) -> List[dict]:
+    ranks = pareto_ranks(results, objectives)
+    return [r for r, rank in zip(results, ranks) if rank == 0]
+
+
+def grid_configs(space: Dict[str, list]) -> Iterable[dict]:
+    keys = list(space)
+    for values in itertools.product(*(space[k] for k in keys)):
+        yield dict(zip(keys, values))
+
+
+def random_configs(space: Dict[str, list], n: int, rng: random.Random) -> List[dict]:
+    configs = []
+    seen = set()
+    total = math.prod(len(v) for v in space.values())
+    while len(configs) < min(n, total):
+        config = {k: rng.choice(v) for k, v in space.items()}
+        key = json.dumps(config, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+def tune(method: str = "random", params: Optional[List[str]] = None, configs: int = 20,
+         replications: int = 4, seconds: float = 3600, rates: Tuple[float, float] = (6.0, 6.0),
+         seed: int = 0, drain: Optional[bool] = None, objectives=None, eta: int = 3,
+         cache_path: Optional[str] = ".tuning_cache.jsonl", workers: Optional[int] = None) -> dict:
+    """
+    Search the given SEARCH_SPACE keys (default DEFAULT_PARAMS); unsearched parameters keep
+    the controller defaults. method:
+      grid     every combination (configs is ignored)
+      random   `configs` distinct random combinations
+      halving  successive halving: `configs` random combinations on seconds / eta^k simulated
+               seconds, keeping the best 1/eta by Pareto rank (ties: first objective) for a
+               eta times longer round, until one round runs the full `seconds`
+    drain: also drain the plant after each run (needed for drain_params); by default on
+    when any drain_params key is searched. Returns every evaluated result and the Pareto
+    front of the final round.
+    """
+    params = params or DEFAULT_PARAMS
+    unknown = set(params) - set(SEARCH_SPACE)
+    if unknown:
+        raise ValueError(f"Unknown parameters {sorted(unknown)}; available: {sorted(SEARCH_SPACE)}")
+    space = {k: SEARCH_SPACE[k] for k in params}
+    if drain is None:
+        drain = any(k.startswith("drain_params.") for k in params)
+    objectives = objectives or DEFAULT_OBJECTIVES + ([("drain_changeovers", -1)] if drain else [])
+    rng = random.Random(seed)
+    cache = TuningCache(cache_path)
+    cached = len(cache.entries)
+
+    with make_executor(workers) as executor:
+        def run(candidates, secs):
+            return evaluate(candidates, replications, secs, rates, seed, drain, executor, cache)
+
+        if method == "grid":
+            rounds = [run(list(grid_configs(space)), seconds)]
+        elif method == "random":
+            rounds = [run(random_configs(space, configs, rng), seconds)]
+        elif method == "halving":
+            candidates = random_configs(space, configs, rng)
+            n_rounds = max(1, math.ceil(math.log(len(candidates), eta)) + 1) if candidates else 1
+            rounds = []
+            for k in range(n_rounds):
+                results = run(candidates, seconds / eta ** (n_rounds - 1 - k))
+                rounds.append(results)
+                if k == n_rounds - 1 or len(candidates) <= 1:
+                    break
+                ranks = pareto_ranks(results, objectives)
+                name, sign = objectives[0]
+                order = sorted(range(len(results)),
+                               key=lambda i: (ranks[i], -sign * results[i]["metrics"][name]["mean"]))
+                candidates = [results[i]["config"] for i in order[:max(1, len(results) // eta)]]
+        else:
+            raise ValueError(f"Unknown search method {method!r}; use grid, random or halving")
+
+    final = rounds[-1]
+    return {"method": method, "objectives": objectives, "evaluated": [r for rs in rounds for r in rs],
+            "simulated": len(cache.entries) - cached, "pareto": pareto_front(final, objectives)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--method", default="random", choices=["grid", "random", "halving"])
+    ap.add_argument("--params", default=",".join(DEFAULT_PARAMS), help="comma-separated SEARCH_SPACE keys")
+    ap.add_argument("--configs", type=int, default=20)
+    ap.add_argument("--replications", type=int, default=4)
+    ap.add_argument("--hours", type=float, default=1.0, help="simulated hours per replication")
+    ap.add_argument("--rate", type=float, default=6.0, help="mean inter-arrival seconds per oven")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--cache", default=".tuning_cache.jsonl")
+    ap.add_argument("--workers", type=int)
+    args = ap.parse_args()
+
+    res = tune(args.method, args.params.split(","), args.configs, args.replications, args.hours * 3600,
+               (args.rate, args.rate), args.seed, cache_path=args.cache, workers=args.workers)
+    names = [name for name, _ in res["objectives"]]
+    print(f"{len(res['evaluated'])} evaluations ({res['simulated']} simulated, the rest cached), "
+          f"Pareto front of the final round:")
+    for r in sorted(res["pareto"], key=lambda r: -r["metrics"][names[0]]["mean"]):
+        metrics = "  ".join(f"{n} {r['metrics'][n]['mean']:.1f}" for n in names)
+        print(f"  {metrics}  <- {r['config']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 # app/utils.py
-from typing import Dict
+from typing import Dict, List
 import random
+import threading
 
 # colors and approximate distribution
 COLOR_DISTRIBUTION = {
@@ -18,10 +19,55 @@ COLOR_DISTRIBUTION = {
     "C12": 0.01
 }
 
-def sample_color():
+class ColorRegistry:
+    """
+    Interns color names ("C1".."C12", or anything the API is sent) as small integer codes.
+    Codes are handed out once, in registration order, and never change; everything
+    behind the API compares codes and only translates back to names at the boundary.
+    Codes are only meaningful in the process that handed them out: anything that leaves the
+    process (pickles, pipes, worker pools) carries names.
+    """
+    def __init__(self, names=()):
+        self._codes: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._lock = threading.Lock()
+        for name in names:
+            self.code(name)
+
+    def code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(name)
+                if code is None:
+                    code = len(self._names)
+                    self._names.append(name)
+                    self._codes[name] = code
+        return code
+
+    def name(self, code: int) -> str:
+        return self._names[code]
+
+    def names(self) -> List[str]:
+        """Every name so far, by code."""
+        return list(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+COLORS = ColorRegistry(COLOR_DISTRIBUTION)
+
+def color_code(name: str) -> int:
+    return COLORS.code(name)
+
+def color_name(code: int) -> str:
+    return COLORS.name(code)
+
+def sample_color(rng: random.Random = random):
+    # rng: a seeded random.Random for reproducible runs (PlantSim replications); default the global one
     colors = list(COLOR_DISTRIBUTION.keys())
     probs = list(COLOR_DISTRIBUTION.values())
-    return random.choices(colors, weights=probs, k=1)[0]
+    return rng.choices(colors, weights=probs, k=1)[0]
 
 # changeover cost: simple function (1 if different else 0) scaled by weight
 def changeover_cost(c1: str, c2: str) -> float:
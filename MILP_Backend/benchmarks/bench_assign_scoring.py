@@ -0,0 +1,70 @@
+# benchmarks/bench_assign_scoring.py
+"""
+assign_job: per-buffer Python scoring vs the NumPy VectorScorer.
+Replays the same arrival/pick stream on two identical plants, checks every
+assignment matches, and reports time per assign_job call.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_assign_scoring [n_buffers ...]
+"""
+import random
+import sys
+import time
+from app.models import Job, BufferLine, PlantState
+from app.controller import OnlineController
+from app.utils import sample_color
+
+
+def make_plant(n_buffers: int) -> PlantState:
+    buffers = {}
+    for i in range(1, n_buffers + 1):
+        buffers[f"L{i}"] = BufferLine(id=f"L{i}", capacity=16, reserve_headroom=1 if i >= 5 else 0)
+    return PlantState(buffers=buffers)
+
+
+def make_events(n_buffers: int, n_events: int, seed: int):
+    rnd = random.Random(seed)
+    random.seed(seed)
+    events = []
+    for i in range(n_events):
+        if rnd.random() < 0.55:
+            events.append(("arrival", sample_color(), rnd.choice(["O1", "O2"]), rnd.random() < 0.8))
+        else:
+            events.append(("pick", f"L{rnd.randint(1, n_buffers)}", rnd.randint(1, 6)))
+    return events
+
+
+def replay(scoring: str, n_buffers: int, events):
+    plant = make_plant(n_buffers)
+    ctrl = OnlineController(plant, params={"scoring": scoring})
+    out = []
+    elapsed = 0.0
+    calls = 0
+    for i, ev in enumerate(events):
+        if ev[0] == "arrival":
+            job = Job(id=i, color=ev[1], origin=ev[2], arrival_ts=0.0)
+            t0 = time.perf_counter()
+            try:
+                out.append(ctrl.assign_job(job, hold_at_oven_allowed=ev[3]))
+            except RuntimeError:
+                out.append("overflow")
+            elapsed += time.perf_counter() - t0
+            calls += 1
+        else:
+            plant.buffers[ev[1]].pop_n(ev[2])
+    return out, elapsed / max(1, calls)
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [9, 32, 100, 300, 1000]
+    print(f"{'buffers':>8} {'python (us)':>12} {'vectorized (us)':>16} {'identical':>10}")
+    for n in sizes:
+        events = make_events(n, 20_000, seed=n)
+        py, t_py = replay("python", n, events)
+        vec, t_vec = replay("vectorized", n, events)
+        print(f"{n:>8} {t_py * 1e6:>12.1f} {t_vec * 1e6:>16.1f} {str(py == vec):>10}")
+        assert py == vec
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,72 @@
+# benchmarks/bench_conveyor_history.py
+"""
+Main-conveyor history as an unbounded list of dicts, as PlantState used to keep it, vs
+the bounded ConveyorHistory (app/history.py): memory after N picks, append cost, and
+building the /state response (the whole list before, the newest 100 picks plus
+running aggregates now).
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_conveyor_history [picks ...]
+"""
+import json
+import random
+import sys
+import time
+import tracemalloc
+from app.history import ConveyorHistory
+from app.utils import color_code, sample_color
+
+
+def random_picks(n: int):
+    rng = random.Random(0)
+    buffers = [f"L{i}" for i in range(1, 10)]
+    return [(float(i), rng.choice(buffers), [sample_color(rng) for _ in range(rng.randint(1, 6))])
+            for i in range(n)]
+
+
+def fill_list(picks):
+    history = []
+    for ts, bid, colors in picks:
+        history.append({"ts": ts, "buffer": bid, "n": len(colors), "colors": colors, "operator": "controller"})
+    return history
+
+
+def fill_ring(picks):
+    history = ConveyorHistory()
+    for ts, bid, colors in picks:
+        history.append(ts, bid, [color_code(c) for c in colors], "controller")
+    return history
+
+
+def measured(fn, *args):
+    # timed and traced in separate calls: tracemalloc slows allocation-heavy code unevenly
+    t0 = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    out = fn(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return out, elapsed, size
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [10_000, 100_000, 500_000]
+    print(f"{'picks':>9} {'list MB':>8} {'ring MB':>8} {'list us/append':>15} {'ring us/append':>15} "
+          f"{'list /state ms':>15} {'ring /state ms':>15}")
+    for n in sizes:
+        picks = random_picks(n)
+        as_list, t_list, m_list = measured(fill_list, picks)
+        ring, t_ring, m_ring = measured(fill_ring, picks)
+        t0 = time.perf_counter()
+        json.dumps(as_list)
+        s_list = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        json.dumps({"main_history": ring.recent(100), "history_stats": ring.summary()})
+        s_ring = time.perf_counter() - t0
+        print(f"{n:>9} {m_list / 2**20:>8.1f} {m_ring / 2**20:>8.2f} {t_list / n * 1e6:>15.2f} "
+              f"{t_ring / n * 1e6:>15.2f} {s_list * 1e3:>15.1f} {s_ring * 1e3:>15.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
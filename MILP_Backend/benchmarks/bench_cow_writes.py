@@ -0,0 +1,62 @@
+# benchmarks/bench_cow_writes.py
+"""
+Cost per write through PlantCore as queues grow. The core publishes a copy-on-write snapshot
+after every command group, so each write is the first change to a buffer shared with the
+published view: this times picks (core.call(pick)) and single-job pushes, one per call, on a
+buffer holding N jobs, for both queue backends. With the runs backend both should stay flat
+in N; the list backend's pops shift (or, right after a publish, copy) the list.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_cow_writes [jobs ...]
+"""
+import random
+import statistics
+import sys
+import time
+from app.models import Job
+from app.plant_core import PlantCore
+from app.plants import make_plant, pick
+from app.utils import sample_color
+
+CALLS = 500
+
+
+def push(core: PlantCore, buffer_id: str, job: Job):
+    core.plant.buffers[buffer_id].push(job)
+
+
+def per_call_us(core: PlantCore, command, args_list) -> float:
+    times = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        core.call(command, *args)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1e6
+
+
+def run(n_jobs: int, backend: str):
+    rng = random.Random(0)
+    plant = make_plant({"L1": n_jobs + CALLS, "L2": 10}, queue_backend=backend)
+    for i in range(n_jobs):
+        plant.buffers["L1"].push(Job(id=i, color=sample_color(rng), origin="O1"))
+    core = PlantCore(plant)
+    try:
+        jobs = [(("L1", Job(id=f"new-{i}", color=sample_color(rng), origin="O1")),) for i in range(CALLS)]
+        t_push = per_call_us(core, push, [args for (args,) in jobs])
+        t_pick = per_call_us(core, pick, [("L1", 1, "manual")] * CALLS)
+    finally:
+        core.stop()
+    return t_push, t_pick
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [1_000, 10_000, 50_000, 200_000]
+    print(f"{'backend':>8} {'jobs':>8} {'push us':>9} {'pick us':>9}")
+    for backend in ("runs", "list"):
+        for n in sizes:
+            t_push, t_pick = run(n, backend)
+            print(f"{backend:>8} {n:>8} {t_push:>9.0f} {t_pick:>9.0f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
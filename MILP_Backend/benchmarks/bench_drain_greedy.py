@@ -0,0 +1,112 @@
+# benchmarks/bench_drain_greedy.py
+"""
+Scaling benchmark for the enhanced greedy drain planner, 100 -> 100k queued jobs.
+Compares drain_planning.GreedyDrainPlanner (heap-based) against the previous
+rescan-every-buffer implementation (kept below as the reference) and checks
+that both produce the same plan.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_drain_greedy [--buffers N] [--reference-max JOBS] [sizes ...]
+"""
+import argparse
+import random
+import time
+from collections import deque
+from app.models import Job, BufferLine, PlantState
+from app.controller import OnlineController
+from app.utils import sample_color, color_code
+
+
+def reference_plan(ctrl: OnlineController, local_queues: dict, last_color=None):
+    # the planner as it was: rescans and re-derives runs for every buffer on every step
+    plan = []
+    dp = ctrl.drain_params
+    while any(q for q in local_queues.values() if q):
+        best_bid = None
+        best_score = -1e9
+        best_run = 0
+        for bid, q in local_queues.items():
+            if not q:
+                continue
+            head_color = q[0]
+            r = 1
+            for col in q[1:]:
+                if col == head_color:
+                    r += 1
+                else:
+                    break
+            color_continuity = dp["color_continuity_bonus"] if (last_color is not None and head_color == last_color) else 0.0
+            run_value = r * dp["run_value_per_job"]
+            same_color_buffers = sum(1 for other_bid, other_q in local_queues.items()
+                                     if other_bid != bid and other_q and other_q[0] == head_color)
+            chaining_potential = same_color_buffers * dp["chain_value_per_buffer"]
+            next_color_after_run = q[r] if r < len(q) else None
+            next_run_length = 0
+            if next_color_after_run is not None:
+                for col in q[r:]:
+                    if col == next_color_after_run:
+                        next_run_length += 1
+                    else:
+                        break
+            look_ahead_value = next_run_length * dp["lookahead_value_per_job"]
+            occ_frac = len(q) / max(1, ctrl.plant.buffers[bid].capacity)
+            occupancy_pressure = occ_frac * dp["occupancy_pressure"]
+            total_of_color = sum(colors.count(head_color) for colors in local_queues.values())
+            rarity_bonus = (1.0 / (total_of_color + 1)) * dp["rarity_bonus_max"]
+            score = (color_continuity + run_value + chaining_potential +
+                     look_ahead_value + occupancy_pressure + rarity_bonus)
+            if score > best_score:
+                best_score = score
+                best_bid = bid
+                best_run = r
+        if best_bid is None:
+            break
+        to_pick = min(best_run, ctrl.K_max)
+        plan.append({"buffer": best_bid, "n": to_pick})
+        last_color = local_queues[best_bid][0]
+        local_queues[best_bid] = local_queues[best_bid][to_pick:]
+    return deque(plan)
+
+
+def make_controller(n_buffers: int, n_jobs: int, seed: int) -> OnlineController:
+    random.seed(seed)
+    per_line = -(-n_jobs // n_buffers)
+    buffers = {f"L{i}": BufferLine(id=f"L{i}", capacity=max(16, per_line)) for i in range(1, n_buffers + 1)}
+    # sticky colors so queues have realistic runs
+    for b in buffers.values():
+        color = sample_color()
+        while b.occupancy() < per_line and sum(x.occupancy() for x in buffers.values()) < n_jobs:
+            if random.random() < 0.4:
+                color = sample_color()
+            b.push(Job(id=0, color=color, origin="O1", arrival_ts=0.0))
+    return OnlineController(PlantState(buffers=buffers))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("sizes", nargs="*", type=int, default=[100, 1_000, 10_000, 100_000])
+    ap.add_argument("--buffers", type=int, default=9)
+    ap.add_argument("--reference-max", type=int, default=10_000,
+                    help="skip the reference planner above this many jobs (it is quadratic)")
+    args = ap.parse_args()
+    print(f"{'jobs':>8} {'buffers':>8} {'plan steps':>10} {'heap (ms)':>10} {'reference (ms)':>15} {'same plan':>10}")
+    for n in args.sizes:
+        ctrl = make_controller(args.buffers, n, seed=n)
+        queue_runs = {bid: b.color_runs() for bid, b in ctrl.plant.buffers.items()}
+        last = color_code("C1")
+        t0 = time.perf_counter()
+        plan = ctrl.make_planner("greedy").plan(queue_runs, last)
+        t_heap = time.perf_counter() - t0
+        ref_ms, same = "-", "-"
+        if n <= args.reference_max:
+            local_queues = {bid: [j.color_code for j in b.queue] for bid, b in ctrl.plant.buffers.items()}
+            t0 = time.perf_counter()
+            ref = reference_plan(ctrl, local_queues, last)
+            ref_ms = f"{(time.perf_counter() - t0) * 1e3:.1f}"
+            same = str(list(ref) == plan)
+            assert list(ref) == plan
+        print(f"{n:>8} {args.buffers:>8} {len(plan):>10} {t_heap * 1e3:>10.1f} {ref_ms:>15} {same:>10}")
+
+
+if __name__ == "__main__":
+    main()
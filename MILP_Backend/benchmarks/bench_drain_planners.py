@@ -0,0 +1,72 @@
+# benchmarks/bench_drain_planners.py
+"""
+Head-to-head drain planners on full demo plants: changeovers and planning time.
+Plants are filled through OnlineController.assign_job so queues look like the live system.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_drain_planners [--plants N] [--fill F] [--opt name.key=value ...] [planner ...]
+"""
+import argparse
+import random
+import statistics
+import time
+from app.controller import OnlineController
+from app.demo_data import default_plant
+from app.drain_planning import PLANNERS, count_changeovers
+from app.models import Job
+from app.utils import sample_color
+
+
+def filled_controller(seed: int, fill: float = 1.0) -> OnlineController:
+    random.seed(seed)
+    ctrl = OnlineController(default_plant())
+    target = int(fill * sum(b.capacity - b.reserve_headroom for b in ctrl.plant.buffers.values()))
+    i = 0
+    while ctrl.total_occupancy() < target and i < 10 * target:
+        ctrl.assign_job(Job(id=i, color=sample_color(), origin=random.choice(["O1", "O2"]), arrival_ts=0.0))
+        i += 1
+    return ctrl
+
+
+def parse_options(pairs):
+    opts = {}
+    for pair in pairs:
+        key, value = pair.split("=", 1)
+        name, opt = key.split(".", 1)
+        opts.setdefault(name, {})[opt] = float(value) if "." in value else int(value)
+    return opts
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("planners", nargs="*", default=["greedy", "beam"])
+    ap.add_argument("--plants", type=int, default=20)
+    ap.add_argument("--fill", type=float, default=1.0)
+    ap.add_argument("--opt", action="append", default=[], help="planner option, e.g. beam.beam_width=64")
+    args = ap.parse_args()
+    options = parse_options(args.opt)
+    unknown = set(args.planners) - set(PLANNERS)
+    if unknown:
+        ap.error(f"unknown planners {sorted(unknown)}; available: {sorted(PLANNERS)}")
+
+    results = {name: ([], []) for name in args.planners}
+    for seed in range(args.plants):
+        ctrl = filled_controller(seed, args.fill)
+        queue_runs = ctrl._queue_runs()
+        for name in args.planners:
+            ctrl.drain_planner_options[name] = options.get(name, {})
+            planner = ctrl.make_planner(name)
+            t0 = time.perf_counter()
+            plan = planner.plan(queue_runs, None)
+            results[name][1].append(time.perf_counter() - t0)
+            results[name][0].append(count_changeovers(queue_runs, plan, None))
+
+    print(f"{args.plants} plants, fill {args.fill:.0%}")
+    print(f"{'planner':>10} {'mean changeovers':>17} {'min':>5} {'max':>5} {'mean ms':>9} {'max ms':>9}")
+    for name, (cos, ts) in results.items():
+        print(f"{name:>10} {statistics.mean(cos):>17.2f} {min(cos):>5} {max(cos):>5} "
+              f"{statistics.mean(ts) * 1e3:>9.1f} {max(ts) * 1e3:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_drain_portfolio.py
+"""
+Portfolio drain planner on full demo plants: changeovers against greedy, wall time,
+which member won each plant and every member's own result within the deadline.
+The first plant also pays for starting the worker processes.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_drain_portfolio [--plants N] [--fill F] [--deadline S]
+"""
+import argparse
+import collections
+import statistics
+import time
+from app.solver_jobs import SOLVER_JOBS
+from benchmarks.bench_drain_planners import filled_controller
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--plants", type=int, default=5)
+    ap.add_argument("--fill", type=float, default=1.0)
+    ap.add_argument("--deadline", type=float, default=5.0)
+    args = ap.parse_args()
+
+    print(f"{args.plants} plants, fill {args.fill:.0%}, deadline {args.deadline:g}s, "
+          f"{SOLVER_JOBS.max_workers} worker processes")
+    print(f"{'plant':>5} {'greedy':>7} {'portfolio':>10} {'wall s':>7} {'winner':>12}")
+    wins = collections.Counter()
+    member_changeovers = collections.defaultdict(list)
+    member_missed = collections.Counter()
+    greedy, best = [], []
+    try:
+        for seed in range(args.plants):
+            ctrl = filled_controller(seed, args.fill)
+            ctrl.drain_planner_options["portfolio"] = {"deadline": args.deadline}
+            planner = ctrl.make_planner("portfolio")
+            t0 = time.perf_counter()
+            planner.plan(ctrl._queue_runs(), None)
+            wall = time.perf_counter() - t0
+            st = planner.stats
+            greedy.append(st["greedy_changeovers"])
+            best.append(st["changeovers"])
+            wins[st["winner"]] += 1
+            for label, m in st["members"].items():
+                if "changeovers" in m:
+                    member_changeovers[label].append(m["changeovers"])
+                else:
+                    member_missed[label] += 1
+            print(f"{seed:>5} {greedy[-1]:>7} {best[-1]:>10} {wall:>7.2f} {st['winner']:>12}")
+    finally:
+        SOLVER_JOBS.shutdown()
+
+    print(f"\nmean changeovers: greedy {statistics.mean(greedy):.2f}, portfolio {statistics.mean(best):.2f}")
+    print(f"{'member':>12} {'wins':>5} {'mean changeovers':>17} {'missed deadline':>16}")
+    for label in sorted(set(member_changeovers) | set(member_missed) | set(wins)):
+        cos = member_changeovers.get(label)
+        mean = f"{statistics.mean(cos):.2f}" if cos else "-"
+        print(f"{label:>12} {wins[label]:>5} {mean:>17} {member_missed[label]:>16}")
+
+
+if __name__ == "__main__":
+    main()
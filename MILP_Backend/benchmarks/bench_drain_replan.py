@@ -0,0 +1,64 @@
+# benchmarks/bench_drain_replan.py
+"""
+Full drains through OnlineController.decide_pick with dynamic replanning every
+drain_replan_threshold picks: changeovers actually painted and time spent per replan,
+for each replan planner (greedy, cold CP-SAT, warm-started CP-SAT session).
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_drain_replan [--plants N] [--fill F] [--time-limit S] [planner ...]
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import time
+from app.drain_planning import PLANNERS
+from benchmarks.bench_drain_planners import filled_controller
+
+
+def drain(ctrl):
+    """Run decide_pick/execute_pick until the plant is empty; painted colors and seconds per decide_pick."""
+    colors = []
+    timings = []
+    while True:
+        t0 = time.perf_counter()
+        bid, n = ctrl.decide_pick()
+        timings.append(time.perf_counter() - t0)
+        if not bid:
+            return colors, timings
+        colors.extend(job.color for job in ctrl.plant.buffers[bid].queue[:n])
+        ctrl.execute_pick(bid, n)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("planners", nargs="*", default=["greedy", "cpsat", "cpsat_warm"])
+    ap.add_argument("--plants", type=int, default=5)
+    ap.add_argument("--fill", type=float, default=1.0)
+    ap.add_argument("--time-limit", type=float, default=1.0, help="per replan, for the CP-SAT planners")
+    args = ap.parse_args()
+    unknown = set(args.planners) - set(PLANNERS)
+    if unknown:
+        ap.error(f"unknown planners {sorted(unknown)}; available: {sorted(PLANNERS)}")
+
+    print(f"{args.plants} plants, fill {args.fill:.0%}, initial plan from the default drain planner")
+    print(f"{'replan':>12} {'planned':>8} {'painted':>8} {'max pick s':>11} {'drain s':>8}")
+    for name in args.planners:
+        planned, painted, slowest, total = [], [], [], []
+        for seed in range(args.plants):
+            ctrl = filled_controller(seed, args.fill)
+            ctrl.replan_planner = name
+            ctrl.drain_planner_options.setdefault(name, {})["time_limit"] = args.time_limit
+            with contextlib.redirect_stdout(io.StringIO()):  # [DRAIN] logging
+                res = ctrl.enter_drain_mode(use_milp=True)
+                colors, timings = drain(ctrl)
+            planned.append(res["changeovers"])
+            painted.append(sum(a != b for a, b in zip(colors, colors[1:])))
+            slowest.append(max(timings))
+            total.append(sum(timings))
+        print(f"{name:>12} {statistics.mean(planned):>8.2f} {statistics.mean(painted):>8.2f} "
+              f"{max(slowest):>11.2f} {statistics.mean(total):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
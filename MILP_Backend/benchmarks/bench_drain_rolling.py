@@ -0,0 +1,45 @@
+# benchmarks/bench_drain_rolling.py
+"""
+Drains of thousands of queued jobs: greedy, beam, the single CP-SAT call (which only
+models the first HEAD_ITEMS_PER_BUFFER jobs per buffer and appends greedy for the rest)
+and the rolling-horizon CP-SAT planner. Changeovers, total planning time and, for the
+rolling planner, the number of windows and the slowest window solve.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_drain_rolling [--buffers N] [--planners a,b,...] [sizes ...]
+"""
+import argparse
+import time
+from app.drain_planning import PLANNERS, count_changeovers
+from benchmarks.bench_drain_greedy import make_controller
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("sizes", nargs="*", type=int, default=[500, 2_000])
+    ap.add_argument("--buffers", type=int, default=9)
+    ap.add_argument("--planners", default="greedy,beam,cpsat,rolling")
+    args = ap.parse_args()
+    names = args.planners.split(",")
+    unknown = set(names) - set(PLANNERS)
+    if unknown:
+        ap.error(f"unknown planners {sorted(unknown)}; available: {sorted(PLANNERS)}")
+
+    print(f"{'jobs':>6} {'planner':>8} {'changeovers':>12} {'plan s':>8} {'windows':>8} {'max window s':>13}")
+    for n in args.sizes:
+        ctrl = make_controller(args.buffers, n, seed=n)
+        queue_runs = ctrl._queue_runs()
+        for name in names:
+            planner = ctrl.make_planner(name)
+            t0 = time.perf_counter()
+            plan = planner.plan(queue_runs, None)
+            elapsed = time.perf_counter() - t0
+            windows = planner.stats.get("windows", "-")
+            max_window = planner.stats.get("max_window_s")
+            max_window = "-" if max_window is None else f"{max_window:.2f}"
+            print(f"{n:>6} {name:>8} {count_changeovers(queue_runs, plan, None):>12} {elapsed:>8.1f} "
+                  f"{windows:>8} {max_window:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/bench_event_ingest.py
+"""
+Load test for oven-event ingestion through the HTTP API (FastAPI TestClient, so request
+parsing, validation and JSON encoding are included but no network): one /arrival or
+/trigger_pick request per event vs /events batches, on a replayed MES burst of arrivals
+with a pick after every second one. Reports events per second against TARGET_EVENTS_PER_S,
+the throughput /events is expected to sustain (see README, Benchmarks).
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_event_ingest [--events N] [--batch B ...]
+"""
+import argparse
+import random
+import time
+from fastapi.testclient import TestClient
+from app import main as api
+from app.demo_data import default_plant
+from app.plants import DEFAULT_PLANT
+from app.utils import sample_color
+
+TARGET_EVENTS_PER_S = 5_000  # /events, batches of 1000, one core
+
+
+def fresh_plant(capacity: int):
+    plant = default_plant()
+    for b in plant.buffers.values():
+        b.capacity = capacity
+    api.PLANTS.call(DEFAULT_PLANT, "replace_plant", plant)
+
+
+def burst(n: int):
+    rng = random.Random(0)
+    events = []
+    for i in range(n):
+        if i % 3 == 2:
+            events.append({"type": "pick"})
+        else:
+            events.append({"type": "arrival", "oven": rng.choice(["O1", "O2"]), "color": sample_color(rng),
+                           "id": f"mes-{i}"})
+    return events
+
+
+def one_by_one(client: TestClient, events):
+    for e in events:
+        if e["type"] == "arrival":
+            client.post("/arrival", params={"oven": e["oven"], "color": e["color"]})
+        else:
+            client.post("/trigger_pick")
+
+
+def batched(client: TestClient, events, size: int):
+    for i in range(0, len(events), size):
+        r = client.post("/events", json={"events": events[i:i + size]})
+        assert r.status_code == 200, r.text
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=6000)
+    ap.add_argument("--batch", type=int, nargs="*", default=[10, 100, 1000])
+    args = ap.parse_args()
+    events = burst(args.events)
+    client = TestClient(api.app)
+
+    print(f"{len(events)} events (2 arrivals : 1 pick)")
+    print(f"{'mode':>16} {'events/s':>10}")
+    runs = [("single requests", lambda: one_by_one(client, events))]
+    runs += [(f"/events x{size}", lambda size=size: batched(client, events, size)) for size in args.batch]
+    rates = {}
+    for name, run in runs:
+        fresh_plant(len(events))
+        t0 = time.perf_counter()
+        run()
+        rates[name] = len(events) / (time.perf_counter() - t0)
+        print(f"{name:>16} {rates[name]:>10.0f}")
+    if 1000 in args.batch:
+        rate = rates["/events x1000"]
+        verdict = "met" if rate >= TARGET_EVENTS_PER_S else "MISSED"
+        print(f"target {TARGET_EVENTS_PER_S} events/s with batches of 1000: {verdict}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# benchmarks/bench_event_replay.py
+"""
+Event log cost and recovery speed (app/event_log.py):
+  - ingest: /events-style batches of 1000 (apply_events on a PlantCore) with and without an
+    EventLog, so the fsync per batch and the records are included
+  - replay: recover() of a log of N events (2 arrivals : 1 pick, on a plant with room for
+    all of them), against TARGET_EVENTS_PER_S; bytes per event on disk.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_event_replay [--events N]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from app.event_log import EventLog, recover
+from app.models import Job
+from app.plant_core import PlantCore
+from app.plants import apply_events, make_plant
+from app.utils import sample_color
+
+TARGET_EVENTS_PER_S = 1_000_000  # replay, one core
+BATCH = 1000
+
+
+def write_log(directory: str, n_events: int, capacity: int):
+    # a valid log without the controller: arrivals to random buffers, picks of what is queued
+    rng = random.Random(0)
+    plant = make_plant({f"L{i}": capacity for i in range(1, 10)})
+    log = EventLog(directory)
+    log.SNAPSHOT_EVERY = n_events + 1  # one segment: replay all of it
+    log.checkpoint(plant, False, wait=True)
+    occupancy = dict.fromkeys(plant.buffers, 0)
+    bids = list(plant.buffers)
+    ts = time.time()
+    for i in range(n_events):
+        ts += 0.01
+        bid = bids[rng.randrange(len(bids))]
+        if i % 3 == 2 and occupancy[bid]:
+            n = min(occupancy[bid], rng.randint(1, 4))
+            occupancy[bid] -= n
+            log.pick(ts, bid, n, "controller")
+        else:
+            job = Job(id=f"job-{i}", color=sample_color(rng), origin="O1" if bid < "L5" else "O2", arrival_ts=ts)
+            occupancy[bid] += 1
+            log.arrival(job, bid)
+        if i % BATCH == BATCH - 1:
+            log.flush()
+    log.close()
+    return sum(occupancy.values())
+
+
+def ingest_rate(n_events: int, log_dir=None) -> float:
+    rng = random.Random(1)
+    events = [{"type": "pick"} if i % 3 == 2 else
+              {"type": "arrival", "oven": rng.choice(["O1", "O2"]), "color": sample_color(rng), "id": f"mes-{i}"}
+              for i in range(n_events)]
+    plant = make_plant({f"L{i}": n_events for i in range(1, 10)})
+    log = None
+    if log_dir is not None:
+        log = EventLog(log_dir)
+        log.checkpoint(plant, False, wait=True)
+    core = PlantCore(plant, log=log)
+    t0 = time.perf_counter()
+    for i in range(0, n_events, BATCH):
+        core.call(apply_events, events[i:i + BATCH])
+    elapsed = time.perf_counter() - t0
+    core.stop()
+    return n_events / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=2_000_000)
+    ap.add_argument("--ingest-events", type=int, default=30_000)
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp(prefix="event-log-")
+    try:
+        print(f"ingest, batches of {BATCH}: {ingest_rate(args.ingest_events):,.0f} events/s without a log, "
+              f"{ingest_rate(args.ingest_events, os.path.join(tmp, 'ingest')):,.0f} with")
+
+        directory = os.path.join(tmp, "replay")
+        t0 = time.perf_counter()
+        queued = write_log(directory, args.events, args.events)
+        print(f"wrote {args.events:,} events in {time.perf_counter() - t0:.1f}s, "
+              f"{sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / args.events:.1f} "
+              f"bytes/event on disk")
+        plant, _, stats = recover(directory)
+        assert sum(b.occupancy() for b in plant.buffers.values()) == queued
+        rate = stats["events"] / stats["seconds"]
+        print(f"replay: {stats['events']:,} events in {stats['seconds']:.2f}s = {rate:,.0f} events/s "
+              f"({queued:,} jobs still queued, {plant.main_conveyor_history.total_colors:,} painted)")
+        print(f"target {TARGET_EVENTS_PER_S:,} events/s: {'met' if rate >= TARGET_EVENTS_PER_S else 'MISSED'}")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_job_storage.py
+"""
+Memory-per-job and simulation throughput: slotted Job with int ids vs the previous
+dict-backed dataclass with uuid4 string ids.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_job_storage [n_jobs] [sim_seconds]
+"""
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+import simpy
+from app.models import Job
+from app.controller import OnlineController
+from app.demo_data import default_plant
+from app.simulator import PlantSim
+from app.utils import sample_color, color_code
+
+
+@dataclass
+class LegacyJob:
+    # the Job dataclass as it was before slots / int ids
+    id: str
+    color: str
+    origin: str
+    arrival_ts: float = field(default_factory=time.time)
+    assigned_buffer: Optional[str] = None
+    hold_since: Optional[float] = None
+
+
+class LegacyJobSim(PlantSim):
+    def new_job(self, color, origin):
+        job = LegacyJob(id=str(uuid.uuid4()), color=color, origin=origin, arrival_ts=self.env.now)
+        job._cross_send_emergency = False  # assign_job used to attach this dynamically
+        job.color_code = color_code(color)  # read by the controller since colors are interned
+        return job
+
+
+def bytes_per_job(make, n):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    jobs = [make(i) for i in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    del jobs
+    return used / n
+
+
+def sim_rate(sim_cls, seconds, seed=0):
+    random.seed(seed)
+    plant = default_plant()
+    ctrl = OnlineController(plant)
+    env = simpy.Environment()
+    sim = sim_cls(env, plant, ctrl, o1_rate=1.0, o2_rate=1.0)
+    t0 = time.perf_counter()
+    stats = sim.run(until=seconds)
+    return stats, time.perf_counter() - t0
+
+
+def main(argv):
+    n = int(argv[0]) if argv else 100_000
+    seconds = int(argv[1]) if len(argv) > 1 else 50_000
+    colors = [sample_color() for _ in range(64)]
+    legacy = bytes_per_job(lambda i: LegacyJob(id=str(uuid.uuid4()), color=colors[i & 63], origin="O1"), n)
+    compact = bytes_per_job(lambda i: Job(id=i, color=colors[i & 63], origin="O1"), n)
+    print(f"memory per job ({n} jobs): legacy {legacy:.0f} B, slotted+int id {compact:.0f} B "
+          f"({legacy / compact:.1f}x smaller)")
+
+    legacy_stats, legacy_t = sim_rate(LegacyJobSim, seconds)
+    stats, t = sim_rate(PlantSim, seconds)
+    assert legacy_stats == stats, (legacy_stats, stats)
+    print(f"simulation ({seconds} sim-s, {stats['throughput']} jobs painted): "
+          f"legacy {seconds / legacy_t:,.0f} sim-s/s, slotted {seconds / t:,.0f} sim-s/s; identical stats")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,74 @@
+# benchmarks/bench_milp_models.py
+"""
+CP-SAT sequencing models from app/milp_benchmark.py on the same drain problems:
+model build time, solve time, changeovers found and the gap to the solver's lower bound,
+plus when the first and the final solution were found (stats["trace"]); --trace prints
+every improving solution (seconds, objective, bound) for time-to-quality charts.
+Each plant's items are the first K jobs of every buffer, as milp_short_horizon uses them.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_milp_models [--plants N] [--fill F] [--items-per-buffer K]
+                                           [--horizon T] [--time-limit S] [--trace] [model ...]
+"""
+import argparse
+import statistics
+from app.milp_benchmark import SEQUENCE_MODELS, HEAD_ITEMS_PER_BUFFER
+from benchmarks.bench_drain_planners import filled_controller
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("models", nargs="*", default=["time_indexed", "blocks"])
+    ap.add_argument("--plants", type=int, default=3)
+    ap.add_argument("--fill", type=float, default=1.0)
+    ap.add_argument("--items-per-buffer", type=int, default=HEAD_ITEMS_PER_BUFFER)
+    ap.add_argument("--horizon", type=int, default=300)
+    ap.add_argument("--time-limit", type=float, default=10.0)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--trace", action="store_true", help="print every improving solution")
+    args = ap.parse_args()
+    unknown = set(args.models) - set(SEQUENCE_MODELS)
+    if unknown:
+        ap.error(f"unknown models {sorted(unknown)}; available: {sorted(SEQUENCE_MODELS)}")
+
+    print(f"{args.plants} plants, fill {args.fill:.0%}, K={args.items_per_buffer}, "
+          f"horizon {args.horizon}, {args.time_limit:g}s limit, {args.workers} workers")
+    print(f"{'plant':>5} {'model':>13} {'items':>6} {'build s':>8} {'solve s':>8} "
+          f"{'first s':>8} {'best s':>7} {'sequenced':>10} {'changeovers':>12} {'bound':>6} {'gap':>5} {'optimal':>8}")
+    summary = {name: [] for name in args.models}
+    for seed in range(args.plants):
+        ctrl = filled_controller(seed, args.fill)
+        items = []
+        for bid, q in ctrl._queue_runs().items():
+            colors = [c for c, n in q for _ in range(n)][:args.items_per_buffer]
+            items.extend((bid, c, None) for c in colors)
+        for name in args.models:
+            res = SEQUENCE_MODELS[name](items, horizon_slots=args.horizon,
+                                        time_limit=args.time_limit, workers=args.workers)
+            if res.get("status") != "ok":
+                print(f"{seed:>5} {name:>13} {len(items):>6} {res.get('status')}")
+                continue
+            st = res["stats"]
+            colors = [s["color"] for s in res["sequence"]]
+            changeovers = sum(a != b for a, b in zip(colors, colors[1:]))
+            # the time-indexed objective also charges unsequenced items, so the gap is only
+            # in changeovers when every item within the horizon was sequenced
+            complete = len(colors) == min(args.horizon, len(items))
+            gap = st["objective"] - st["bound"] if complete else float("nan")
+            summary[name].append((st["build_s"], st["solve_s"], changeovers, gap))
+            first, best = st["trace"][0][0], st["trace"][-1][0]
+            print(f"{seed:>5} {name:>13} {len(items):>6} {st['build_s']:>8.3f} {st['solve_s']:>8.2f} "
+                  f"{first:>8.2f} {best:>7.2f} {len(colors):>10} {changeovers:>12} {st['bound']:>6.0f} {gap:>5.0f} {str(st['optimal']):>8}")
+            if args.trace:
+                print("      " + "  ".join(f"{t:.2f}s:{obj:g}/{bound:g}" for t, obj, bound in st["trace"]))
+
+    print(f"\n{'model':>13} {'mean build s':>13} {'mean solve s':>13} {'mean changeovers':>17} {'mean gap':>9}")
+    for name, rows in summary.items():
+        if rows:
+            build, solve, cos, gaps = zip(*rows)
+            print(f"{name:>13} {statistics.mean(build):>13.3f} {statistics.mean(solve):>13.2f} "
+                  f"{statistics.mean(cos):>17.2f} {statistics.mean(gaps):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/bench_plant_isolation.py
+"""
+Tenant isolation: arrival latency on plant B while plant A plans a long drain (the pure-Python
+beam planner on thousands of queued jobs, holding the GIL) on its writer thread. Plants in one
+process (PlantHost) share the GIL; with ShardedPlants they live in separate shard processes
+(ids picked to land on different shards). Reports B's /arrival-command latency idle and during
+A's planning. On one core the shards still share the CPU, so the gap is smaller than on a server.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_plant_isolation [--jobs N] [--budget S]
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from app.controller import OnlineController
+from app.models import Job
+from app.plants import PlantHost, ShardedPlants, make_plant, shard_of
+from app.utils import sample_color
+
+PLANT_A, PLANT_B = "plant-a", "tenant-b"  # shards 0 and 1 of 2
+
+
+def loaded_plant(n_jobs: int):
+    random.seed(0)
+    plant = make_plant({f"L{i}": n_jobs for i in range(1, 10)})
+    ctrl = OnlineController(plant)
+    for i in range(n_jobs):
+        ctrl.assign_job(Job(id=i, color=sample_color(), origin=random.choice(["O1", "O2"])),
+                        hold_at_oven_allowed=False)
+    return plant
+
+
+def arrival_latencies(plants, until=None, n=200):
+    # B's arrivals one after another: n of them, or until `until` finishes
+    out = []
+    while (until.is_alive() if until else len(out) < n):
+        t0 = time.perf_counter()
+        plants.call(PLANT_B, "arrive", "O1", None, None, False)
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def summary(latencies) -> str:
+    latencies = sorted(latencies)
+    return (f"median {statistics.median(latencies) * 1e3:7.2f} ms  p99 "
+            f"{latencies[int(len(latencies) * 0.99)] * 1e3:7.2f} ms  ({len(latencies)})")
+
+
+def run(plants, n_jobs: int, budget: float):
+    params = {"drain_planner": "beam", "drain_planner_options": {"beam": {"beam_width": 128, "time_budget": budget}}}
+    plants.create(PLANT_A, params=params)
+    plants.create(PLANT_B, capacities={f"L{i}": 100_000 for i in range(1, 10)})
+    plants.call(PLANT_A, "replace_plant", loaded_plant(n_jobs), params)
+    idle = arrival_latencies(plants)
+    drain = threading.Thread(target=plants.call, args=(PLANT_A, "enter_drain", True, False))
+    t0 = time.perf_counter()
+    drain.start()
+    busy = arrival_latencies(plants, until=drain)
+    drain.join()
+    return idle, busy, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=2000)
+    ap.add_argument("--budget", type=float, default=2.0, help="beam planner time budget, seconds")
+    args = ap.parse_args()
+    assert shard_of(PLANT_A, 2) != shard_of(PLANT_B, 2)
+
+    print(f"plant A drains {args.jobs} jobs (beam, {args.budget:.0f}s budget); plant B takes arrivals")
+    for name, plants in [("in-process", PlantHost()), ("2 shards", ShardedPlants(2))]:
+        try:
+            idle, busy, planning = run(plants, args.jobs, args.budget)
+        finally:
+            plants.stop()
+        print(f"{name:>10}  B idle: {summary(idle)}")
+        print(f"{'':>10}  B during A's {planning:.1f}s plan: {summary(busy)}")
+
+
+if __name__ == "__main__":
+    main()
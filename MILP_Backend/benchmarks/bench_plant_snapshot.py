@@ -0,0 +1,59 @@
+# benchmarks/bench_plant_snapshot.py
+"""
+Starting a simulation from the live plant: copy.deepcopy(plant), as /run_sim used to do,
+vs the copy-on-write PlantState.snapshot(), as queued jobs and conveyor history grow.
+Also times the first pick on each side afterwards, which pays for copying that buffer.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_plant_snapshot [jobs ...]
+"""
+import copy
+import random
+import sys
+import time
+from app.controller import OnlineController
+from app.demo_data import default_plant
+from app.models import Job
+from app.utils import sample_color
+
+
+def live_plant(n_jobs: int, n_picks: int):
+    random.seed(0)
+    plant = default_plant()
+    for b in plant.buffers.values():
+        b.capacity = n_jobs
+    ctrl = OnlineController(plant)
+    for i in range(n_jobs):
+        ctrl.assign_job(Job(id=i, color=sample_color(), origin=random.choice(["O1", "O2"])),
+                        hold_at_oven_allowed=False)
+    bids = list(plant.buffers)
+    for i in range(n_picks):
+        ctrl.execute_pick(bids[i % len(bids)], 1)
+    return plant
+
+
+def plant_jobs(plant):
+    return sum(b.occupancy() for b in plant.buffers.values())
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [10_000, 100_000, 500_000]
+    print(f"{'jobs':>8} {'history':>8} {'deepcopy ms':>12} {'snapshot us':>12} {'first pick ms':>14}")
+    for n in sizes:
+        plant = live_plant(n, n // 10)
+        _, t_deep = timed(lambda: copy.deepcopy(plant))
+        snap, t_snap = timed(plant.snapshot)
+        bid = max(snap.buffers, key=lambda b: snap.buffers[b].occupancy())
+        _, t_pick = timed(lambda: snap.buffers[bid].pop_n(1))
+        print(f"{plant_jobs(plant):>8} {len(plant.main_conveyor_history):>8} {t_deep * 1e3:>12.1f} "
+              f"{t_snap * 1e6:>12.0f} {t_pick * 1e3:>14.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
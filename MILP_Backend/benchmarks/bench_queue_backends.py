@@ -0,0 +1,66 @@
+# benchmarks/bench_queue_backends.py
+"""
+Microbenchmark: BufferLine queue backends at 10k+ jobs per line.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_queue_backends [jobs_per_line ...]
+"""
+import random
+import sys
+import time
+from app.models import Job, BufferLine
+from app.utils import sample_color
+
+
+def _legacy_pop_n(b: BufferLine, n: int):
+    # the original list backend: pop(0) in a loop
+    popped = []
+    for _ in range(min(n, b.occupancy())):
+        popped.append(b.queue.pop(0))
+    return popped
+
+
+def _fill(backend: str, jobs):
+    b = BufferLine(id="L1", capacity=len(jobs) + 1, queue_backend=backend)
+    for j in jobs:
+        b.push(j)
+    return b
+
+
+def run(n_jobs: int, pick: int = 8, seed: int = 0):
+    random.seed(seed)
+    jobs = [Job(id=str(i), color=sample_color(), origin="O1") for i in range(n_jobs)]
+    rows = []
+    for name in ("list-pop0", "list", "runs"):
+        backend = "runs" if name == "runs" else "list"
+        t0 = time.perf_counter()
+        b = _fill(backend, jobs)
+        t_push = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        reads = 0
+        for _ in range(1000):
+            reads += b.head_run_length() + len(b.queue[:30]) + (b.queue[-1] is not None)
+        t_read = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        while b.occupancy():
+            if name == "list-pop0":
+                _legacy_pop_n(b, pick)
+            else:
+                b.pop_n(pick)
+        t_pop = time.perf_counter() - t0
+        rows.append((name, t_push, t_read, t_pop))
+    return rows
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [10_000, 50_000]
+    print(f"{'jobs':>8} {'backend':>10} {'push (ms)':>10} {'1k reads (ms)':>14} {'drain pop_n(8) (ms)':>20}")
+    for n in sizes:
+        for name, t_push, t_read, t_pop in run(n):
+            print(f"{n:>8} {name:>10} {t_push*1e3:>10.1f} {t_read*1e3:>14.2f} {t_pop*1e3:>20.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
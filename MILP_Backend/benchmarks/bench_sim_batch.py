@@ -0,0 +1,42 @@
+# benchmarks/bench_sim_batch.py
+"""
+Seeded Monte Carlo batch (app/sim_batch.py): wall time with one worker process vs one
+per core for the same replications (identical results either way), and the resulting
+means with confidence intervals.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_sim_batch [--replications N] [--days D] [--rate S]
+"""
+import argparse
+import os
+import time
+from app.sim_batch import METRICS, run_batch
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--replications", type=int, default=8)
+    ap.add_argument("--days", type=float, default=1.0)
+    ap.add_argument("--rate", type=float, default=30.0, help="mean inter-arrival seconds per oven")
+    args = ap.parse_args()
+    seconds = args.days * 86400
+    cores = os.cpu_count() or 1
+
+    print(f"{args.replications} replications of {args.days:g} simulated days, rate {args.rate:g}s")
+    results = {}
+    for workers in sorted({1, cores}):
+        t0 = time.perf_counter()
+        results[workers] = run_batch(args.replications, seconds=seconds, o1_rate=args.rate,
+                                     o2_rate=args.rate, workers=workers)
+        print(f"{workers:>3} worker processes: {time.perf_counter() - t0:.2f}s wall")
+    assert results[1]["runs"] == results[cores]["runs"]
+
+    print(f"\n{'metric':>12} {'mean':>10} {'std':>9} {'95% CI':>22}")
+    for name in METRICS:
+        m = results[cores]["metrics"][name]
+        ci = f"[{m['ci_low']:.1f}, {m['ci_high']:.1f}]"
+        print(f"{name:>12} {m['mean']:>10.1f} {m['std']:>9.1f} {ci:>22}")
+
+
+if __name__ == "__main__":
+    main()
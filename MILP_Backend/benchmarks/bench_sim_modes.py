@@ -0,0 +1,51 @@
+# benchmarks/bench_sim_modes.py
+"""
+PlantSim with the 1-second tick loops vs event_driven=True on the same seeded arrivals:
+simulated seconds per wall second and the resulting stats. The event-driven conveyor
+picks as soon as a job is there instead of at the next tick, so stats differ a little.
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_sim_modes [--days D] [--rate S ...]
+"""
+import argparse
+import random
+import time
+import simpy
+from app.controller import OnlineController
+from app.demo_data import default_plant
+from app.simulator import PlantSim
+
+
+def run(seconds: float, rate: float, event_driven: bool, seed: int = 0):
+    random.seed(seed)
+    plant = default_plant()
+    ctrl = OnlineController(plant)
+    env = simpy.Environment()
+    sim = PlantSim(env, plant, ctrl, o1_rate=rate, o2_rate=rate, event_driven=event_driven)
+    t0 = time.perf_counter()
+    stats = sim.run(until=seconds)
+    return stats, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=float, default=7.0)
+    ap.add_argument("--rate", type=float, action="append",
+                    help="mean inter-arrival seconds per oven (default 30 and 120)")
+    args = ap.parse_args()
+    seconds = args.days * 86400
+
+    print(f"{args.days:g} simulated days")
+    print(f"{'rate s':>7} {'mode':>6} {'wall s':>8} {'sim-s/s':>12} {'painted':>8} {'changeovers':>12} {'overflows':>10}")
+    for rate in args.rate or [30.0, 120.0]:
+        walls = {}
+        for mode, event_driven in (("tick", False), ("event", True)):
+            stats, wall = run(seconds, rate, event_driven)
+            walls[mode] = wall
+            print(f"{rate:>7g} {mode:>6} {wall:>8.2f} {seconds / wall:>12,.0f} {stats['throughput']:>8} "
+                  f"{stats['changeovers']:>12} {stats['overflows']:>10}")
+        print(f"{'':>7} {'':>6} event-driven {walls['tick'] / walls['event']:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_state_delta.py
+"""
+Dashboard polling cost: full /state on every poll vs /state?since=<last version>, on a plant
+holding N queued jobs with a few arrivals and picks between polls. Reports bytes and
+milliseconds per poll (building and JSON-encoding the payload, as FastAPI does).
+
+Run from MILP_Backend/:
+    python -m benchmarks.bench_state_delta [jobs ...]
+"""
+import json
+import random
+import sys
+import time
+from app import main as api
+from app.controller import OnlineController
+from app.demo_data import default_plant
+from app.models import Job
+from app.plants import DEFAULT_PLANT, state_payload
+from app.utils import sample_color
+
+POLLS = 50
+CHANGES_PER_POLL = 3  # arrivals and picks between two polls
+
+
+def load_plant(n_jobs: int):
+    random.seed(0)
+    plant = default_plant()
+    for b in plant.buffers.values():
+        b.capacity = n_jobs
+    ctrl = OnlineController(plant)
+    for i in range(n_jobs):
+        ctrl.assign_job(Job(id=i, color=sample_color(), origin=random.choice(["O1", "O2"])),
+                        hold_at_oven_allowed=False)
+    api.PLANTS.call(DEFAULT_PLANT, "replace_plant", plant)
+
+
+def change(core):
+    if random.random() < 0.5:
+        core.controller.assign_job(Job(id=-1, color=sample_color(), origin="O1"), hold_at_oven_allowed=False)
+    else:
+        bid, n = core.controller.decide_pick()
+        if bid:
+            core.controller.execute_pick(bid, n)
+
+
+def poll(delta: bool):
+    random.seed(1)
+    core = api.PLANTS.core(DEFAULT_PLANT)
+    version = core.view().version  # the client starts from a full state
+    size, elapsed = 0, 0.0
+    for _ in range(POLLS):
+        for _ in range(CHANGES_PER_POLL):
+            core.call(change)
+        t0 = time.perf_counter()
+        payload = state_payload(core.view(), version if delta else 0)
+        size += len(json.dumps(payload))
+        elapsed += time.perf_counter() - t0
+        version = payload["version"]
+    return size / POLLS, elapsed / POLLS
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [1_000, 10_000, 100_000]
+    print(f"{'jobs':>8} {'full KB/poll':>13} {'delta KB/poll':>14} {'full ms/poll':>13} {'delta ms/poll':>14}")
+    for n in sizes:
+        load_plant(n)
+        full_bytes, full_s = poll(False)
+        load_plant(n)
+        delta_bytes, delta_s = poll(True)
+        print(f"{n:>8} {full_bytes / 1024:>13.1f} {delta_bytes / 1024:>14.1f} {full_s * 1e3:>13.2f} "
+              f"{delta_s * 1e3:>14.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
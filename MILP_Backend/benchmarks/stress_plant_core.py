@@ -0,0 +1,167 @@
+# benchmarks/stress_plant_core.py
+"""
+Concurrency stress test for the single-writer PlantCore behind the API (the default plant): writer threads
+send arrivals (/arrival, /events), picks (/trigger_pick, /events) and buffer toggles
+while reader threads follow /state?since= deltas, all at once through the FastAPI app
+(TestClient, so handlers run on FastAPI's thread pool as under uvicorn). Afterwards it
+checks that:
+  - every request succeeded, and every reader saw versions only go up
+  - each reader's delta-built queues equal the final full state
+  - every job assigned to a buffer is queued once or picked (by count)
+  - the buffers' run-length indexes and the plant's head index match their queues
+and reports write throughput and /state latency under that load.
+
+Run from MILP_Backend/:
+    python -m benchmarks.stress_plant_core [--writers W] [--readers R] [--seconds S]
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from fastapi.testclient import TestClient
+from app import main as api
+from app.demo_data import default_plant
+from app.plants import DEFAULT_PLANT, state_payload
+
+
+def writer(k: int, stop: threading.Event, out: dict):
+    client = TestClient(api.app)
+    rng = random.Random(k)
+    assigned, requests, errors = [], 0, []
+    buffers = list(api.PLANTS.core(DEFAULT_PLANT).view().buffers)
+    n = 0
+    while not stop.is_set():
+        op = rng.random()
+        if op < 0.35:
+            r = client.post("/events", json={"events": [
+                {"type": "arrival", "oven": rng.choice(["O1", "O2"]), "id": f"w{k}-{n + i}"} for i in range(5)]
+                + [{"type": "pick"}]})
+            n += 5
+            if r.status_code == 200:
+                assigned += [res["job_id"] for res in r.json()["results"]
+                             if res["type"] == "arrival" and res["assigned_buffer"]]
+        elif op < 0.6:
+            r = client.post("/arrival", params={"oven": rng.choice(["O1", "O2"])})
+            if r.status_code == 200 and r.json()["assigned_buffer"]:
+                assigned.append(r.json()["job_id"])
+        elif op < 0.9:
+            r = client.post("/trigger_pick", params={"buffer_id": rng.choice(buffers), "n": rng.randint(1, 3)})
+        else:
+            bid = rng.choice(buffers)
+            r = client.post("/toggle_buffer", params={"buffer_id": bid, "field": "output_available"})
+            if r.status_code == 200:
+                r = client.post("/toggle_buffer", params={"buffer_id": bid, "field": "output_available"})
+        requests += 1
+        if r.status_code != 200:
+            errors.append((r.status_code, r.text[:200]))
+    out[k] = {"assigned": assigned, "requests": requests, "errors": errors}
+
+
+def reader(k: int, stop: threading.Event, out: dict):
+    client = TestClient(api.app)
+    queues, version, latencies, errors = {}, 0, [], []
+    while True:
+        final = stop.is_set()  # set once the writers are done: one last poll
+        t0 = time.perf_counter()
+        r = client.get("/state", params={"since": version, "history_limit": 0})
+        latencies.append(time.perf_counter() - t0)
+        if r.status_code != 200:
+            errors.append((r.status_code, r.text[:200]))
+            continue
+        p = r.json()
+        if p["version"] < version:
+            errors.append(("version went down", version, p["version"]))
+        for bid, b in p["buffers"].items():
+            if "queue" in b:
+                queues[bid] = [j["id"] for j in b["queue"]]
+            else:
+                queues[bid] = queues[bid][b["popped"]:] + [j["id"] for j in b["pushed"]]
+            if len(queues[bid]) != b["occupancy"]:
+                errors.append(("occupancy", bid, len(queues[bid]), b["occupancy"]))
+        version = p["version"]
+        if final:
+            break
+    out[k] = {"queues": queues, "latencies": latencies, "errors": errors}
+
+
+def check_plant(plant, assigned) -> list:
+    # the pick log keeps colors, not job ids: picked jobs are checked by count in main()
+    problems = []
+    queued = Counter(j.id for b in plant.buffers.values() for j in b.queue)
+    dup = [i for i, c in queued.items() if c > 1]
+    unknown = set(queued) - set(assigned)
+    if dup:
+        problems.append(f"{len(dup)} jobs queued twice")
+    if unknown:
+        problems.append(f"{len(unknown)} queued jobs that no arrival was assigned")
+    for b in plant.buffers.values():
+        runs = [(c, n) for c, n in b._runs]
+        b._rebuild_runs()
+        if runs != [(c, n) for c, n in b._runs]:
+            problems.append(f"{b.id}: run index out of sync with its queue")
+    index = {c: set(ids) for c, ids in plant.head_index.items()}
+    plant.reindex()
+    if index != plant.head_index:
+        problems.append("head index out of sync with the buffers")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--writers", type=int, default=8)
+    ap.add_argument("--readers", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    args = ap.parse_args()
+
+    plant = default_plant()
+    for b in plant.buffers.values():
+        b.capacity = 500
+    api.PLANTS.call(DEFAULT_PLANT, "replace_plant", plant)
+    stop_writers, stop_readers = threading.Event(), threading.Event()
+    w_out, r_out = {}, {}
+    writers = [threading.Thread(target=writer, args=(k, stop_writers, w_out)) for k in range(args.writers)]
+    readers = [threading.Thread(target=reader, args=(k, stop_readers, r_out)) for k in range(args.readers)]
+    t0 = time.perf_counter()
+    for t in writers + readers:
+        t.start()
+    time.sleep(args.seconds)
+    stop_writers.set()
+    for t in writers:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    stop_readers.set()
+    for t in readers:
+        t.join()
+
+    core = api.PLANTS.core(DEFAULT_PLANT)
+    final = state_payload(core.view())
+    truth = {bid: [j["id"] for j in b["queue"]] for bid, b in final["buffers"].items()}
+    problems = [e for o in w_out.values() for e in o["errors"]] + [e for o in r_out.values() for e in o["errors"]]
+    problems += [f"reader {k}: delta-built queues differ from the final state"
+                 for k, o in r_out.items() if o["queues"] != truth]
+    assigned = [j for o in w_out.values() for j in o["assigned"]]
+    picked_total = core.view().main_conveyor_history.total_colors
+    queued_total = sum(len(q) for q in truth.values())
+    if picked_total + queued_total != len(assigned):
+        problems.append(f"{len(assigned)} jobs assigned, but {picked_total} picked + {queued_total} queued")
+    problems += core.call(lambda c: check_plant(c.plant, assigned))
+
+    requests = sum(o["requests"] for o in w_out.values())
+    latencies = sorted(l for o in r_out.values() for l in o["latencies"])
+    print(f"{args.writers} writers, {args.readers} readers, {elapsed:.1f}s: {requests} writes "
+          f"({requests / elapsed:.0f}/s), {len(assigned)} jobs assigned, {picked_total} picked, "
+          f"final version {final['version']}")
+    print(f"/state?since= latency: median {statistics.median(latencies) * 1e3:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.2f} ms over {len(latencies)} polls")
+    if problems:
+        print(f"FAILED: {len(problems)} problems")
+        for p in problems[:20]:
+            print("  ", p)
+        raise SystemExit(1)
+    print("OK: no errors, deltas consistent, assigned jobs = queued + picked, indexes in sync")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+# tests/test_milp_models.py
+from app.milp_benchmark import sequence_items, sequence_runs
+from app.utils import color_code
+
+
+def test_item_is_sequenced_even_when_it_costs_every_slot_a_changeover():
+    # one slot, and the only item differs from the color painted before: scheduling it costs
+    # T = 1 changeover, which must still beat leaving it out
+    red, blue = color_code("C1"), color_code("C2")
+    for model in (sequence_items, sequence_runs):
+        res = model([("L1", blue, "j1")], horizon_slots=1, last_color=red, time_limit=5, workers=1)
+        assert [step["job_id"] for step in res["sequence"]] == ["j1"], model.__name__
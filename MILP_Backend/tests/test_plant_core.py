@@ -0,0 +1,25 @@
+# tests/test_plant_core.py
+import pytest
+from app.event_log import EventLog
+from app.plant_core import PlantCore
+from app.plants import make_plant, toggle_main_conveyor
+
+
+class FailingLog(EventLog):
+    def flush(self):
+        raise OSError("disk full")
+
+
+def test_failed_log_write_fails_callers_instead_of_hanging(tmp_path):
+    core = PlantCore(make_plant({"L1": 5}), log=FailingLog(str(tmp_path)))
+    try:
+        for _ in range(2):
+            with pytest.raises(RuntimeError, match="disk full"):
+                core.submit(toggle_main_conveyor).result(timeout=5)
+        assert isinstance(core.error, OSError)
+        assert core._thread.is_alive()
+        with pytest.raises(RuntimeError, match="disk full"):
+            core.submit(toggle_main_conveyor)
+        assert core.view().main_conveyor_busy is False  # the unlogged change was never published
+    finally:
+        core.stop()
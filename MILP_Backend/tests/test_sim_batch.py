@@ -0,0 +1,16 @@
+# tests/test_sim_batch.py
+import pytest
+from app.sim_batch import t_quantile
+
+# two-sided critical values from standard t tables: (confidence, df) -> t
+KNOWN = {
+    (0.95, 1): 12.7062, (0.95, 2): 4.3027, (0.95, 3): 3.1824, (0.95, 4): 2.7764,
+    (0.95, 5): 2.5706, (0.95, 10): 2.2281, (0.95, 30): 2.0423,
+    (0.90, 1): 6.3138, (0.90, 2): 2.9200, (0.90, 3): 2.3534,
+    (0.99, 1): 63.6567, (0.99, 2): 9.9248, (0.99, 3): 5.8409, (0.99, 5): 4.0321, (0.99, 10): 3.1693,
+}
+
+
+@pytest.mark.parametrize("confidence,df", sorted(KNOWN))
+def test_t_quantile_matches_tables(confidence, df):
+    assert t_quantile(confidence, df) == pytest.approx(KNOWN[(confidence, df)], abs=1e-4)
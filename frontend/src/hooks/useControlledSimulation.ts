@@ -1,5 +1,5 @@
 import { useState, useCallback, useEffect, useRef } from "react";
-import type { Color, FrontendSimulationState, Job } from "../types";
+import type { BackendStateResponse, BufferDelta, BufferLine, Color, FrontendSimulationState, Job } from "../types";
 import { COLOR_PERCENTAGES } from "../types";
 import { v4 as uuidv4 } from "uuid";
 import {
@@ -15,6 +15,30 @@ import {
     toggleMainConveyor,
 } from "../services/api";
 
+// conveyor history entries kept for display (the backend's default history_limit)
+const HISTORY_LIMIT = 100;
+
+// Apply the buffers of a /state?since= delta: a buffer comes either whole (with queue) or as
+// the number of jobs popped from its head and the jobs pushed to its tail
+function mergeBuffers(
+    current: Record<string, BufferLine>,
+    changed: Record<string, BufferDelta>
+): Record<string, BufferLine> {
+    const merged = { ...current };
+    for (const [id, buffer] of Object.entries(changed)) {
+        if (!("popped" in buffer)) {
+            merged[id] = buffer;
+        } else if (current[id]) {
+            const { popped, pushed, ...fields } = buffer;
+            merged[id] = {
+                ...fields,
+                queue: [...current[id].queue.slice(popped), ...pushed],
+            };
+        }
+    }
+    return merged;
+}
+
 function generateJobsByCount(count: number): Job[] {
     const jobs: Job[] = [];
     const colors = Object.keys(COLOR_PERCENTAGES) as Color[];
@@ -175,15 +199,23 @@ export function useControlledSimulation() {
     const simulationIntervalRef = useRef<number | null>(null);
     const stateSyncIntervalRef = useRef<number | null>(null);
     const currentJobIndexRef = useRef(0);
+    const stateVersionRef = useRef(0);
 
-    // Sync state from backend every second
+    // Sync state from backend every second; after the first full state only changes are fetched
     const syncStateFromBackend = useCallback(async () => {
         try {
-            const response = await getState();
+            const since = stateVersionRef.current;
+            const response: BackendStateResponse = await getState(since);
+            // polls can overlap: once another response (or a reset) has moved the version, this
+            // delta was computed against a state the client no longer holds
+            if (stateVersionRef.current !== since) return;
+            stateVersionRef.current = response.version ?? 0;
             setState((prev) => ({
                 ...prev,
                 plantState: {
-                    buffers: response.buffers,
+                    buffers: response.full
+                        ? response.buffers
+                        : mergeBuffers(prev.plantState?.buffers || {}, response.buffers),
                     oven_states: {
                         O1: true, // O1 is always active
                         O2: response.oven_states?.O2 ?? true,
@@ -192,7 +224,12 @@ export function useControlledSimulation() {
                         response.main_conveyor_busy ||
                         prev.plantState?.main_conveyor_busy ||
                         false,
-                    main_conveyor_history: response.main_history || [],
+                    main_conveyor_history: response.full
+                        ? response.main_history || []
+                        : [
+                              ...(prev.plantState?.main_conveyor_history || []),
+                              ...(response.main_history || []),
+                          ].slice(-HISTORY_LIMIT),
                 },
             }));
         } catch (error) {
@@ -383,6 +420,7 @@ export function useControlledSimulation() {
         setGeneratedJobCount(0);
         setIsGenerated(false);
         currentJobIndexRef.current = 0;
+        stateVersionRef.current = 0; // local state is gone: next sync fetches the full state
 
         try {
             await reset();
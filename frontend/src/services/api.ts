@@ -33,9 +33,11 @@ export interface MainConveyorHistoryItem {
 
 // API Functions
 
-// Get current state of all buffers and conveyor history
-export async function getState() {
-  const response = await fetch(`${API_BASE_URL}/state`);
+// Get current state of all buffers and conveyor history.
+// since: version of a state already held; the response then only carries changed buffers and
+// new history entries (full: false)
+export async function getState(since: number = 0) {
+  const response = await fetch(`${API_BASE_URL}/state?since=${since}`);
   if (!response.ok) {
     throw new Error(`Failed to get state: ${response.statusText}`);
   }
@@ -84,14 +84,27 @@ export const COLOR_CODES: Record<Color, string> = {
     C12: "#000000", // Black
 };
 
+// A buffer in a /state?since= delta: the whole buffer, or, when the client holds its queue as of
+// the requested version, the number of jobs popped from its head and the jobs pushed to its tail
+export type BufferDelta =
+    | BufferLine
+    | (Omit<BufferLine, "queue"> & { popped: number; pushed: Job[] });
+
 // API Response types
-export interface BackendStateResponse {
-    buffers: Record<string, BufferLine>;
+interface BackendStateFields {
+    version: number;
     main_history: MainConveyorHistoryItem[];
     total_capacity: number;
     total_occupancy: number;
+    oven_states?: Record<string, boolean>;
+    main_conveyor_busy?: boolean;
 }
 
+export type BackendStateResponse =
+    | (BackendStateFields & { full: true; buffers: Record<string, BufferLine> })
+    // only what changed since the requested version
+    | (BackendStateFields & { full: false; buffers: Record<string, BufferDelta> });
+
 export interface ArrivalResponse {
     job_id: string;
     assigned_buffer: string | null;